@@ -0,0 +1,132 @@
+"""
+Benchmark for copying a template board.
+
+Seeds a board of 12 lists holding the given number of cards, then copies
+it two ways, each committed like a real request:
+
+- orm_copy: loading the board and adding a new List / Card object per row,
+  the way a copy written against the models would
+- insert_select: cloning.clone_board(), a fixed handful of INSERT ... SELECT
+  statements
+
+    python -m benchmarks.clone --cards 150 10000
+    python -m benchmarks.clone --database-url postgresql://.../nexus_bench
+
+Prints one JSON document with mean / p50 / p99 milliseconds and SQL
+statements per copy for each path and size.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from sqlalchemy import event, text
+
+from config import Config
+from benchmarks.search import summarise
+
+LISTS = 12
+
+
+def seed_board(db, owner_id, cards, name):
+    from project.models import Board, List
+    from project.ranking import RANK_STEP
+    board = Board(name=name, user_id=owner_id)
+    db.session.add(board)
+    db.session.flush()
+    db.session.execute(text(
+        "INSERT INTO lists (name, position, board_id, version) VALUES (:name, :position, :board_id, 0)"
+    ), [{'name': f'List {n}', 'position': n * RANK_STEP, 'board_id': board.id} for n in range(LISTS)])
+    list_ids = [row.id for row in db.session.query(List.id).filter(List.board_id == board.id)]
+    db.session.execute(text(
+        "INSERT INTO cards (title, description, position, list_id, version) "
+        "VALUES (:title, :description, :position, :list_id, 0)"
+    ), [{'title': f'Card {n}', 'description': 'Checklist item', 'position': (n // LISTS) * RANK_STEP,
+         'list_id': list_ids[n % LISTS]} for n in range(cards)])
+    db.session.commit()
+    return board.id
+
+
+def orm_copy(db, source_id, owner_id, name):
+    from project.models import Board, List, Card
+    from project import search
+    source = db.session.get(Board, source_id)
+    board = Board(name=name, user_id=owner_id)
+    db.session.add(board)
+    for old_list in source.lists:
+        new_list = List(name=old_list.name, position=old_list.position, board=board)
+        db.session.add(new_list)
+        for card in old_list.cards:
+            new_list.cards.append(Card(title=card.title, description=card.description, position=card.position))
+    db.session.flush()
+    search.index_board(board.id)
+    db.session.commit()
+
+
+def insert_select(db, source_id, owner_id, name):
+    from project.cloning import clone_board
+    clone_board(source_id, owner_id, name)
+
+
+PATHS = {'orm_copy': orm_copy, 'insert_select': insert_select}
+
+
+def time_path(app, db, func, source_id, owner_id, repeat):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    timings, counts = [], []
+    for n in range(repeat):
+        with app.test_request_context():
+            event.listen(db.engine, 'after_cursor_execute', count)
+            del statements[:]
+            started = time.perf_counter()
+            func(db, source_id, owner_id, f'Copy {n}')
+            timings.append((time.perf_counter() - started) * 1000)
+            event.remove(db.engine, 'after_cursor_execute', count)
+            counts.append(len(statements))
+            db.session.remove()
+    return dict(summarise(timings), statements_per_copy=round(sum(counts) / len(counts), 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cards', type=int, nargs='+', default=[150, 10000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--database-url', default=None,
+                        help='Default: a SQLite file in the temp directory.')
+    args = parser.parse_args()
+
+    url = args.database_url or 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'nexus_clone_bench.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        SECRET_KEY = 'bench'
+        METRICS_ENABLED = False
+
+    from project import create_app, db
+    from project.models import User
+    app = create_app(BenchConfig)
+
+    report = {'database': None, 'boards': {}}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        report['database'] = db.engine.dialect.name
+        owner = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(owner)
+        db.session.commit()
+        owner_id = owner.id
+
+    for cards in args.cards:
+        with app.app_context():
+            source_id = seed_board(db, owner_id, cards, f'Template {cards}')
+        report['boards'][f'{cards}_cards'] = {
+            name: time_path(app, db, func, source_id, owner_id, args.repeat) for name, func in PATHS.items()}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
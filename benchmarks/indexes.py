@@ -0,0 +1,222 @@
+"""
+Before/after benchmark for the hot-path indexes (migration 0003).
+
+Seeds a database with N cards spread over boards, lists and members, then
+times the queries behind card moves, board views and the dashboard, first
+with the composite indexes dropped and then with them created.
+
+    python -m benchmarks.indexes --cards 1000000
+    python -m benchmarks.indexes --database-url postgresql://.../nexus_bench
+
+Prints one JSON document with mean / p50 / p99 milliseconds per query.
+Seeding 1M cards into SQLite takes about 20 seconds; pass --reuse to keep
+the seeded file between runs.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, text
+
+from config import Config
+
+LISTS_PER_BOARD = 10
+CARDS_PER_LIST = 50
+BOARDS_PER_USER = 2
+MEMBERS_PER_BOARD = 10
+SEED_CHUNK = 20000
+
+# name -> (SQL, parameter factory). Statements run inside a transaction that
+# is rolled back, so the range UPDATE does not drift the data between runs.
+QUERIES = {
+    'range_update_dense_move': (
+        "UPDATE cards SET position = position + 1 WHERE list_id = :list_id AND position >= :position",
+        lambda s: {'list_id': s.list_id(), 'position': random.randrange(CARDS_PER_LIST)},
+    ),
+    'neighbour_lookup_sparse_move': (
+        "SELECT MAX(position) FROM cards WHERE list_id = :list_id AND position < :position",
+        lambda s: {'list_id': s.list_id(), 'position': random.randrange(CARDS_PER_LIST)},
+    ),
+    'board_cards_in_order': (
+        "SELECT cards.id, cards.title, cards.position, cards.list_id FROM cards "
+        "JOIN lists ON lists.id = cards.list_id WHERE lists.board_id = :board_id "
+        "ORDER BY cards.position, cards.id",
+        lambda s: {'board_id': s.board_id()},
+    ),
+    'board_lists_in_order': (
+        "SELECT id, name, position FROM lists WHERE board_id = :board_id ORDER BY position, id",
+        lambda s: {'board_id': s.board_id()},
+    ),
+    'dashboard_owned_boards': (
+        "SELECT id, name FROM boards WHERE user_id = :user_id ORDER BY date_created DESC",
+        lambda s: {'user_id': s.user_id()},
+    ),
+    'dashboard_shared_boards': (
+        "SELECT boards.id, boards.name FROM boards JOIN board_members "
+        "ON board_members.board_id = boards.id WHERE board_members.user_id = :user_id "
+        "ORDER BY boards.date_created DESC",
+        lambda s: {'user_id': s.user_id()},
+    ),
+    'board_member_ids': (
+        "SELECT user_id FROM board_members WHERE board_id = :board_id",
+        lambda s: {'board_id': s.board_id()},
+    ),
+}
+
+
+class Shape:
+    """Sizes of the seeded data, used to draw random query parameters."""
+
+    def __init__(self, cards):
+        self.lists = max(1, cards // CARDS_PER_LIST)
+        self.boards = max(1, self.lists // LISTS_PER_BOARD)
+        self.users = max(MEMBERS_PER_BOARD + 1, self.boards // BOARDS_PER_USER)
+
+    def list_id(self):
+        return random.randint(1, self.lists)
+
+    def board_id(self):
+        return random.randint(1, self.boards)
+
+    def user_id(self):
+        return random.randint(1, self.users)
+
+
+def default_card_text(list_id, position):
+    return f'Card {list_id}-{position}', None
+
+
+def seed(db, shape, card_text=default_card_text):
+    """card_text(list id, position) -> (title, description) for each card."""
+    from project.models import User, Board, List, Card, board_members
+    conn = db.session.connection()
+    started = datetime.utcnow() - timedelta(days=365)
+
+    def insert_chunks(table, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= SEED_CHUNK:
+                conn.execute(table.insert(), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(table.insert(), chunk)
+
+    insert_chunks(User.__table__, ({
+        'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+        'password_hash': 'x', 'date_created': started,
+    } for i in range(1, shape.users + 1)))
+    insert_chunks(Board.__table__, ({
+        'id': i, 'name': f'Board {i}', 'user_id': (i - 1) % shape.users + 1,
+        'date_created': started + timedelta(minutes=i), 'version': 0,
+    } for i in range(1, shape.boards + 1)))
+    insert_chunks(board_members, ({
+        'board_id': b, 'user_id': (b + k) % shape.users + 1,
+    } for b in range(1, shape.boards + 1) for k in range(1, MEMBERS_PER_BOARD + 1)
+        if (b + k) % shape.users + 1 != (b - 1) % shape.users + 1))
+    insert_chunks(List.__table__, ({
+        'id': i, 'name': f'List {i}', 'position': float((i - 1) % LISTS_PER_BOARD),
+        'board_id': (i - 1) // LISTS_PER_BOARD + 1, 'date_created': started,
+    } for i in range(1, shape.lists + 1)))
+    insert_chunks(Card.__table__, ({
+        'title': title, 'description': description, 'position': float(p), 'list_id': l,
+        'date_created': started,
+    } for l in range(1, shape.lists + 1) for p in range(CARDS_PER_LIST)
+        for title, description in [card_text(l, p)]))
+    db.session.commit()
+
+
+def hot_path_indexes(db):
+    from project.models import Board, List, Card, board_members
+    names = {'ix_cards_list_position', 'ix_lists_board_position',
+             'ix_boards_user_created', 'ix_board_members_board_user'}
+    tables = [Card.__table__, List.__table__, Board.__table__, board_members]
+    return [index for table in tables for index in table.indexes if index.name in names]
+
+
+def time_queries(db, shape, repeat):
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            conn = db.engine.connect()
+            trans = conn.begin()
+            started = time.perf_counter()
+            result = conn.execute(text(sql), params(shape))
+            if result.returns_rows:
+                result.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+            trans.rollback()
+            conn.close()
+        timings.sort()
+        results[name] = {
+            'mean_ms': round(statistics.mean(timings), 3),
+            'p50_ms': round(timings[len(timings) // 2], 3),
+            'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cards', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--database-url', default=None,
+                        help='Default: a SQLite file in the temp directory.')
+    parser.add_argument('--reuse', action='store_true',
+                        help='Keep an already seeded database instead of reseeding.')
+    args = parser.parse_args()
+
+    url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), f'nexus_bench_{args.cards}.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        SECRET_KEY = 'bench'
+
+    from project import create_app, db
+    app = create_app(BenchConfig)
+    shape = Shape(args.cards)
+    random.seed(1234)
+
+    with app.app_context():
+        seeded = args.reuse and inspect(db.engine).has_table('cards') and \
+            db.session.execute(text("SELECT COUNT(*) FROM cards")).scalar() > 0
+        if not seeded:
+            db.drop_all()
+            db.create_all()
+            seeding_started = time.perf_counter()
+            seed(db, shape)
+            seed_seconds = time.perf_counter() - seeding_started
+        else:
+            seed_seconds = 0.0
+
+        indexes = hot_path_indexes(db)
+        for index in indexes:
+            index.drop(db.engine, checkfirst=True)
+        before = time_queries(db, shape, args.repeat)
+        for index in indexes:
+            index.create(db.engine, checkfirst=True)
+        with db.engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+        after = time_queries(db, shape, args.repeat)
+        dialect = db.engine.dialect.name
+
+    print(json.dumps({
+        'database': dialect,
+        'cards': shape.lists * CARDS_PER_LIST,
+        'lists': shape.lists,
+        'boards': shape.boards,
+        'users': shape.users,
+        'seed_seconds': round(seed_seconds, 1),
+        'before': before,
+        'after': after,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark for list reordering on boards with hundreds of lists.
+
+For each board size, times moving a random list to a random place three
+ways, each committed like a real request:
+
+- dense_orm_loop: the old scheme, loading every list of the board and
+  renumbering it to 0..n-1 one ORM object at a time
+- dense_range_update: dense positions kept with one set-based UPDATE that
+  shifts the lists in between, plus the moved list's own row
+- sparse_move: moves.move_list(), the `list_moved` path, which writes only
+  the moved list's row (and logs and broadcasts the change)
+
+    python -m benchmarks.list_moves --lists 100 300 1000
+    python -m benchmarks.list_moves --database-url postgresql://.../nexus_bench
+
+Every path also logs the lists it changed for open boards, as a move has
+to. Prints one JSON document with mean / p50 / p99 milliseconds, SQL
+statements and list rows written per move for each path and size.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import event, text
+
+from config import Config
+from benchmarks.search import summarise
+
+
+def seed_board(db, owner_id, lists, name):
+    from project.models import Board
+    from project.ranking import RANK_STEP
+    board = Board(name=name, user_id=owner_id)
+    db.session.add(board)
+    db.session.flush()
+    db.session.execute(text(
+        "INSERT INTO lists (name, position, board_id, version) VALUES (:name, :position, :board_id, 1)"
+    ), [{'name': f'List {n}', 'position': n * RANK_STEP, 'board_id': board.id} for n in range(lists)])
+    db.session.commit()
+    return board.id
+
+
+def list_ids(db, board_id):
+    from project.models import List
+    return [row.id for row in db.session.query(List.id).filter(List.board_id == board_id).order_by(List.position)]
+
+
+def _log(board_id, rows):
+    from project.changes import record_change
+    from project.moves import logged_lists
+    record_change(board_id, 'lists_moved', {'lists': logged_lists([list(row) for row in rows])})
+
+
+def dense_orm_loop(db, board_id, ids, source, target):
+    from project.models import List
+    lists = List.query.filter_by(board_id=board_id).order_by(List.position).all()
+    lists.insert(target, lists.pop(source))
+    changed = []
+    for index, item in enumerate(lists):
+        if item.position != index:
+            item.position = index
+            changed.append(item)
+    db.session.flush()
+    # Open boards need every renumbered list
+    _log(board_id, [(item.id, item.position, item.version) for item in changed])
+    db.session.commit()
+
+
+def dense_range_update(db, board_id, ids, source, target):
+    from project.models import List
+    if target < source:
+        shift, low, high = 1, target, source
+    else:
+        shift, low, high = -1, source + 1, target + 1
+    db.session.execute(text(
+        "UPDATE lists SET position = position + :shift, version = version + 1 "
+        "WHERE board_id = :board_id AND position >= :low AND position < :high"
+    ), {'shift': shift, 'board_id': board_id, 'low': low, 'high': high})
+    db.session.execute(text("UPDATE lists SET position = :position, version = version + 1 WHERE id = :id"),
+                       {'position': target, 'id': ids[source]})
+    low, high = min(source, target), max(source, target)
+    _log(board_id, db.session.query(List.id, List.position, List.version).filter(
+        List.board_id == board_id, List.position >= low, List.position <= high).all())
+    db.session.commit()
+
+
+def make_dense(db, board_id):
+    db.session.execute(text(
+        "UPDATE lists SET position = (SELECT COUNT(*) FROM lists AS earlier WHERE earlier.board_id = lists.board_id "
+        "AND (earlier.position < lists.position OR (earlier.position = lists.position AND earlier.id < lists.id))) "
+        "WHERE board_id = :board_id"
+    ), {'board_id': board_id})
+    db.session.commit()
+
+
+def sparse_move(db, board_id, ids, source, target):
+    from project import moves
+    others = ids[:source] + ids[source + 1:]
+    moves.move_list(board_id, ids[source], others[target] if target < len(others) else None)
+
+
+PATHS = {'dense_orm_loop': dense_orm_loop, 'dense_range_update': dense_range_update, 'sparse_move': sparse_move}
+
+
+def time_path(app, db, func, board_id, lists, repeat):
+    statements, rows = [], []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        if statement.lstrip().upper().startswith('UPDATE LISTS'):
+            rows.append(max(cursor.rowcount, 0))
+
+    timings, counts, written = [], [], []
+    for _ in range(repeat):
+        source, target = random.randrange(lists), random.randrange(lists - 1)
+        with app.test_request_context():
+            ids = list_ids(db, board_id)
+            event.listen(db.engine, 'after_cursor_execute', count)
+            del statements[:], rows[:]
+            started = time.perf_counter()
+            func(db, board_id, ids, source, target)
+            timings.append((time.perf_counter() - started) * 1000)
+            event.remove(db.engine, 'after_cursor_execute', count)
+            counts.append(len(statements))
+            written.append(sum(rows))
+            db.session.remove()
+    return dict(summarise(timings), statements_per_move=round(sum(counts) / len(counts), 1),
+                lists_written_per_move=round(sum(written) / len(written), 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lists', type=int, nargs='+', default=[100, 300, 1000])
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--database-url', default=None,
+                        help='Default: a SQLite file in the temp directory.')
+    args = parser.parse_args()
+
+    url = args.database_url or 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'nexus_list_bench.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        SECRET_KEY = 'bench'
+        METRICS_ENABLED = False
+
+    from project import create_app, db
+    from project.models import User
+    app = create_app(BenchConfig)
+    random.seed(1234)
+
+    report = {'database': None, 'boards': {}}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        report['database'] = db.engine.dialect.name
+        owner = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(owner)
+        db.session.commit()
+        owner_id = owner.id
+
+    for lists in args.lists:
+        results = {}
+        for name, func in PATHS.items():
+            with app.app_context():
+                board_id = seed_board(db, owner_id, lists, f'{name} {lists}')
+                if name.startswith('dense'):
+                    make_dense(db, board_id)
+            results[name] = time_path(app, db, func, board_id, lists, args.repeat)
+        report['boards'][f'{lists}_lists'] = results
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Load test for the HTTP and Socket.IO hot paths.
+
+Seeds one board per simulated user (lists x cards, shared with M other
+users), logs every user in through the Flask test client, connects a
+Socket.IO test client for each of them, and has N users run concurrently
+for a fixed number of operations each, picked from a weighted mix:
+
+    view_board  GET /board/<id> for one of the user's boards
+    dashboard   GET /dashboard
+    drag        card_moved for a random card to a random spot on the board
+    invite      invite a user to the own board, then remove them again
+
+    python -m benchmarks.load --users 20 --lists 10 --cards 50 --members 5
+    python -m benchmarks.load --database-url postgresql://.../nexus_bench --mix drag=1
+
+Prints one JSON document with throughput, p50/p99/mean latency in
+milliseconds and mean SQL statements per operation, plus the git commit
+and parameters, so runs can be compared across commits (--output also
+writes it to a file).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import event
+
+from config import Config
+
+DEFAULT_MIX = 'view_board=4,dashboard=2,drag=8,invite=1'
+PASSWORD = 'bench-password'
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise SystemExit(f'Unknown operation {name!r}; choose from {", ".join(OPERATIONS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def seed(db, bcrypt, args):
+    """Users 1..N each own one board; every board is shared with `members` other users."""
+    from project.models import User, Board, List, Card, board_members
+    from project.ranking import RANK_STEP
+    conn = db.session.connection()
+    password_hash = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+    total_users = args.users + args.spare_users
+
+    conn.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+         'password_hash': password_hash}
+        for i in range(1, total_users + 1)])
+    conn.execute(Board.__table__.insert(), [
+        {'id': i, 'name': f'Bench board {i}', 'user_id': i, 'version': 0}
+        for i in range(1, args.users + 1)])
+    members = [{'board_id': b, 'user_id': (b + k - 1) % args.users + 1}
+               for b in range(1, args.users + 1) for k in range(1, args.members + 1)
+               if (b + k - 1) % args.users + 1 != b]
+    if members:
+        conn.execute(board_members.insert(), members)
+
+    list_rows, card_rows = [], []
+    for b in range(1, args.users + 1):
+        for l in range(args.lists):
+            list_id = (b - 1) * args.lists + l + 1
+            list_rows.append({'id': list_id, 'name': f'List {l}', 'position': l * RANK_STEP, 'board_id': b})
+            card_rows.extend({'title': f'Card {list_id}-{c}', 'position': c * RANK_STEP, 'list_id': list_id}
+                             for c in range(args.cards))
+    if list_rows:
+        conn.execute(List.__table__.insert(), list_rows)
+    for start in range(0, len(card_rows), 10000):
+        conn.execute(Card.__table__.insert(), card_rows[start:start + 10000])
+    db.session.commit()
+
+
+class QueryCounter:
+    """Counts SQL statements per thread, so each operation can read its own."""
+
+    def __init__(self, engine):
+        self.local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def take(self):
+        count = getattr(self.local, 'count', 0)
+        self.local.count = 0
+        return count
+
+
+class SimulatedUser:
+    def __init__(self, app, socketio, user_id, args):
+        self.user_id = user_id
+        self.board_id = user_id
+        self.args = args
+        self.http = app.test_client()
+        self.http.post('/auth/login', data={'email': f'bench{user_id}@example.com', 'password': PASSWORD})
+        self.socket = socketio.test_client(app, flask_test_client=self.http)
+        self.socket.emit('join_board', {'board_id': str(self.board_id)})
+        first_list = (self.board_id - 1) * args.lists + 1
+        self.list_ids = list(range(first_list, first_list + args.lists))
+        # Seeded ids are sequential and cards never leave their board
+        per_board = args.lists * args.cards
+        self.card_ids = range((self.board_id - 1) * per_board + 1, self.board_id * per_board + 1)
+
+    def view_board(self):
+        return self.http.get(f'/board/{self.board_id}').status_code == 200
+
+    def dashboard(self):
+        return self.http.get('/dashboard').status_code == 200
+
+    def drag(self):
+        if len(self.card_ids) < 2:
+            return False
+        ids = random.sample(self.card_ids, 2)
+        target = random.choice(self.list_ids)
+        self.socket.emit('card_moved', {
+            'card_id': ids[0],
+            'new_list_id': target,
+            'next_sibling_id': ids[1],
+        })
+        self.socket.get_received()  # drop the broadcasts so they do not pile up
+        return True
+
+    def invite(self):
+        spare = self.args.users + random.randint(1, self.args.spare_users)
+        invited = self.http.post(f'/board/{self.board_id}/manage',
+                                 data={'email': f'bench{spare}@example.com'})
+        removed = self.http.post(f'/board/{self.board_id}/remove_member/{spare}')
+        return invited.status_code == 302 and removed.status_code == 302
+
+
+OPERATIONS = {
+    'view_board': SimulatedUser.view_board,
+    'dashboard': SimulatedUser.dashboard,
+    'drag': SimulatedUser.drag,
+    'invite': SimulatedUser.invite,
+}
+
+
+def run_user(app, user, mix, ops, counter, results, lock):
+    names, weights = list(mix), list(mix.values())
+    local = defaultdict(list)
+    for _ in range(ops):
+        name = random.choices(names, weights)[0]
+        with app.app_context():
+            counter.take()
+            started = time.perf_counter()
+            ok = OPERATIONS[name](user)
+            elapsed = time.perf_counter() - started
+            local[name].append((elapsed, counter.take(), ok))
+    with lock:
+        for name, samples in local.items():
+            results[name].extend(samples)
+
+
+def summarise(results, wall_seconds):
+    report = {}
+    for name, samples in sorted(results.items()):
+        timings = sorted(s[0] * 1000 for s in samples)
+        report[name] = {
+            'count': len(samples),
+            'errors': sum(1 for s in samples if not s[2]),
+            'throughput_per_second': round(len(samples) / wall_seconds, 1),
+            'p50_ms': round(timings[len(timings) // 2], 3),
+            'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'mean_queries': round(statistics.mean(s[1] for s in samples), 2),
+        }
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20, help='Concurrent simulated users (one board each).')
+    parser.add_argument('--lists', type=int, default=10, help='Lists per board.')
+    parser.add_argument('--cards', type=int, default=50, help='Cards per list.')
+    parser.add_argument('--members', type=int, default=5, help='Members per board.')
+    parser.add_argument('--ops', type=int, default=100, help='Operations per user.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Weighted operations (default: {DEFAULT_MIX}).')
+    parser.add_argument('--move-window-ms', type=int, default=0,
+                        help='MOVE_BATCH_WINDOW_MS; 0 applies each drag inside its handler.')
+    parser.add_argument('--database-url', default=None,
+                        help='Default: a fresh SQLite file in the temp directory.')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', default=None, help='Also write the JSON report here.')
+    args = parser.parse_args()
+    args.spare_users = 10
+    mix = parse_mix(args.mix)
+
+    url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'nexus_load.db')
+
+    class LoadConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        SECRET_KEY = 'bench'
+        WTF_CSRF_ENABLED = False
+        BCRYPT_LOG_ROUNDS = 4
+        MOVE_BATCH_WINDOW_MS = args.move_window_ms
+
+    from project import create_app, db, bcrypt, socketio
+    app = create_app(LoadConfig)
+    random.seed(args.seed)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seeding_started = time.perf_counter()
+        seed(db, bcrypt, args)
+        seed_seconds = time.perf_counter() - seeding_started
+        counter = QueryCounter(db.engine)
+        dialect = db.engine.dialect.name
+
+    users = [SimulatedUser(app, socketio, user_id, args) for user_id in range(1, args.users + 1)]
+    results, lock = defaultdict(list), threading.Lock()
+    threads = [threading.Thread(target=run_user, args=(app, user, mix, args.ops, counter, results, lock))
+               for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    total = sum(len(samples) for samples in results.values())
+    report = {
+        'commit': git_commit(),
+        'database': dialect,
+        'parameters': {key: getattr(args, key) for key in
+                       ('users', 'lists', 'cards', 'members', 'ops', 'mix', 'move_window_ms', 'seed')},
+        'seed_seconds': round(seed_seconds, 2),
+        'wall_seconds': round(wall_seconds, 2),
+        'throughput_per_second': round(total / wall_seconds, 1),
+        'operations': summarise(results, wall_seconds),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Latency benchmark for card search (project/search.py).
+
+Seeds N cards (same boards, lists and members as benchmarks.indexes) whose
+titles and descriptions are drawn from a Zipf-distributed vocabulary, so
+some words match a large share of cards and others only a handful. Builds
+the index with search.rebuild(), then times search_cards() for random users
+with rare, common and two-word prefix queries, first page and second page.
+
+    python -m benchmarks.search --cards 1000000
+    python -m benchmarks.search --database-url postgresql://.../nexus_bench
+
+Prints one JSON document with mean / p50 / p99 milliseconds per query kind.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import inspect, text
+
+from config import Config
+from benchmarks.indexes import Shape, seed
+
+VOCABULARY_SIZE = 5000
+TITLE_WORDS = 4
+DESCRIPTION_WORDS = 12
+
+
+def vocabulary(rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(4, 9))))
+    return sorted(words)
+
+
+class Text:
+    """Zipf-ish word picker: word k is drawn with weight 1 / (k + 1)."""
+
+    def __init__(self, seed_value):
+        self.rng = random.Random(seed_value)
+        self.words = vocabulary(self.rng)
+        self.weights = [1.0 / (k + 1) for k in range(len(self.words))]
+
+    def phrase(self, count):
+        return ' '.join(self.rng.choices(self.words, self.weights, k=count))
+
+    def card(self, list_id, position):
+        return self.phrase(TITLE_WORDS).capitalize(), self.phrase(DESCRIPTION_WORDS)
+
+
+def query_kinds(words):
+    return {
+        'common_word': lambda: words[random.randrange(5)],
+        'mid_word': lambda: words[random.randrange(100, 200)],
+        'rare_word': lambda: words[random.randrange(len(words) - 1000, len(words))],
+        'two_word_prefix': lambda: f'{words[random.randrange(50)]} {words[random.randrange(50, 500)][:3]}',
+    }
+
+
+def time_searches(app, shape, words, repeat):
+    from project.search import search_cards
+    results = {}
+    for name, make_query in query_kinds(words).items():
+        first, second, hits = [], [], []
+        for _ in range(repeat):
+            user_id, query = shape.user_id(), make_query()
+            with app.test_request_context():
+                started = time.perf_counter()
+                page = search_cards(user_id, query)
+                first.append((time.perf_counter() - started) * 1000)
+                hits.append(len(page.hits))
+                if page.next_cursor:
+                    started = time.perf_counter()
+                    search_cards(user_id, query, page.next_cursor)
+                    second.append((time.perf_counter() - started) * 1000)
+        results[name] = {'mean_hits_on_first_page': round(statistics.mean(hits), 1),
+                         'first_page': summarise(first), 'next_page': summarise(second)}
+    return results
+
+
+def summarise(timings):
+    if not timings:
+        return None
+    timings = sorted(timings)
+    return {
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(timings[len(timings) // 2], 3),
+        'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cards', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--database-url', default=None,
+                        help='Default: a SQLite file in the temp directory.')
+    parser.add_argument('--reuse', action='store_true',
+                        help='Keep an already seeded and indexed database instead of reseeding.')
+    args = parser.parse_args()
+
+    url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), f'nexus_search_bench_{args.cards}.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        SECRET_KEY = 'bench'
+        METRICS_ENABLED = False
+
+    from project import create_app, db, search
+    app = create_app(BenchConfig)
+    shape = Shape(args.cards)
+    card_text = Text(1234)
+    random.seed(1234)
+
+    with app.app_context():
+        seeded = args.reuse and inspect(db.engine).has_table('cards') and \
+            db.session.execute(text("SELECT COUNT(*) FROM cards")).scalar() > 0
+        seed_seconds = index_seconds = 0.0
+        if not seeded:
+            db.drop_all()
+            db.create_all()
+            started = time.perf_counter()
+            seed(db, shape, card_text.card)
+            seed_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            search.rebuild()
+            db.session.commit()
+            index_seconds = time.perf_counter() - started
+            with db.engine.begin() as conn:
+                conn.execute(text('ANALYZE'))
+        dialect = db.engine.dialect.name
+
+    report = {
+        'database': dialect,
+        'cards': shape.lists * 50,
+        'boards': shape.boards,
+        'users': shape.users,
+        'seed_seconds': round(seed_seconds, 1),
+        'index_seconds': round(index_seconds, 1),
+        'queries': time_searches(app, shape, card_text.words, args.repeat),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
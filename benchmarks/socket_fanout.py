@@ -0,0 +1,151 @@
+"""
+Broadcast fan-out load test for the multi-process Socket.IO mode.
+
+Starts W worker processes that share one listening port and one
+SQLiteQueueManager message queue, connects C websocket clients (the kernel
+spreads them over the workers), joins them all to one room and publishes M
+broadcasts from an external emitter. Every client must receive every
+broadcast, whichever worker it landed on.
+
+    python -m benchmarks.socket_fanout --workers 1 2 4 --clients 100 --messages 200
+
+Prints one JSON line per worker count with deliveries per second.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+
+
+def _serve(fd, queue_url):
+    """Worker process: a bare Socket.IO app on the shared socket."""
+    from flask import Flask
+    from flask_socketio import SocketIO, join_room
+    from werkzeug.serving import make_server
+    from project.realtime import socketio_options
+
+    app = Flask('fanout-worker')
+    sio = SocketIO(app, async_mode='threading', **socketio_options({
+        'SOCKETIO_MESSAGE_QUEUE': queue_url,
+        'SOCKETIO_CHANNEL': 'fanout',
+        'SOCKETIO_TRANSPORTS': 'websocket',
+    }))
+
+    @sio.on('join')
+    def join(data):
+        join_room(data['room'])
+        return 'ok'
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, fd=fd)
+    server.serve_forever()
+
+
+class FanoutClient(threading.Thread):
+    """Minimal Engine.IO v4 websocket client that counts `tick` events."""
+
+    def __init__(self, port, expected):
+        super().__init__(daemon=True)
+        import simple_websocket
+        self.ws = simple_websocket.Client.connect(
+            f'ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket')
+        self.expected = expected
+        self.received = 0
+        self.joined = threading.Event()
+        self.done = threading.Event()
+        self.ws.receive()                      # engine.io "open"
+        self.ws.send('40')                     # connect to namespace "/"
+        self.ws.receive()                      # namespace connected
+        self.ws.send('420["join",{"room":"fanout"}]')
+
+    def run(self):
+        while self.received < self.expected:
+            packet = self.ws.receive()
+            if packet == '2':                  # ping
+                self.ws.send('3')
+            elif packet.startswith('430'):     # join acknowledged
+                self.joined.set()
+            elif packet.startswith('42["tick"'):
+                self.received += 1
+        self.done.set()
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+def run_once(workers, clients, messages, timeout=120):
+    from project.realtime import SQLiteQueueManager
+
+    queue_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'queue.db')
+    # Create the queue table before the workers start polling it
+    emitter = SQLiteQueueManager(queue_url, channel='fanout', write_only=True)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(512)
+    port = listener.getsockname()[1]
+
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=_serve, args=(listener.fileno(), queue_url), daemon=True)
+             for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+
+    conns = []
+    try:
+        conns = [FanoutClient(port, messages) for _ in range(clients)]
+        for conn in conns:
+            conn.start()
+        for conn in conns:
+            if not conn.joined.wait(10):
+                raise RuntimeError('client did not join the room')
+        # Give every worker's queue listener time to start polling
+        time.sleep(0.5)
+
+        started = time.perf_counter()
+        for n in range(messages):
+            emitter.emit('tick', {'n': n}, room='fanout', namespace='/')
+        for conn in conns:
+            if not conn.done.wait(timeout):
+                raise RuntimeError('client missed broadcasts')
+        elapsed = time.perf_counter() - started
+    finally:
+        for conn in conns:
+            conn.close()
+        for proc in procs:
+            proc.terminate()
+        listener.close()
+
+    deliveries = clients * messages
+    return {
+        'workers': workers,
+        'clients': clients,
+        'messages': messages,
+        'deliveries': deliveries,
+        'seconds': round(elapsed, 4),
+        'deliveries_per_second': round(deliveries / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--timeout', type=float, default=120,
+                        help='Seconds to wait for every client to see every broadcast.')
+    args = parser.parse_args()
+    for workers in args.workers:
+        result = run_once(workers, args.clients, args.messages, args.timeout)
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    main()
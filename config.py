@@ -6,6 +6,20 @@ load_dotenv()
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+
+def _engine_options():
+    """Pool settings from DB_POOL_* environment variables."""
+    options = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() not in ('0', 'false', 'no'),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    for option, variable in (('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'),
+                             ('pool_timeout', 'DB_POOL_TIMEOUT')):
+        if os.environ.get(variable):
+            options[option] = int(os.environ[variable])
+    return options
+
+
 class Config:
     """Set Flask configuration variables from .env file."""
     
@@ -16,6 +30,96 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool, applied to the primary and the replica alike. Unset
+    # size/overflow/timeout keep SQLAlchemy's defaults (5 / 10 / 30s).
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options()
+
+    # Optional read replica for read-only pages (see project/replica.py)
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')
+    REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+    # Board access cache (see project/access.py)
+    ACCESS_CACHE_SIZE = int(os.environ.get('ACCESS_CACHE_SIZE', 10000))
+    ACCESS_CACHE_TTL = float(os.environ.get('ACCESS_CACHE_TTL', 30))
+
+    # Card moves are batched per board over this window (see project/moves.py)
+    MOVE_BATCH_WINDOW_MS = int(os.environ.get('MOVE_BATCH_WINDOW_MS', 30))
+    # A batch that loses a race with another writer is re-applied up to this
+    # many times, backing off from MOVE_RETRY_BACKOFF_MS (see project/moves.py)
+    MOVE_RETRY_ATTEMPTS = int(os.environ.get('MOVE_RETRY_ATTEMPTS', 5))
+    MOVE_RETRY_BACKOFF_MS = int(os.environ.get('MOVE_RETRY_BACKOFF_MS', 10))
+
+    # Largest selection for multi-card moves and deletes (see project/bulk.py)
+    BULK_MAX_CARDS = int(os.environ.get('BULK_MAX_CARDS', 500))
+
+    # Boards with more cards than this are deleted in the background, in
+    # chunks of BOARD_DELETE_CHUNK_SIZE cards (see project/deletion.py)
+    BOARD_DELETE_ASYNC_CARDS = int(os.environ.get('BOARD_DELETE_ASYNC_CARDS', 5000))
+    BOARD_DELETE_CHUNK_SIZE = int(os.environ.get('BOARD_DELETE_CHUNK_SIZE', 1000))
+    BOARD_DELETE_PAUSE_MS = int(os.environ.get('BOARD_DELETE_PAUSE_MS', 10))
+
+    # Archive pages, and the auto-archive policy: cards that have been in one
+    # of the comma-separated AUTO_ARCHIVE_LISTS for AUTO_ARCHIVE_DAYS days
+    # (0 turns it off), archived in batches (see project/archive.py). The
+    # development server checks every AUTO_ARCHIVE_INTERVAL_MINUTES.
+    ARCHIVE_PAGE_SIZE = int(os.environ.get('ARCHIVE_PAGE_SIZE', 20))
+    AUTO_ARCHIVE_DAYS = int(os.environ.get('AUTO_ARCHIVE_DAYS', 30))
+    AUTO_ARCHIVE_LISTS = os.environ.get('AUTO_ARCHIVE_LISTS', 'Done')
+    AUTO_ARCHIVE_BATCH_SIZE = int(os.environ.get('AUTO_ARCHIVE_BATCH_SIZE', 500))
+    AUTO_ARCHIVE_PAUSE_MS = int(os.environ.get('AUTO_ARCHIVE_PAUSE_MS', 10))
+    AUTO_ARCHIVE_INTERVAL_MINUTES = int(os.environ.get('AUTO_ARCHIVE_INTERVAL_MINUTES', 60))
+
+    # Changes kept per board for reconnecting clients (see project/changes.py)
+    CHANGE_LOG_SIZE = int(os.environ.get('CHANGE_LOG_SIZE', 500))
+
+    # Rows per bulk INSERT when importing boards (see project/board_io.py)
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+
+    # Dashboard pages and board summary counts (see project/dashboard.py)
+    DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 20))
+    DASHBOARD_SUMMARY_TTL = float(os.environ.get('DASHBOARD_SUMMARY_TTL', 60))
+
+    # Card search results per page (see project/search.py)
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+
+    # Password hashing (see project/passwords.py). Stored hashes with another
+    # cost are upgraded on login. Workers > 0 hash on a process pool instead
+    # of the request worker.
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+
+    # Cross-request user cache (see project/identity.py); 0 turns it off
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 0))
+
+    # Rendered board markup (see project/fragments.py): 'memory', 'disk' or 'none'
+    FRAGMENT_CACHE = os.environ.get('FRAGMENT_CACHE', 'memory')
+    FRAGMENT_CACHE_DIR = os.environ.get('FRAGMENT_CACHE_DIR')
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    # Board viewers (see project/presence.py): 'memory' or a shared
+    # sqlite:////path/presence.db for all workers on a host
+    PRESENCE_BACKEND = os.environ.get('PRESENCE_BACKEND', 'memory')
+    PRESENCE_HEARTBEAT_SECONDS = int(os.environ.get('PRESENCE_HEARTBEAT_SECONDS', 30))
+    PRESENCE_TIMEOUT_SECONDS = int(os.environ.get('PRESENCE_TIMEOUT_SECONDS', 90))
+    PRESENCE_DEBOUNCE_MS = int(os.environ.get('PRESENCE_DEBOUNCE_MS', 1000))
+    PRESENCE_LIST_LIMIT = int(os.environ.get('PRESENCE_LIST_LIMIT', 50))
+
+    # Timing histograms at /metrics (see project/metrics.py). Lower the sample
+    # rate to record only a share of requests, socket events and statements.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+    METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+
+    # Socket.IO deployment (see project/realtime.py). Set a message queue to
+    # run several worker processes; e.g. redis://localhost:6379/0
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE') or None
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'nexusboard')
+    SOCKETIO_TRANSPORTS = os.environ.get('SOCKETIO_TRANSPORTS', 'polling,websocket')
+    # Packets a client may have waiting before board deltas stop queueing for
+    # it and it is told to resync instead; 0 turns this off
+    SOCKETIO_CLIENT_QUEUE_LIMIT = int(os.environ.get('SOCKETIO_CLIENT_QUEUE_LIMIT', 100))
+
     # Disable CSRF for Postman testing
     WTF_CSRF_ENABLED = False
 
@@ -27,6 +131,15 @@ class TestConfig(Config):
     
     # We set WTForms CSRF protection to False for testing forms
     WTF_CSRF_ENABLED = False 
+
+    # Apply card moves inside the socket handler so tests can check the result
+    MOVE_BATCH_WINDOW_MS = 0
+
+    # Send presence updates straight away instead of after the debounce window
+    PRESENCE_DEBOUNCE_MS = 0
+
+    # The cheapest bcrypt cost keeps the auth tests fast
+    BCRYPT_LOG_ROUNDS = 4
     
     # Use a separate database for testing.
     # A file-based SQLite database is the simplest option.
@@ -4,9 +4,11 @@ from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_socketio import SocketIO # Import SocketIO
 from config import Config
+from project.replica import RoutingSession
 
 # Initialize extensions
-db = SQLAlchemy()
+# (the session class can route read-only views to a replica, see project/replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 socketio = SocketIO() # Initialize SocketIO
@@ -26,7 +28,18 @@ def create_app(config_class=Config):
     db.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
-    socketio.init_app(app) # Bind SocketIO to the app
+    # Import events to register socket handlers. This has to happen before
+    # init_app(), which copies them onto the server of every app created.
+    from project.main import events
+    # Bind SocketIO to the app, with the async mode and message queue from config
+    from project.realtime import socketio_options
+    socketio.init_app(app, **socketio_options(app.config))
+    # Read-your-writes stickiness for the optional read replica
+    from project import replica
+    replica.init_app(app)
+    # Request / socket / SQL timing and the /metrics endpoint
+    from project import metrics
+    metrics.init_app(app)
 
     # Register blueprints
     from project.main.routes import main
@@ -35,7 +48,12 @@ def create_app(config_class=Config):
     app.register_blueprint(main)
     app.register_blueprint(auth, url_prefix='/auth') # Add /auth prefix
 
-    # Import events to register socket handlers
-    from project.main import events
+    from project.api import api
+    app.register_blueprint(api, url_prefix='/api/v1')
+
+
+    # Register `flask nexus ...` maintenance commands
+    from project.cli import nexus
+    app.cli.add_command(nexus)
     
     return app
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Board access checks.
+
+can_access() answers "may this user see / manage this board?" with a single
+EXISTS query instead of loading every member row, and keeps the answer in a
+small per-process LRU cache with a TTL. Anything that changes membership,
+removes a board or starts purging one must call invalidate_board() so the
+cache never grants access that has been taken away in this process; other
+processes catch up within ACCESS_CACHE_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, abort
+from flask_login import current_user
+from sqlalchemy import exists, or_, select
+from project import db
+from project.models import Board, board_members
+
+# Access levels
+MEMBER = 'member'  # owner or invited member
+OWNER = 'owner'    # owner only
+
+
+class AccessCache:
+    """Thread-safe LRU cache of (user_id, board_id, level) -> bool with a TTL."""
+
+    def __init__(self, max_size=10000, ttl=30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            allowed, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return allowed
+
+    def set(self, key, allowed):
+        with self._lock:
+            self._entries[key] = (allowed, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_board(self, board_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == board_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = AccessCache()
+
+
+def _configure_cache():
+    config = current_app.config
+    _cache.max_size = config.get('ACCESS_CACHE_SIZE', _cache.max_size)
+    _cache.ttl = config.get('ACCESS_CACHE_TTL', _cache.ttl)
+
+
+def _query_access(user_id, board_id, level):
+    owner_clause = (Board.user_id == user_id)
+    if level == MEMBER:
+        member_exists = exists().where(
+            board_members.c.board_id == board_id,
+            board_members.c.user_id == user_id
+        )
+        owner_clause = or_(owner_clause, member_exists)
+    # A board being purged is already gone as far as its users are concerned
+    stmt = select(exists().where(Board.id == board_id, ~Board.deleting, owner_clause))
+    # Always the primary, even under @read_replica: a lagging replica would
+    # deny a new member (or grant a removed one) and the cache would keep it
+    return bool(db.session.execute(stmt, bind_arguments={'bind': db.engine}).scalar())
+
+
+def can_access(user_id, board_id, level=MEMBER):
+    """True if `user_id` has at least `level` access to `board_id`."""
+    if user_id is None or board_id is None:
+        return False
+    key = (int(user_id), int(board_id), level)
+    allowed = _cache.get(key)
+    if allowed is None:
+        _configure_cache()
+        allowed = _query_access(key[0], key[1], level)
+        _cache.set(key, allowed)
+    return allowed
+
+
+def current_user_can_access(board_id, level=MEMBER):
+    """can_access() for the logged-in user; False for anonymous users."""
+    if not current_user.is_authenticated:
+        return False
+    return can_access(current_user.id, board_id, level)
+
+
+def require_access(board_id, level=MEMBER):
+    """Abort with 403 unless the logged-in user has `level` access."""
+    if not current_user_can_access(board_id, level):
+        abort(403)
+
+
+def is_member(user_id, board_id):
+    """True if `user_id` was invited to `board_id` (owners are not members)."""
+    stmt = select(exists().where(
+        board_members.c.board_id == board_id,
+        board_members.c.user_id == user_id
+    ))
+    return bool(db.session.execute(stmt).scalar())
+
+
+def invalidate_board(board_id):
+    """Forget cached answers for a board after its membership changed."""
+    _cache.invalidate_board(int(board_id))
+
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,446 @@
+"""
+JSON API (mounted at /api/v1) for board, list and card CRUD.
+
+Uses the same session login as the HTML pages. Mutations return only the
+entity they touched and are pushed to the board's Socket.IO room through the
+change log, so open boards update without a reload. Reads carry an ETag
+built from the board version and honour If-None-Match. Lists and cards
+carry a `version`; a PATCH that sends it is refused with 409 if the row has
+changed since. Deleting a large board answers 202 and purges it in the
+background; its progress is at /boards/<id>/deletion. POST
+/boards/<id>/clone copies a board with its lists and cards. Selections of
+cards are moved, deleted or archived in one request with
+/boards/<id>/cards/bulk-move, /bulk-delete and /bulk-archive; the archive
+is paged through at /boards/<id>/archive/lists and /archive/cards.
+"""
+from functools import wraps
+from flask import Response, current_app, jsonify, request, abort, stream_with_context, url_for
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+from . import api
+from project import db, mutations, archive, board_io, bulk, cloning, dashboard, deletion, search
+from project.models import Board, List, Card
+from project.forms import CreateBoardForm, EditBoardForm, CreateListForm, CreateCardForm, EditListForm, EditCardForm
+from project.access import require_access, OWNER
+from project.changes import card_payload, list_payload
+from project.moves import LostRace, logged_moves
+from project.snapshot import load_board_snapshot, snapshot_to_dict
+
+
+def api_login_required(view):
+    """Like login_required, but answers 401 instead of redirecting to a form."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated:
+            abort(401)
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@api.errorhandler(HTTPException)
+def handle_http_error(error):
+    if error.response is not None:
+        return error.response
+    return jsonify({'error': error.description}), error.code
+
+
+def _validated(form_class, data):
+    """Validate a JSON body with the same rules as the HTML form, or abort 400."""
+    form = form_class(formdata=None, data=data, meta={'csrf': False})
+    if not form.validate():
+        response = jsonify({'error': 'Validation failed.', 'fields': form.errors})
+        response.status_code = 400
+        abort(response)
+    return form
+
+
+def _json_body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description='Expected a JSON object.')
+    return data
+
+
+def board_payload(board):
+    return {'id': board.id, 'name': board.name, 'version': board.version, 'owner_id': board.user_id,
+            'is_template': board.is_template}
+
+
+def _board_version(board_id):
+    return db.session.query(Board.version).filter(Board.id == board_id).scalar()
+
+
+def _conditional(board_id, build):
+    """
+    Answer a read tagged with the board's version: 304 if the client's
+    If-None-Match still matches, otherwise build() the JSON body.
+    """
+    version = _board_version(board_id)
+    if version is None:
+        abort(404)
+    etag = f'{request.path}@{version}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
+
+# --- Boards ---
+
+@api.route('/boards', methods=['GET'])
+@api_login_required
+def list_boards():
+    """
+    One keyset page of the user's boards, newest first.
+    ?feed=owned|shared|all (default all), ?after=<next cursor>, ?limit=N.
+    """
+    feed = request.args.get('feed', dashboard.ALL)
+    if feed not in (dashboard.OWNED, dashboard.SHARED, dashboard.ALL):
+        abort(400, description='feed must be owned, shared or all.')
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= 100:
+        abort(400, description='limit must be between 1 and 100.')
+    try:
+        page = dashboard.boards_page(current_user.id, feed, request.args.get('after'), limit)
+    except dashboard.InvalidCursor:
+        abort(400, description='Invalid cursor.')
+    summaries = dashboard.board_summaries([board for board in page.boards if not board.deleting])
+    cards_left = deletion.cards_left([board.id for board in page.boards if board.deleting])
+    return jsonify({
+        'boards': [dict(id=board.id, name=board.name, version=board.version,
+                        owner_id=board.owner_id, owner_username=board.owner_username,
+                        deleting=board.deleting,
+                        **(summaries[board.id]._asdict() if not board.deleting
+                           else {'cards_left': cards_left.get(board.id, 0)}))
+                   for board in page.boards],
+        'next': page.next_cursor,
+    })
+
+
+@api.route('/search', methods=['GET'])
+@api_login_required
+def search_cards():
+    """
+    Cards matching ?q= on every board the user can access, best match first.
+    ?after=<next cursor>, ?limit=N.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        abort(400, description='q is required.')
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= 100:
+        abort(400, description='limit must be between 1 and 100.')
+    try:
+        page = search.search_cards(current_user.id, query, request.args.get('after'), limit)
+    except dashboard.InvalidCursor:
+        abort(400, description='Invalid cursor.')
+    return jsonify({'results': [hit._asdict() for hit in page.hits], 'next': page.next_cursor})
+
+
+@api.route('/boards', methods=['POST'])
+@api_login_required
+def create_board():
+    form = _validated(CreateBoardForm, _json_body())
+    board = mutations.create_board(current_user, form.name.data)
+    return jsonify(board_payload(board)), 201
+
+
+@api.route('/boards/<int:board_id>', methods=['GET'])
+@api_login_required
+def get_board(board_id):
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    return _conditional(board_id, lambda: snapshot_to_dict(load_board_snapshot(board_id)))
+
+
+@api.route('/boards/import', methods=['POST'])
+@api_login_required
+def import_board():
+    """Create a board from a JSON Lines request body (application/x-ndjson)."""
+    try:
+        board_id, lists, cards = board_io.import_board(request.stream, current_user.id,
+                                                       name=request.args.get('name'))
+    except board_io.BoardImportError as e:
+        abort(400, description=str(e))
+    board = db.session.get(Board, board_id)
+    return jsonify(dict(board_payload(board), lists=lists, cards=cards)), 201
+
+
+@api.route('/boards/<int:board_id>/clone', methods=['POST'])
+@api_login_required
+def clone_board(board_id):
+    """
+    Copy a board's lists and cards into a new board of the current user:
+    {name, include_members} (both optional).
+    """
+    source = Board.query.get_or_404(board_id)
+    require_access(board_id)
+    data = _json_body()
+    form = _validated(CreateBoardForm, {'name': data.get('name') or source.name})
+    new_id, lists, cards = cloning.clone_board(board_id, current_user.id, form.name.data,
+                                               bool(data.get('include_members')))
+    board = db.session.get(Board, new_id)
+    return jsonify(dict(board_payload(board), lists=lists, cards=cards)), 201
+
+
+@api.route('/boards/<int:board_id>/export', methods=['GET'])
+@api_login_required
+def export_board(board_id):
+    """Stream the board as JSON Lines."""
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    return Response(stream_with_context(board_io.export_board(board_id)),
+                    mimetype='application/x-ndjson')
+
+
+@api.route('/boards/<int:board_id>', methods=['PATCH'])
+@api_login_required
+def update_board(board_id):
+    board = Board.query.get_or_404(board_id)
+    require_access(board.id, OWNER)
+    # Fields left out of the body keep their current values
+    data = {'name': board.name, 'is_template': board.is_template}
+    data.update(_json_body())
+    form = _validated(EditBoardForm, data)
+    return jsonify(board_payload(mutations.rename_board(board, form.name.data, form.is_template.data)))
+
+
+@api.route('/boards/<int:board_id>', methods=['DELETE'])
+@api_login_required
+def delete_board(board_id):
+    board = Board.query.get_or_404(board_id)
+    require_access(board.id, OWNER)
+    if mutations.delete_board(board):
+        response = jsonify(_deletion_payload(board_id))
+        response.status_code = 202
+        response.headers['Location'] = url_for('api.deletion_status', board_id=board_id)
+        return response
+    return '', 204
+
+
+def _deletion_payload(board_id):
+    return {'board_id': board_id, 'deleting': True,
+            'cards_left': deletion.cards_left([board_id]).get(board_id, 0)}
+
+
+@api.route('/boards/<int:board_id>/deletion', methods=['GET'])
+@api_login_required
+def deletion_status(board_id):
+    """Progress of a background delete; 404 once the board is gone."""
+    board = db.session.get(Board, board_id)
+    if board is None or not board.deleting:
+        abort(404)
+    # Access checks already treat the board as gone, so check ownership directly
+    if board.user_id != current_user.id:
+        abort(403)
+    return jsonify(_deletion_payload(board_id))
+
+
+# --- Lists ---
+
+@api.route('/boards/<int:board_id>/lists', methods=['POST'])
+@api_login_required
+def create_list(board_id):
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    form = _validated(CreateListForm, _json_body())
+    return jsonify(list_payload(mutations.create_list(board_id, form.name.data))), 201
+
+
+@api.route('/lists/<int:list_id>', methods=['GET'])
+@api_login_required
+def get_list(list_id):
+    list_item = List.query.get_or_404(list_id)
+    require_access(list_item.board_id)
+    return _conditional(list_item.board_id, lambda: list_payload(list_item))
+
+
+@api.route('/lists/<int:list_id>', methods=['PATCH'])
+@api_login_required
+def update_list(list_id):
+    list_item = List.query.get_or_404(list_id)
+    require_access(list_item.board_id)
+    form = _validated(EditListForm, _json_body())
+    try:
+        list_item = mutations.rename_list(list_item, form.name.data, form.version.data)
+    except mutations.EditConflict:
+        abort(409, description='The list was changed since that version.')
+    return jsonify(list_payload(list_item))
+
+
+@api.route('/lists/<int:list_id>', methods=['DELETE'])
+@api_login_required
+def delete_list(list_id):
+    list_item = List.query.get_or_404(list_id)
+    require_access(list_item.board_id)
+    mutations.delete_list(list_item)
+    return '', 204
+
+
+# --- Cards ---
+
+@api.route('/lists/<int:list_id>/cards', methods=['POST'])
+@api_login_required
+def create_card(list_id):
+    list_item = List.query.get_or_404(list_id)
+    require_access(list_item.board_id)
+    form = _validated(CreateCardForm, _json_body())
+    card = mutations.create_card(list_item, form.title.data, form.description.data)
+    return jsonify(card_payload(card)), 201
+
+
+@api.route('/cards/<int:card_id>', methods=['GET'])
+@api_login_required
+def get_card(card_id):
+    card = Card.query.get_or_404(card_id)
+    board_id = card.list.board_id
+    require_access(board_id)
+    return _conditional(board_id, lambda: card_payload(card))
+
+
+@api.route('/cards/<int:card_id>', methods=['PATCH'])
+@api_login_required
+def update_card(card_id):
+    card = Card.query.get_or_404(card_id)
+    require_access(card.list.board_id)
+    # Fields left out of the body keep their current values
+    data = {'title': card.title, 'description': card.description}
+    data.update(_json_body())
+    form = _validated(EditCardForm, data)
+    try:
+        card = mutations.update_card(card, form.title.data, form.description.data, form.version.data)
+    except mutations.EditConflict:
+        abort(409, description='The card was changed since that version.')
+    return jsonify(card_payload(card))
+
+
+@api.route('/cards/<int:card_id>', methods=['DELETE'])
+@api_login_required
+def delete_card(card_id):
+    card = Card.query.get_or_404(card_id)
+    require_access(card.list.board_id)
+    mutations.delete_card(card)
+    return '', 204
+
+
+@api.route('/boards/<int:board_id>/cards/bulk-move', methods=['POST'])
+@api_login_required
+def bulk_move_cards(board_id):
+    """
+    Move {card_ids: [...]} in that order in front of `next_sibling_id` in
+    `list_id` (or to its end), all in one transaction.
+    """
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    data = _json_body()
+    if not bulk.is_id(data.get('list_id')):
+        abort(400, description='list_id is required.')
+    if data.get('next_sibling_id') is not None and not bulk.is_id(data['next_sibling_id']):
+        abort(400, description='next_sibling_id must be a card id or null.')
+    try:
+        results, version = bulk.move_cards(board_id, data.get('card_ids') or [], data['list_id'],
+                                           data.get('next_sibling_id'))
+    except bulk.InvalidBulkRequest as e:
+        abort(400, description=str(e))
+    except LostRace:
+        abort(409, description='The board kept changing; try again.')
+    return jsonify({'version': version, 'moves': logged_moves(results)})
+
+
+@api.route('/boards/<int:board_id>/cards/bulk-delete', methods=['POST'])
+@api_login_required
+def bulk_delete_cards(board_id):
+    """Delete {card_ids: [...]} in one transaction."""
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    try:
+        card_ids, version = bulk.delete_cards(board_id, _json_body().get('card_ids') or [])
+    except bulk.InvalidBulkRequest as e:
+        abort(400, description=str(e))
+    return jsonify({'version': version, 'deleted': card_ids})
+
+
+# --- Archive ---
+
+@api.route('/lists/<int:list_id>/archive', methods=['POST'])
+@api_login_required
+def archive_list(list_id):
+    """Move a list and its cards to the board's archive."""
+    list_item = List.query.get_or_404(list_id)
+    require_access(list_item.board_id)
+    return jsonify({'version': archive.archive_list(list_item), 'archived': list_id})
+
+
+@api.route('/boards/<int:board_id>/cards/bulk-archive', methods=['POST'])
+@api_login_required
+def bulk_archive_cards(board_id):
+    """Move {card_ids: [...]} to the board's archive in one transaction."""
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    try:
+        card_ids, version = archive.archive_cards(board_id, _json_body().get('card_ids') or [])
+    except bulk.InvalidBulkRequest as e:
+        abort(400, description=str(e))
+    return jsonify({'version': version, 'archived': card_ids})
+
+
+def _archive_page(board_id, load, key):
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= 100:
+        abort(400, description='limit must be between 1 and 100.')
+    try:
+        page = load(board_id, request.args.get('after'), limit)
+    except dashboard.InvalidCursor:
+        abort(400, description='Invalid cursor.')
+    return jsonify({key: [dict(item._asdict(), archived_at=item.archived_at.isoformat()) for item in page.items],
+                    'next': page.next_cursor})
+
+
+@api.route('/boards/<int:board_id>/archive/lists', methods=['GET'])
+@api_login_required
+def archived_lists(board_id):
+    """Archived lists, newest first. ?after=<next cursor>, ?limit=N."""
+    return _archive_page(board_id, archive.archived_lists, 'lists')
+
+
+@api.route('/boards/<int:board_id>/archive/cards', methods=['GET'])
+@api_login_required
+def archived_cards(board_id):
+    """Cards archived on their own, newest first. ?after=<next cursor>, ?limit=N."""
+    return _archive_page(board_id, archive.archived_cards, 'cards')
+
+
+@api.route('/boards/<int:board_id>/archive/cards/restore', methods=['POST'])
+@api_login_required
+def restore_cards(board_id):
+    """
+    Restore {card_ids: [...]} to the end of `list_id`, or else of the lists
+    they were archived from.
+    """
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    data = _json_body()
+    if data.get('list_id') is not None and not bulk.is_id(data['list_id']):
+        abort(400, description='list_id must be a list id or null.')
+    try:
+        card_ids, version = archive.restore_cards(board_id, data.get('card_ids') or [], data.get('list_id'))
+    except bulk.InvalidBulkRequest as e:
+        abort(400, description=str(e))
+    return jsonify({'version': version, 'restored': card_ids})
+
+
+@api.route('/boards/<int:board_id>/archive/lists/<int:list_id>/restore', methods=['POST'])
+@api_login_required
+def restore_list(board_id, list_id):
+    """Restore an archived list and its cards to the end of the board."""
+    Board.query.get_or_404(board_id)
+    require_access(board_id)
+    try:
+        version = archive.restore_list(board_id, list_id)
+    except archive.NotArchived:
+        abort(404)
+    return jsonify({'version': version, 'restored': list_id})
@@ -0,0 +1,283 @@
+"""
+Archiving lists and cards, and restoring them.
+
+Archived rows are moved, not flagged: one INSERT ... SELECT copies a list or
+a selection of cards into `archived_lists` / `archived_cards` and one DELETE
+takes them out of `lists` / `cards`. Board pages, moves, search and the
+dashboard never see archived rows without any extra filter, and the hot
+tables and their indexes only hold what is on the boards. Rows keep their
+ids (the SQLite tables use AUTOINCREMENT, so an id is never handed out
+twice), which makes restoring the same two statements the other way round.
+
+Cards archived with their list come back with it. Cards archived on their
+own go back to the end of a list picked when restoring, else of the list
+they came from, or of the board's first list when that one is gone.
+
+A board's archive is browsed newest first, a page at a time, with an opaque
+cursor like the dashboard's.
+
+The auto-archive policy archives cards that have sat in a list named in
+AUTO_ARCHIVE_LISTS (e.g. 'Done') for AUTO_ARCHIVE_DAYS, at most
+AUTO_ARCHIVE_BATCH_SIZE cards per transaction. The development server runs
+it every AUTO_ARCHIVE_INTERVAL_MINUTES in a background task; other
+deployments run `flask --app run nexus auto-archive` from cron.
+"""
+import base64
+import time
+from collections import namedtuple, OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select
+from project import db, socketio
+from project.models import Board, List, Card, ArchivedList, ArchivedCard
+from project.ranking import ranks_between, next_list_position
+from project.changes import commit_change, card_payload, list_payload
+from project.bulk import InvalidBulkRequest, selection, check_on_board
+from project.dashboard import InvalidCursor
+from project import metrics, search
+
+ArchivedListRow = namedtuple('ArchivedListRow', 'id name archived_at cards')
+ArchivedCardRow = namedtuple('ArchivedCardRow', 'id title description list_id list_name archived_at')
+ArchivePage = namedtuple('ArchivePage', 'items next_cursor')
+
+
+class NotArchived(LookupError):
+    """The list is not in the board's archive."""
+
+
+# --- Archiving ---
+
+_ARCHIVED_CARD_COLUMNS = ['id', 'title', 'description', 'position', 'date_created', 'board_id', 'list_id',
+                          'with_list', 'version', 'archived_at']
+
+
+def _copy_cards(where, with_list, now):
+    db.session.execute(insert(ArchivedCard).from_select(_ARCHIVED_CARD_COLUMNS, select(
+        Card.id, Card.title, Card.description, Card.position, Card.date_created, List.board_id, Card.list_id,
+        literal(with_list, db.Boolean), Card.version, literal(now, db.DateTime)
+    ).join(List, List.id == Card.list_id).where(where)))
+
+
+def _archive_cards(board_id, card_ids):
+    """Archive cards known to be on the board. Returns the board version."""
+    _copy_cards(Card.id.in_(card_ids), False, datetime.utcnow())
+    search.remove_cards(card_ids)
+    db.session.execute(delete(Card).where(Card.id.in_(card_ids)),
+                       execution_options={'synchronize_session': False})
+    return commit_change(board_id, 'cards_archived', {'ids': card_ids})
+
+
+def archive_cards(board_id, card_ids):
+    """Archive a selection of at most BULK_MAX_CARDS cards. Returns (ids, board version)."""
+    card_ids = selection(card_ids)
+    check_on_board(board_id, card_ids)
+    return card_ids, _archive_cards(board_id, card_ids)
+
+
+def archive_list(list_item):
+    """Archive a list together with its cards. Returns the board version."""
+    board_id, list_id = list_item.board_id, list_item.id
+    now = datetime.utcnow()
+    db.session.execute(insert(ArchivedList).from_select(
+        ['id', 'name', 'position', 'date_created', 'board_id', 'version', 'archived_at'],
+        select(List.id, List.name, List.position, List.date_created, List.board_id, List.version,
+               literal(now, db.DateTime)).where(List.id == list_id)))
+    _copy_cards(Card.list_id == list_id, True, now)
+    search.remove_list(list_id)
+    # The list's cards follow by ON DELETE CASCADE
+    db.session.execute(delete(List).where(List.id == list_id),
+                       execution_options={'synchronize_session': False})
+    return commit_change(board_id, 'list_archived', {'id': list_id})
+
+
+# --- Restoring ---
+
+def _restore_cards(where, position, list_id):
+    """Move the archived cards matching `where` back to `cards`."""
+    db.session.execute(insert(Card).from_select(
+        ['id', 'title', 'description', 'position', 'date_created', 'list_id', 'entered_list_at', 'version'],
+        select(ArchivedCard.id, ArchivedCard.title, ArchivedCard.description, position,
+               ArchivedCard.date_created, list_id, literal(datetime.utcnow(), db.DateTime),
+               ArchivedCard.version + 1).where(where)))
+    db.session.execute(delete(ArchivedCard).where(where), execution_options={'synchronize_session': False})
+
+
+def _restored_cards(where):
+    """card_created-style payloads of the restored cards matching `where`."""
+    return [card_payload(row) for row in db.session.execute(
+        select(Card.id, Card.list_id, Card.title, Card.description, Card.position, Card.version)
+        .where(where).order_by(Card.list_id, Card.position, Card.id))]
+
+
+def restore_cards(board_id, card_ids, list_id=None):
+    """
+    Put cards archived on their own back at the end of `list_id`, or else of
+    the list each came from. Returns (ids, board version).
+    """
+    card_ids = selection(card_ids)
+    rows = db.session.execute(
+        select(ArchivedCard.id, ArchivedCard.list_id).where(
+            ArchivedCard.id.in_(card_ids), ArchivedCard.board_id == board_id, ~ArchivedCard.with_list)
+        .order_by(ArchivedCard.position, ArchivedCard.id)
+    ).all()
+    if len(rows) != len(card_ids):
+        raise InvalidBulkRequest("Some of the cards are not in this board's archive.")
+    lists = db.session.execute(
+        select(List.id).where(List.board_id == board_id).order_by(List.position)).scalars().all()
+    if list_id is not None and list_id not in lists:
+        raise InvalidBulkRequest('That list is not on this board.')
+    if not lists:
+        raise InvalidBulkRequest('The board has no list to restore the cards to.')
+
+    by_list = OrderedDict()
+    for row in rows:
+        target = list_id or (row.list_id if row.list_id in lists else lists[0])
+        by_list.setdefault(target, []).append(row.id)
+    targets, positions = {}, {}
+    for target, ids in by_list.items():
+        last = db.session.query(func.max(Card.position)).filter(Card.list_id == target).scalar()
+        positions.update(zip(ids, ranks_between(last, None, len(ids))))
+        targets.update(dict.fromkeys(ids, target))
+
+    _restore_cards(ArchivedCard.id.in_(card_ids), case(positions, value=ArchivedCard.id),
+                   case(targets, value=ArchivedCard.id))
+    search.index_cards(card_ids)
+    return card_ids, commit_change(board_id, 'cards_restored',
+                                   {'cards': _restored_cards(Card.id.in_(card_ids))})
+
+
+def restore_list(board_id, list_id):
+    """Put an archived list and its cards back at the end of the board. Returns the board version."""
+    if db.session.query(ArchivedList.board_id).filter(ArchivedList.id == list_id).scalar() != board_id:
+        raise NotArchived(list_id)
+    db.session.execute(insert(List).from_select(
+        ['id', 'name', 'position', 'date_created', 'board_id', 'version'],
+        select(ArchivedList.id, ArchivedList.name, literal(next_list_position(board_id), db.Float),
+               ArchivedList.date_created, ArchivedList.board_id, ArchivedList.version + 1
+               ).where(ArchivedList.id == list_id)))
+    _restore_cards(and_(ArchivedCard.list_id == list_id, ArchivedCard.with_list),
+                   ArchivedCard.position, ArchivedCard.list_id)
+    db.session.execute(delete(ArchivedList).where(ArchivedList.id == list_id),
+                       execution_options={'synchronize_session': False})
+    search.index_list(list_id)
+    payload = dict(list_payload(db.session.execute(
+        select(List.id, List.name, List.position, List.version).where(List.id == list_id)).one()),
+        cards=_restored_cards(Card.list_id == list_id))
+    return commit_change(board_id, 'list_restored', payload)
+
+
+# --- Browsing ---
+
+def encode_cursor(row):
+    raw = f'{row.archived_at.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        archived_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(archived_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+def _page(query, model, row_type, cursor, limit):
+    limit = limit or current_app.config.get('ARCHIVE_PAGE_SIZE', 20)
+    if cursor:
+        archived_at, row_id = decode_cursor(cursor)
+        query = query.where(or_(
+            model.archived_at < archived_at,
+            and_(model.archived_at == archived_at, model.id < row_id)
+        ))
+    # One extra row tells us whether there is a next page
+    rows = db.session.execute(query.order_by(model.archived_at.desc(), model.id.desc()).limit(limit + 1)).all()
+    items = [row_type(*row) for row in rows[:limit]]
+    return ArchivePage(items, encode_cursor(items[-1]) if len(rows) > limit else None)
+
+
+def archived_lists(board_id, cursor=None, limit=None):
+    """One page of a board's archived lists, newest first, with their card counts."""
+    cards = select(func.count(ArchivedCard.id)).where(
+        ArchivedCard.list_id == ArchivedList.id, ArchivedCard.with_list).scalar_subquery()
+    query = select(ArchivedList.id, ArchivedList.name, ArchivedList.archived_at, cards).where(
+        ArchivedList.board_id == board_id)
+    return _page(query, ArchivedList, ArchivedListRow, cursor, limit)
+
+
+def archived_cards(board_id, cursor=None, limit=None):
+    """One page of the cards archived on their own, newest first."""
+    query = select(
+        ArchivedCard.id, ArchivedCard.title, ArchivedCard.description, ArchivedCard.list_id,
+        func.coalesce(List.name, ArchivedList.name), ArchivedCard.archived_at
+    ).outerjoin(List, List.id == ArchivedCard.list_id).outerjoin(
+        ArchivedList, ArchivedList.id == ArchivedCard.list_id
+    ).where(ArchivedCard.board_id == board_id, ~ArchivedCard.with_list)
+    return _page(query, ArchivedCard, ArchivedCardRow, cursor, limit)
+
+
+# --- Auto-archive ---
+
+def _policy_lists():
+    names = current_app.config.get('AUTO_ARCHIVE_LISTS', 'Done')
+    return [name.strip().lower() for name in names.split(',') if name.strip()]
+
+
+def auto_archive():
+    """
+    Archive the cards that have been in an AUTO_ARCHIVE_LISTS list for
+    AUTO_ARCHIVE_DAYS, batch by batch. Returns the number of cards archived.
+    """
+    days = current_app.config.get('AUTO_ARCHIVE_DAYS', 30)
+    names = _policy_lists()
+    if days <= 0 or not names:
+        return 0
+    batch_size = current_app.config.get('AUTO_ARCHIVE_BATCH_SIZE', 500)
+    pause = current_app.config.get('AUTO_ARCHIVE_PAUSE_MS', 10) / 1000.0
+    next_batch = select(Card.id, List.board_id).join(List, List.id == Card.list_id).join(
+        Board, Board.id == List.board_id
+    ).where(
+        func.lower(List.name).in_(names),
+        Card.entered_list_at < datetime.utcnow() - timedelta(days=days),
+        ~Board.deleting
+    ).order_by(Card.id).limit(batch_size)
+
+    archived = 0
+    while True:
+        started = time.perf_counter()
+        rows = db.session.execute(next_batch).all()
+        if not rows:
+            break
+        by_board = OrderedDict()
+        for card_id, board_id in rows:
+            by_board.setdefault(board_id, []).append(card_id)
+        # One transaction and one change-log entry per board
+        for board_id, card_ids in by_board.items():
+            _archive_cards(board_id, card_ids)
+        archived += len(rows)
+        metrics.archive_batch_seconds.observe(time.perf_counter() - started)
+        socketio.sleep(pause)
+
+    if archived:
+        current_app.logger.info(f"Auto-archived {archived} cards")
+    return archived
+
+
+def _run_auto_archive(app, interval):
+    while True:
+        with app.app_context():
+            try:
+                auto_archive()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"Auto-archive failed: {e}")
+            finally:
+                db.session.remove()
+        socketio.sleep(interval)
+
+
+def start_auto_archive(app):
+    """Run auto_archive() every AUTO_ARCHIVE_INTERVAL_MINUTES in a background task (0: never)."""
+    minutes = app.config.get('AUTO_ARCHIVE_INTERVAL_MINUTES', 60)
+    if minutes > 0 and app.config.get('AUTO_ARCHIVE_DAYS', 30) > 0:
+        socketio.start_background_task(_run_auto_archive, app, minutes * 60)
@@ -1,5 +1,7 @@
 from flask import render_template, url_for, flash, redirect, request
-from project import db, bcrypt
+from project import db
+from project.passwords import hash_password, verify_and_upgrade
+from project.identity import get_user_by_email
 from project.forms import RegistrationForm, LoginForm
 from project.models import User
 from flask_login import login_user, current_user, logout_user
@@ -14,7 +16,7 @@ def register():
     form = RegistrationForm()
     if form.validate_on_submit():
         # Hash the password
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = hash_password(form.password.data)
         # Create new user
         user = User(username=form.username.data, email=form.email.data, password_hash=hashed_password)
         db.session.add(user)
@@ -34,9 +36,9 @@ def login():
         
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
-        # Check if user exists and password is correct
-        if user and bcrypt.check_password_hash(user.password_hash, form.password.data):
+        user = get_user_by_email(form.email.data)
+        # Check if user exists and password is correct (re-hashes at the configured cost)
+        if user and verify_and_upgrade(user, form.password.data):
             login_user(user, remember=form.remember.data)
             # Redirect to the page they were trying to access, or dashboard
             next_page = request.args.get('next')
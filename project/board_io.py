@@ -0,0 +1,172 @@
+"""
+Streamed JSON Lines import and export of whole boards.
+
+A board file is one JSON object per line: the board first, then its lists,
+then its cards (each card after the list it belongs to).
+
+    {"type": "board", "id": 7, "name": "Roadmap"}
+    {"type": "list", "id": 31, "name": "To Do", "position": 0.0}
+    {"type": "card", "id": 902, "list_id": 31, "title": "Ship it", "description": null, "position": 0.0}
+
+Export reads plain rows through a streaming cursor, so memory stays flat
+whatever the board size. Import writes lists and cards with bulk INSERTs in
+chunks of IMPORT_CHUNK_SIZE rows, without building ORM objects per row,
+and commits once at the end so a failed import leaves nothing behind.
+"""
+import json
+import math
+from flask import current_app
+from sqlalchemy import insert, select
+from project import db
+from project.models import Board, List, Card
+from project.ranking import RANK_STEP
+from project import search
+
+EXPORT_BATCH_SIZE = 1000
+
+
+class BoardImportError(ValueError):
+    """Raised for malformed import files; the message names the line."""
+
+
+def _line(obj):
+    return json.dumps(obj, separators=(',', ':')) + '\n'
+
+
+def export_board(board_id):
+    """Yield the board as JSON Lines strings. The board must exist."""
+    board = db.session.execute(
+        select(Board.id, Board.name).where(Board.id == board_id)
+    ).one()
+    yield _line({'type': 'board', 'id': board.id, 'name': board.name})
+
+    lists = db.session.execute(
+        select(List.id, List.name, List.position)
+        .where(List.board_id == board_id)
+        .order_by(List.position, List.id)
+    )
+    for row in lists:
+        yield _line({'type': 'list', 'id': row.id, 'name': row.name, 'position': row.position})
+
+    cards = db.session.execute(
+        select(Card.id, Card.list_id, Card.title, Card.description, Card.position)
+        .join(List, List.id == Card.list_id)
+        .where(List.board_id == board_id)
+        .order_by(Card.list_id, Card.position, Card.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    for row in cards:
+        yield _line({
+            'type': 'card', 'id': row.id, 'list_id': row.list_id, 'title': row.title,
+            'description': row.description, 'position': row.position,
+        })
+
+
+def _require(record, field, line_no, max_length=None):
+    value = record.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise BoardImportError(f"Line {line_no}: '{field}' is required.")
+    if max_length and len(value) > max_length:
+        raise BoardImportError(f"Line {line_no}: '{field}' is longer than {max_length} characters.")
+    return value
+
+
+def _position(record, line_no, default=None):
+    value = record.get('position')
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise BoardImportError(f"Line {line_no}: 'position' must be a number.")
+    return float(value)
+
+
+def _optional_text(record, field, line_no):
+    value = record.get(field)
+    if value is not None and not isinstance(value, str):
+        raise BoardImportError(f"Line {line_no}: '{field}' must be a string.")
+    return value
+
+
+def _ref(record, field, line_no, default=None):
+    """An id used to link cards to lists; any JSON number or string."""
+    value = record.get(field, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise BoardImportError(f"Line {line_no}: '{field}' must be a number or a string.")
+    return value
+
+
+def import_board(lines, owner_id, chunk_size=None, name=None):
+    """
+    Create a new board owned by `owner_id` from an iterable of JSON Lines.
+    Returns (board_id, number of lists, number of cards).
+    """
+    chunk_size = chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
+    board_id = None
+    list_ids = {}       # list id in the file -> new list id
+    next_position = {}  # new list id -> position for cards without one
+    pending_cards = []
+    card_count = 0
+
+    def flush_cards():
+        if pending_cards:
+            db.session.execute(insert(Card), pending_cards)
+            pending_cards.clear()
+
+    try:
+        for line_no, raw in enumerate(lines, start=1):
+            if isinstance(raw, bytes):
+                raw = raw.decode('utf-8')
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                raise BoardImportError(f"Line {line_no}: not valid JSON.")
+            kind = record.get('type') if isinstance(record, dict) else None
+
+            if kind == 'board':
+                if board_id is not None:
+                    raise BoardImportError(f"Line {line_no}: only one board per file.")
+                board_name = name or _require(record, 'name', line_no, 100)
+                board_id = db.session.execute(
+                    insert(Board).returning(Board.id), [{'name': board_name, 'user_id': owner_id}]
+                ).scalar_one()
+            elif board_id is None:
+                raise BoardImportError(f"Line {line_no}: the board line must come first.")
+            elif kind == 'list':
+                file_id = _ref(record, 'id', line_no, len(list_ids))
+                new_id = db.session.execute(
+                    insert(List).returning(List.id),
+                    [{'name': _require(record, 'name', line_no, 100),
+                      'position': _position(record, line_no, len(list_ids) * RANK_STEP),
+                      'board_id': board_id}]
+                ).scalar_one()
+                list_ids[file_id] = new_id
+                next_position[new_id] = 0.0
+            elif kind == 'card':
+                new_list_id = list_ids.get(_ref(record, 'list_id', line_no))
+                if new_list_id is None:
+                    raise BoardImportError(f"Line {line_no}: card refers to an unknown list.")
+                position = _position(record, line_no, next_position[new_list_id])
+                next_position[new_list_id] = max(next_position[new_list_id], position) + RANK_STEP
+                pending_cards.append({
+                    'title': _require(record, 'title', line_no, 200),
+                    'description': _optional_text(record, 'description', line_no),
+                    'position': position,
+                    'list_id': new_list_id,
+                })
+                card_count += 1
+                if len(pending_cards) >= chunk_size:
+                    flush_cards()
+            else:
+                raise BoardImportError(f"Line {line_no}: unknown record type {kind!r}.")
+
+        if board_id is None:
+            raise BoardImportError("The file does not contain a board.")
+        flush_cards()
+        search.index_board(board_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return board_id, len(list_ids), card_count
@@ -0,0 +1,120 @@
+"""
+Multi-card operations: move or delete a selection of cards at once.
+
+A bulk move puts the selected cards, in the order given, in front of one
+card of the target list (or at its end). They get evenly spread keys from
+the gap they land in (see ranking.ranks_between), written by one UPDATE
+for the whole set, and are announced like a move batch: one
+`cards_moved_batch` broadcast and one 'cards_moved' change-log entry. It
+runs under the same optimistic board-version check and retries as queued
+drags (see project/moves.py).
+
+A bulk delete removes the selection with one DELETE and logs a single
+'cards_deleted' change. Both take at most BULK_MAX_CARDS cards and are
+all-or-nothing: a card or list that is not on the board refuses the whole
+request with InvalidBulkRequest.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import case, delete, func, select, update
+from project import db
+from project.models import List, Card
+from project.ranking import ranks_between, gap_too_small, schedule_card_rebalance
+from project.changes import record_change, commit_change
+from project.moves import commit_with_retries, logged_moves, broadcast_moves
+from project import search
+
+
+class InvalidBulkRequest(ValueError):
+    """The selection is empty, too large, or reaches outside the board."""
+
+
+def is_id(value):
+    """True for an integer row id; JSON true/false are not ids."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def selection(card_ids):
+    """Distinct card ids in the order given."""
+    if not isinstance(card_ids, (list, tuple)) or not all(is_id(card_id) for card_id in card_ids):
+        raise InvalidBulkRequest('card_ids must be a list of card ids.')
+    card_ids = list(OrderedDict.fromkeys(card_ids))
+    if not card_ids:
+        raise InvalidBulkRequest('No cards selected.')
+    limit = current_app.config.get('BULK_MAX_CARDS', 500)
+    if len(card_ids) > limit:
+        raise InvalidBulkRequest(f'At most {limit} cards can be changed at once.')
+    return card_ids
+
+
+def check_on_board(board_id, card_ids):
+    """Refuse the request unless every card is on the board."""
+    found = db.session.execute(
+        select(func.count(Card.id)).join(List, List.id == Card.list_id).where(
+            Card.id.in_(card_ids), List.board_id == board_id)
+    ).scalar()
+    if found != len(card_ids):
+        raise InvalidBulkRequest('Some of the cards are not on this board.')
+
+
+def _gap(list_id, card_ids, next_sibling_id):
+    """(before, after) keys around the drop point, ignoring the moving cards."""
+    after = None
+    if next_sibling_id is not None and next_sibling_id not in card_ids:
+        after = db.session.execute(
+            select(Card.position).where(Card.id == next_sibling_id, Card.list_id == list_id)
+        ).scalar()
+    before = select(func.max(Card.position)).where(Card.list_id == list_id, Card.id.not_in(card_ids))
+    if after is not None:
+        before = before.where(Card.position < after)
+    return db.session.execute(before).scalar(), after
+
+
+def move_cards(board_id, card_ids, list_id, next_sibling_id=None):
+    """
+    Move `card_ids` in front of `next_sibling_id` in `list_id` (None: to the
+    end), keeping the order given. Returns (results, board version), with
+    results as for a move batch; the caller has already checked access.
+    """
+    card_ids = selection(card_ids)
+    if db.session.query(List.board_id).filter(List.id == list_id).scalar() != board_id:
+        raise InvalidBulkRequest('That list is not on this board.')
+
+    def attempt_once(seen):
+        check_on_board(board_id, card_ids)
+        now = datetime.utcnow()
+        before, after = _gap(list_id, card_ids, next_sibling_id)
+        positions = ranks_between(before, after, len(card_ids))
+        db.session.execute(
+            update(Card).where(Card.id.in_(card_ids)).values(
+                list_id=list_id,
+                entered_list_at=case((Card.list_id == list_id, Card.entered_list_at), else_=now),
+                position=case(dict(zip(card_ids, positions)), value=Card.id),
+                version=Card.version + 1),
+            execution_options={'synchronize_session': False})
+        versions = dict(db.session.execute(select(Card.id, Card.version).where(Card.id.in_(card_ids))).all())
+        results = OrderedDict(
+            (card_id, (list_id, position, versions[card_id])) for card_id, position in zip(card_ids, positions))
+        version = record_change(board_id, 'cards_moved', {'moves': logged_moves(results)},
+                                expected_version=seen)
+        # The keys are evenly spaced, so checking the first step checks them all
+        crowded = gap_too_small(before, positions[0], positions[1] if len(positions) > 1 else after)
+        return results, version, crowded
+
+    results, version, crowded = commit_with_retries(board_id, attempt_once)
+    if crowded:
+        schedule_card_rebalance(list_id)
+    broadcast_moves(board_id, version, results)
+    return results, version
+
+
+def delete_cards(board_id, card_ids):
+    """Delete `card_ids` from the board in one statement. Returns (deleted ids, board version)."""
+    card_ids = selection(card_ids)
+    check_on_board(board_id, card_ids)
+    search.remove_cards(card_ids)
+    # Positions are sparse keys, so the remaining cards keep theirs as-is
+    db.session.execute(delete(Card).where(Card.id.in_(card_ids)),
+                       execution_options={'synchronize_session': False})
+    return card_ids, commit_change(board_id, 'cards_deleted', {'ids': card_ids})
@@ -0,0 +1,101 @@
+"""
+Per-board versions and a bounded change log.
+
+Every mutation of a board's lists or cards bumps `Board.version` and appends
+a BoardChange row in the same transaction. Clients remember the version they
+last saw; after a reconnect they call the `sync_board` socket event and get
+only the changes they missed. Only the newest CHANGE_LOG_SIZE entries are
+kept per board; a client that fell further behind gets a full snapshot.
+"""
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+from project import db, socketio
+from project.models import Board, BoardChange
+from project import metrics
+
+
+def card_payload(card):
+    return {
+        'id': card.id,
+        'list_id': card.list_id,
+        'title': card.title,
+        'description': card.description,
+        'position': card.position,
+        'version': card.version,
+    }
+
+
+def list_payload(list_item):
+    return {
+        'id': list_item.id,
+        'name': list_item.name,
+        'position': list_item.position,
+        'version': list_item.version,
+    }
+
+
+def record_change(board_id, kind, payload, expected_version=None):
+    """
+    Bump the board's version and log the change. Does not commit.
+    Returns the new version.
+
+    With `expected_version`, raises StaleDataError (as the ORM does for a
+    stale card or list row) if another writer bumped the board since the
+    caller read that version.
+    """
+    # The UPDATE also serializes concurrent writers on the board row, so
+    # versions are handed out without gaps or duplicates
+    statement = update(Board).where(Board.id == board_id)
+    if expected_version is not None:
+        statement = statement.where(Board.version == expected_version)
+    result = db.session.execute(statement.values(version=Board.version + 1))
+    if expected_version is not None and result.rowcount != 1:
+        raise StaleDataError(f"Board {board_id} changed after version {expected_version}")
+    version = db.session.query(Board.version).filter(Board.id == board_id).scalar()
+    db.session.add(BoardChange(board_id=board_id, version=version, kind=kind, payload=payload))
+
+    keep = current_app.config.get('CHANGE_LOG_SIZE', 500)
+    db.session.query(BoardChange).filter(
+        BoardChange.board_id == board_id,
+        BoardChange.version <= version - keep
+    ).delete(synchronize_session=False)
+    return version
+
+
+def announce_change(board_id, version):
+    """Tell clients in the board's room that a newer version exists."""
+    metrics.record_broadcast('board_changed', str(board_id))
+    socketio.emit('board_changed', {'board_id': board_id, 'version': version}, room=str(board_id))
+
+
+def commit_change(board_id, kind, payload):
+    """record_change(), commit, then announce the new version. Returns it."""
+    version = record_change(board_id, kind, payload)
+    db.session.commit()
+    announce_change(board_id, version)
+    return version
+
+
+def changes_since(board_id, since_version):
+    """
+    Return (current_version, changes) where changes lists every change after
+    `since_version`, oldest first, or is None if the log no longer reaches
+    back that far (or the client claims a version we never issued).
+    """
+    current = db.session.query(Board.version).filter(Board.id == board_id).scalar()
+    if current is None or since_version > current:
+        return current, None
+    if since_version == current:
+        return current, []
+
+    rows = BoardChange.query.filter(
+        BoardChange.board_id == board_id,
+        BoardChange.version > since_version
+    ).order_by(BoardChange.version).all()
+    if not rows or rows[0].version != since_version + 1:
+        return current, None
+    return current, [
+        {'version': row.version, 'kind': row.kind, 'payload': row.payload}
+        for row in rows
+    ]
@@ -0,0 +1,112 @@
+import click
+from flask.cli import AppGroup
+from project import db
+
+nexus = AppGroup('nexus', help='NexusBoard maintenance commands.')
+
+
+@nexus.command('migrate')
+@click.option('--stamp', 'stamp_only', is_flag=True,
+              help='Mark all revisions as applied without running them (fresh databases).')
+def migrate_command(stamp_only):
+    """Bring an existing database up to the current schema."""
+    from project import migrations
+    db.create_all()
+    revisions = migrations.stamp() if stamp_only else migrations.upgrade()
+    if revisions:
+        from project import fragments
+        fragments.clear()
+    if not revisions:
+        click.echo('Database is up to date.')
+    for rev_id in revisions:
+        click.echo(f"{'Stamped' if stamp_only else 'Applied'} {rev_id}")
+
+
+@nexus.command('rebalance')
+@click.option('--board', 'board_id', type=int, default=None,
+              help='Only rebalance this board.')
+def rebalance_command(board_id):
+    """Respace list and card positions to evenly spaced keys."""
+    from project import ranking
+    from project.changes import announce_change
+    if board_id is None:
+        versions = ranking.rebalance_all()
+    else:
+        versions = {board_id: ranking.rebalance_board(board_id)}
+    db.session.commit()
+    # New board versions make open pages and other workers' cached markup
+    # catch up; this process's cache is cleared right away
+    for changed_board, version in versions.items():
+        if version is not None:
+            announce_change(changed_board, version)
+    from project import fragments
+    fragments.clear()
+    click.echo('Positions rebalanced.')
+
+
+@nexus.command('reindex')
+@click.option('--board', 'board_id', type=int, default=None,
+              help='Only reindex this board.')
+def reindex_command(board_id):
+    """Rebuild the card search index from the cards table."""
+    from project import search
+    if board_id is None:
+        count = search.rebuild()
+        message = f'Indexed {count} cards.'
+    else:
+        search.index_board(board_id)
+        message = f'Reindexed board {board_id}.'
+    db.session.commit()
+    click.echo(message)
+
+
+@nexus.command('purge-deleted')
+def purge_deleted_command():
+    """Finish deleting boards whose background purge was interrupted."""
+    from project import deletion
+    purged = deletion.resume()
+    if not purged:
+        click.echo('No boards waiting to be deleted.')
+    for board_id, cards in purged:
+        click.echo(f'Purged board {board_id} ({cards} cards).')
+
+
+@nexus.command('auto-archive')
+def auto_archive_command():
+    """Archive the cards due under the AUTO_ARCHIVE_* policy."""
+    from project import archive
+    click.echo(f'Archived {archive.auto_archive()} cards.')
+
+
+@nexus.command('export')
+@click.argument('board_id', type=int)
+@click.option('-o', '--output', type=click.File('w'), default='-',
+              help='File to write (default: stdout).')
+def export_command(board_id, output):
+    """Stream a board as JSON Lines."""
+    from project.board_io import export_board
+    from project.models import Board
+    if db.session.get(Board, board_id) is None:
+        raise click.ClickException(f'Board {board_id} does not exist.')
+    for line in export_board(board_id):
+        output.write(line)
+
+
+@nexus.command('import')
+@click.argument('source', type=click.File('r'))
+@click.option('--owner', 'owner_email', required=True, help='Email of the new board owner.')
+@click.option('--name', default=None, help='Name for the new board (default: from the file).')
+@click.option('--chunk-size', type=int, default=None,
+              help='Rows per bulk INSERT (default: IMPORT_CHUNK_SIZE).')
+def import_command(source, owner_email, name, chunk_size):
+    """Create a new board from a JSON Lines file."""
+    from project.board_io import import_board, BoardImportError
+    from project.models import User
+    owner = User.query.filter_by(email=owner_email).first()
+    if owner is None:
+        raise click.ClickException(f'No user with email {owner_email}.')
+    try:
+        board_id, lists, cards = import_board(source, owner.id, chunk_size=chunk_size, name=name)
+    except BoardImportError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Imported board {board_id}: {lists} lists, {cards} cards.')
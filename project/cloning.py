@@ -0,0 +1,84 @@
+"""
+Copying boards: "create from template" and cloning.
+
+A copy is made with a fixed handful of set-based statements in one
+transaction, whatever the size of the board: one INSERT for the board row,
+one read and one multi-row INSERT for its lists, then an INSERT ... SELECT
+each for its cards, the search index and, optionally, its members. No ORM
+object is built per list or card.
+
+The source lists are read once, FOR SHARE on PostgreSQL so they cannot be
+moved or deleted until the copy commits. Their copies get evenly spaced
+keys in that order and are written by one multi-row INSERT that returns
+the new ids in parameter order. The cards INSERT ... SELECT then maps each
+card's list id to its copy's with a CASE, so the cards follow the lists
+as they were read even if the board changes in between. Card keys are
+copied as they are.
+
+Only what is on the board is copied; its archive, change log and
+presence stay behind.
+"""
+from datetime import datetime
+from sqlalchemy import case, insert, literal, or_, select
+from project import db
+from project.models import Board, List, Card, board_members
+from project.ranking import RANK_STEP
+from project import search
+
+
+def clone_board(source_id, owner_id, name, include_members=False):
+    """
+    Copy a board's lists and cards into a new board owned by `owner_id`,
+    optionally with the source's members. Returns (board_id, number of
+    lists, number of cards); the caller has already checked access.
+    """
+    now = datetime.utcnow()
+    try:
+        board_id = db.session.execute(
+            insert(Board).returning(Board.id), [{'name': name, 'user_id': owner_id}]
+        ).scalar_one()
+
+        source = db.session.execute(
+            select(List.id, List.name).where(List.board_id == source_id)
+            .order_by(List.position, List.id).with_for_update(read=True)
+        ).all()
+        copies = {}
+        if source:
+            new_ids = db.session.execute(
+                insert(List).returning(List.id, sort_by_parameter_order=True),
+                [{'name': row.name, 'position': index * RANK_STEP, 'board_id': board_id, 'date_created': now}
+                 for index, row in enumerate(source)]
+            ).scalars().all()
+            copies = dict(zip((row.id for row in source), new_ids))
+
+        cards = 0
+        if copies:
+            cards = db.session.execute(insert(Card).from_select(
+                ['title', 'description', 'position', 'list_id', 'date_created', 'entered_list_at'],
+                select(Card.title, Card.description, Card.position, case(copies, value=Card.list_id),
+                       literal(now, db.DateTime), literal(now, db.DateTime))
+                .where(Card.list_id.in_(list(copies)))
+            )).rowcount
+
+        if include_members:
+            db.session.execute(insert(board_members).from_select(
+                ['board_id', 'user_id'],
+                select(literal(board_id), board_members.c.user_id).where(
+                    board_members.c.board_id == source_id, board_members.c.user_id != owner_id)
+            ))
+        search.index_board(board_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return board_id, len(copies), cards
+
+
+def templates_for(user_id, limit=50):
+    """(id, name) rows of the template boards `user_id` can open, by name."""
+    shared = select(board_members.c.board_id).where(board_members.c.user_id == user_id)
+    return db.session.execute(
+        select(Board.id, Board.name).where(
+            Board.is_template, ~Board.deleting, or_(Board.user_id == user_id, Board.id.in_(shared)))
+        .order_by(Board.name, Board.id).limit(limit)
+    ).all()
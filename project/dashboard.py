@@ -0,0 +1,156 @@
+"""
+Keyset-paginated board feeds and cached per-board summaries for the dashboard.
+
+Pages are ordered by (date_created, id) descending and continue from an
+opaque cursor holding the last row's key, so every page costs the same
+whatever the number of boards a user owns or belongs to. Summary counts
+(lists, cards, members) for a page come from one aggregate query and are
+cached per board until its version changes, its membership changes, or
+DASHBOARD_SUMMARY_TTL seconds pass.
+"""
+import base64
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, func, or_, select
+from project import db
+from project.models import User, Board, List, Card, board_members
+
+OWNED = 'owned'
+SHARED = 'shared'
+ALL = 'all'
+
+BoardRow = namedtuple('BoardRow', 'id name date_created version owner_id owner_username deleting')
+BoardSummary = namedtuple('BoardSummary', 'lists cards members')
+Page = namedtuple('Page', 'boards next_cursor')
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that were not produced by encode_cursor()."""
+
+
+def encode_cursor(row):
+    raw = f'{row.date_created.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created, board_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created), int(board_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+def boards_page(user_id, feed=OWNED, cursor=None, limit=None):
+    """One page of the user's owned, shared or combined boards, newest first."""
+    limit = limit or current_app.config.get('DASHBOARD_PAGE_SIZE', 20)
+    query = select(
+        Board.id, Board.name, Board.date_created, Board.version, Board.user_id, User.username, Board.deleting
+    ).join(User, User.id == Board.user_id)
+    # Boards being purged are only listed for their owner, to show progress
+    query = query.where(or_(~Board.deleting, Board.user_id == user_id))
+
+    shared_ids = select(board_members.c.board_id).where(board_members.c.user_id == user_id)
+    if feed == OWNED:
+        query = query.where(Board.user_id == user_id)
+    elif feed == SHARED:
+        query = query.where(Board.id.in_(shared_ids))
+    elif feed == ALL:
+        query = query.where(or_(Board.user_id == user_id, Board.id.in_(shared_ids)))
+    else:
+        raise ValueError(f'Unknown feed {feed!r}')
+
+    if cursor:
+        created, board_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Board.date_created < created,
+            and_(Board.date_created == created, Board.id < board_id)
+        ))
+
+    # One extra row tells us whether there is a next page
+    rows = db.session.execute(
+        query.order_by(Board.date_created.desc(), Board.id.desc()).limit(limit + 1)
+    ).all()
+    boards = [BoardRow(*row) for row in rows[:limit]]
+    next_cursor = encode_cursor(boards[-1]) if len(rows) > limit else None
+    return Page(boards, next_cursor)
+
+
+# --- Summaries ---
+
+class SummaryCache:
+    """board_id -> (version, summary, expires), LRU-bounded."""
+
+    def __init__(self, max_size=5000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, board_id, version):
+        with self._lock:
+            entry = self._entries.get(board_id)
+            if entry is None or entry[0] != version or entry[2] < time.monotonic():
+                return None
+            self._entries.move_to_end(board_id)
+            return entry[1]
+
+    def set(self, board_id, version, summary, ttl):
+        with self._lock:
+            self._entries[board_id] = (version, summary, time.monotonic() + ttl)
+            self._entries.move_to_end(board_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def forget(self, board_id):
+        with self._lock:
+            self._entries.pop(board_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_summaries = SummaryCache()
+
+
+def _count_summaries(board_ids):
+    list_count = select(func.count(List.id)).where(List.board_id == Board.id).scalar_subquery()
+    card_count = select(func.count(Card.id)).join(List, List.id == Card.list_id).where(
+        List.board_id == Board.id).scalar_subquery()
+    member_count = select(func.count()).select_from(board_members).where(
+        board_members.c.board_id == Board.id).scalar_subquery()
+    rows = db.session.execute(
+        select(Board.id, list_count, card_count, member_count).where(Board.id.in_(board_ids))
+    )
+    return {row[0]: BoardSummary(row[1], row[2], row[3]) for row in rows}
+
+
+def board_summaries(boards):
+    """Map board id -> BoardSummary for BoardRows, one query for all cache misses."""
+    result, missing = {}, {}
+    for board in boards:
+        summary = _summaries.get(board.id, board.version)
+        if summary is None:
+            missing[board.id] = board.version
+        else:
+            result[board.id] = summary
+
+    if missing:
+        ttl = current_app.config.get('DASHBOARD_SUMMARY_TTL', 60)
+        for board_id, summary in _count_summaries(list(missing)).items():
+            _summaries.set(board_id, missing[board_id], summary, ttl)
+            result[board_id] = summary
+    return result
+
+
+def forget_summary(board_id):
+    """Drop a cached summary, e.g. after the board's membership changed."""
+    _summaries.forget(board_id)
+
+
+def clear_summaries():
+    _summaries.clear()
@@ -0,0 +1,127 @@
+"""
+Background purging of large boards.
+
+Lists, cards, change-log entries and memberships reference their board with
+ON DELETE CASCADE, so an ordinary board delete is a single DELETE and the
+database removes the rest without loading any of it (see
+mutations.delete_board). For a board with tens of thousands of cards that
+one statement is still a long transaction, so boards with more than
+BOARD_DELETE_ASYNC_CARDS cards are only marked `deleting` there: access
+checks, search and the dashboard treat them as gone at once, and a
+background task deletes their cards BOARD_DELETE_CHUNK_SIZE at a time, one
+short transaction per chunk with a BOARD_DELETE_PAUSE_MS pause in between
+so other writers get their turn. The board row goes last.
+
+Owners see the cards left on the dashboard and at
+GET /api/v1/boards/<id>/deletion. Purges cut short by a restart are picked
+up again by `flask --app run nexus purge-deleted`.
+"""
+import threading
+import time
+from flask import current_app
+from sqlalchemy import delete, func, select
+from project import db, socketio
+from project.models import Board, List, Card
+from project.access import invalidate_board
+from project.dashboard import forget_summary
+from project import fragments, metrics, search
+
+
+def card_count(board_id):
+    return db.session.execute(
+        select(func.count(Card.id)).join(List, List.id == Card.list_id).where(List.board_id == board_id)
+    ).scalar()
+
+
+def cards_left(board_ids):
+    """board id -> cards not purged yet, for those of `board_ids` being deleted."""
+    if not board_ids:
+        return {}
+    rows = db.session.execute(
+        select(Board.id, func.count(Card.id))
+        .outerjoin(List, List.board_id == Board.id).outerjoin(Card, Card.list_id == List.id)
+        .where(Board.id.in_(board_ids), Board.deleting).group_by(Board.id)
+    )
+    return {board_id: count for board_id, count in rows}
+
+
+def forget_board(board_id):
+    """Drop everything cached about a board that is going away."""
+    invalidate_board(board_id)
+    forget_summary(board_id)
+    fragments.invalidate_board(board_id)
+
+
+def start(board):
+    """Mark `board` as deleting, commit, and purge it in the background."""
+    board.deleting = True
+    db.session.commit()
+    forget_board(board.id)
+    schedule_purge(board.id)
+
+
+def purge(board_id):
+    """Delete a board marked as deleting, chunk by chunk. Returns the cards deleted."""
+    if not db.session.query(Board.deleting).filter(Board.id == board_id).scalar():
+        return 0
+    chunk_size = current_app.config.get('BOARD_DELETE_CHUNK_SIZE', 1000)
+    pause = current_app.config.get('BOARD_DELETE_PAUSE_MS', 10) / 1000.0
+    next_chunk = select(Card.id).join(List, List.id == Card.list_id).where(
+        List.board_id == board_id).limit(chunk_size)
+
+    deleted = 0
+    while True:
+        started = time.perf_counter()
+        card_ids = db.session.execute(next_chunk).scalars().all()
+        if not card_ids:
+            break
+        search.remove_cards(card_ids)
+        db.session.execute(delete(Card).where(Card.id.in_(card_ids)),
+                           execution_options={'synchronize_session': False})
+        db.session.commit()
+        deleted += len(card_ids)
+        metrics.purge_chunk_seconds.observe(time.perf_counter() - started)
+        socketio.sleep(pause)
+
+    # Lists, the bounded change log and memberships go with the board row
+    db.session.execute(delete(Board).where(Board.id == board_id),
+                       execution_options={'synchronize_session': False})
+    db.session.commit()
+    forget_board(board_id)
+    current_app.logger.info(f"Purged board {board_id} ({deleted} cards)")
+    return deleted
+
+
+def resume():
+    """Purge every board still marked as deleting. Returns (board id, cards) pairs."""
+    board_ids = db.session.execute(select(Board.id).where(Board.deleting)).scalars().all()
+    return [(board_id, purge(board_id)) for board_id in board_ids]
+
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+def _run_purge(app, board_id):
+    try:
+        with app.app_context():
+            try:
+                purge(board_id)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"Purge of board {board_id} failed: {e}")
+            finally:
+                db.session.remove()
+    finally:
+        with _running_lock:
+            _running.discard(board_id)
+
+
+def schedule_purge(board_id):
+    """Purge a board in a background task (one per board per process)."""
+    with _running_lock:
+        if board_id in _running:
+            return
+        _running.add(board_id)
+    app = current_app._get_current_object()
+    socketio.start_background_task(_run_purge, app, board_id)
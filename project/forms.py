@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField, TextAreaField
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, TextAreaField, HiddenField, SelectField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
-from project.models import User
+from project.identity import get_user_by_email, get_user_by_username
 
 # --- USER FORMS (From Module 1) ---
 
@@ -18,13 +18,13 @@ class RegistrationForm(FlaskForm):
 
     def validate_username(self, username):
         """Check if username is already taken."""
-        user = User.query.filter_by(username=username.data).first()
+        user = get_user_by_username(username.data)
         if user:
             raise ValidationError('That username is taken. Please choose a different one.')
 
     def validate_email(self, email):
         """Check if email is already in use."""
-        user = User.query.filter_by(email=email.data).first()
+        user = get_user_by_email(email.data)
         if user:
             raise ValidationError('That email is already in use. Please choose a different one.')
 
@@ -45,6 +45,16 @@ class CreateBoardForm(FlaskForm):
     name = StringField('Board Name', validators=[DataRequired(), Length(min=3, max=100)])
     submit = SubmitField('Create Board')
 
+class NewBoardForm(CreateBoardForm):
+    """Dashboard form: a new board, empty or copied from a template."""
+    # Choices are the user's templates, filled in by the view
+    template = SelectField('Start from', coerce=int, default=0)
+    include_members = BooleanField("Invite the template's members")
+
+class EditBoardForm(CreateBoardForm):
+    """Form to rename a board and mark it as a template."""
+    is_template = BooleanField('Offer as a template for new boards')
+
 class CreateListForm(FlaskForm):
     """Form to create a new list."""
     name = StringField('List Name', validators=[DataRequired(), Length(min=1, max=100)])
@@ -56,6 +66,22 @@ class CreateCardForm(FlaskForm):
     description = TextAreaField('Description (Optional)', validators=[Length(max=500)])
     submit = SubmitField('Create Card')
 
+# --- Edit forms: the row version the form was rendered from travels along,
+# so saving over someone else's newer change is refused (see project/mutations.py) ---
+
+def _optional_int(value):
+    return int(value) if value not in (None, '') else None
+
+
+class EditListForm(CreateListForm):
+    """Form to rename a list."""
+    version = HiddenField(filters=[_optional_int])
+
+
+class EditCardForm(CreateCardForm):
+    """Form to edit a card."""
+    version = HiddenField(filters=[_optional_int])
+
 # --- NEW: Board Sharing Form ---
 
 class InviteUserForm(FlaskForm):
@@ -65,6 +91,6 @@ class InviteUserForm(FlaskForm):
 
     def validate_email(self, email):
         """Check if user exists."""
-        user = User.query.filter_by(email=email.data).first()
+        user = get_user_by_email(email.data)
         if not user:
             raise ValidationError('No user found with that email address.')
\ No newline at end of file
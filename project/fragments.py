@@ -0,0 +1,208 @@
+"""
+Cache of the rendered list/card markup of a board.
+
+The canvas of board.html (lists, cards and their forms) is the same for
+every viewer of a given board version, so it is rendered once and kept
+under (board id, version, board creation time). Every mutation bumps the
+board version through the change log, so a new version simply misses and
+stale entries for the board are replaced; deleting a board drops them.
+The creation time keeps a reused board id from ever matching old markup.
+
+Per-user parts stay out of the fragment: the owner-only links live in
+board.html, and CSRF fields are rendered with a placeholder that is
+swapped for the viewer's token on the way out.
+
+FRAGMENT_CACHE picks the backend: 'memory' (per-process LRU, the default),
+'disk' (files under FRAGMENT_CACHE_DIR, shared by all workers on a host)
+or 'none'. Both backends evict least recently used boards once they hold
+more than FRAGMENT_CACHE_MAX_BYTES.
+"""
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import current_app, render_template
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+from project.snapshot import load_board_snapshot
+
+CSRF_PLACEHOLDER = '__NEXUS_CSRF_TOKEN__'
+
+
+class MemoryFragmentCache:
+    """board id -> (key, html), LRU by total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key[0])
+            if entry is None or entry[0] != key:
+                return None
+            self._entries.move_to_end(key[0])
+            return entry[1]
+
+    def set(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key[0])
+            self._entries[key[0]] = (key, html, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, board_id):
+        entry = self._entries.pop(board_id, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def invalidate(self, board_id):
+        with self._lock:
+            self._drop(board_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class DiskFragmentCache:
+    """
+    One file per board, '<board id>-<version>-<created>.html'. Writes go
+    through a temp file and os.replace(), so readers never see half a file.
+    Access times are bumped on hits and used as the LRU order.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, '-'.join(str(part) for part in key) + '.html')
+
+    def _board_files(self, board_id):
+        prefix = f'{board_id}-'
+        return [entry.path for entry in os.scandir(self.directory)
+                if entry.name.startswith(prefix) and entry.name.endswith('.html')]
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                html = f.read()
+            os.utime(path)
+            return html
+        except OSError:
+            return None
+
+    def set(self, key, html):
+        data = html.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        self.invalidate(key[0])
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.html')]
+        total = 0
+        stats = []
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            total += stat.st_size
+            stats.append((stat.st_atime, stat.st_size, entry.path))
+        for _, size, path in sorted(stats):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def invalidate(self, board_id):
+        for path in self._board_files(board_id):
+            self._remove(path)
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.html'):
+                self._remove(entry.path)
+
+
+_backend = None
+_backend_settings = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The configured backend, or None when FRAGMENT_CACHE is 'none'."""
+    global _backend, _backend_settings
+    config = current_app.config
+    settings = (config.get('FRAGMENT_CACHE', 'memory'),
+                config.get('FRAGMENT_CACHE_DIR'),
+                config.get('FRAGMENT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    with _backend_lock:
+        if settings != _backend_settings:
+            kind, directory, max_bytes = settings
+            if kind == 'memory':
+                _backend = MemoryFragmentCache(max_bytes)
+            elif kind == 'disk':
+                directory = directory or os.path.join(tempfile.gettempdir(), 'nexus-fragments')
+                _backend = DiskFragmentCache(directory, max_bytes)
+            elif kind == 'none':
+                _backend = None
+            else:
+                raise ValueError(f'Unknown FRAGMENT_CACHE {kind!r}')
+            _backend_settings = settings
+        return _backend
+
+
+def _key(board_id, version, created):
+    return (board_id, version, int(created.timestamp() * 1000000) if created else 0)
+
+
+def render_board_canvas(head, card_form):
+    """
+    The lists and cards of the board described by `head` (a BoardHead) as
+    Markup, rendered from a snapshot only on a cache miss.
+    """
+    backend = get_backend()
+    html = backend.get(_key(head.id, head.version, head.date_created)) if backend else None
+    if html is None:
+        snapshot = load_board_snapshot(head.id, head)
+        html = render_template('_board_canvas.html', board=snapshot, card_form=card_form,
+                               csrf_placeholder=CSRF_PLACEHOLDER)
+        if backend:
+            backend.set(_key(head.id, head.version, head.date_created), html)
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
+        html = html.replace(CSRF_PLACEHOLDER, generate_csrf())
+    return Markup(html)
+
+
+def invalidate_board(board_id):
+    backend = get_backend()
+    if backend:
+        backend.invalidate(board_id)
+
+
+def clear():
+    backend = get_backend()
+    if backend:
+        backend.clear()
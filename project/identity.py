@@ -0,0 +1,161 @@
+"""
+User lookups by id, email or username, memoised per request.
+
+The first lookup of a user within a request (app context) queries the
+database; later lookups of the same id, email or username -- including
+"no such user" answers -- come from a memo in `g`. So login, the form
+validators and the route that follows share one query.
+
+With USER_CACHE_TTL > 0, found users are also kept in a per-process LRU
+cache across requests and re-attached to the session without a query. Any
+insert, update or delete of a User in this process drops its entry; other
+processes see a change within USER_CACHE_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from project import db
+from project.models import User
+
+ID = 'id'
+EMAIL = 'email'
+USERNAME = 'username'
+
+
+class UserCache:
+    """Thread-safe LRU cache of user id -> column values, with a TTL."""
+
+    def __init__(self, max_size=10000, ttl=0.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user id -> (values, expires)
+        self._ids = {}                 # (EMAIL|USERNAME, value) -> user id
+        self._lock = threading.Lock()
+
+    def get(self, field, value):
+        with self._lock:
+            user_id = value if field == ID else self._ids.get((field, value))
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            values, expires = entry
+            # An email or username may have moved to another user since
+            if expires < time.monotonic() or values[field] != value:
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def set(self, values):
+        with self._lock:
+            self._entries[values[ID]] = (values, time.monotonic() + self.ttl)
+            self._entries.move_to_end(values[ID])
+            self._ids[(EMAIL, values[EMAIL])] = values[ID]
+            self._ids[(USERNAME, values[USERNAME])] = values[ID]
+            while len(self._entries) > self.max_size:
+                old_id, (old_values, _) = self._entries.popitem(last=False)
+                self._ids.pop((EMAIL, old_values[EMAIL]), None)
+                self._ids.pop((USERNAME, old_values[USERNAME]), None)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._ids.pop((EMAIL, entry[0][EMAIL]), None)
+                self._ids.pop((USERNAME, entry[0][USERNAME]), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+
+
+_cache = UserCache()
+
+
+def _configure_cache():
+    config = current_app.config
+    _cache.max_size = config.get('USER_CACHE_SIZE', _cache.max_size)
+    _cache.ttl = config.get('USER_CACHE_TTL', _cache.ttl)
+
+
+def _memo():
+    if not has_app_context():
+        return None
+    if '_identity' not in g:
+        g._identity = {}
+    return g._identity
+
+
+def _values(user):
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+
+def _attach(values):
+    """A persistent User for cached column values, without a SELECT."""
+    user = db.session.identity_map.get(identity_key(User, values[ID]))
+    if user is None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        db.session.add(user)
+    return user
+
+
+def _lookup(field, value):
+    memo = _memo()
+    if memo is not None and (field, value) in memo:
+        return memo[(field, value)]
+
+    _configure_cache()
+    user = None
+    values = _cache.get(field, value) if _cache.ttl > 0 else None
+    if values is not None:
+        user = _attach(values)
+    elif field == ID:
+        user = db.session.get(User, value)
+    else:
+        user = User.query.filter(getattr(User, field) == value).first()
+    if user is not None and values is None and _cache.ttl > 0:
+        _cache.set(_values(user))
+
+    if memo is not None:
+        memo[(field, value)] = user
+        if user is not None:
+            memo[(ID, user.id)] = user
+            memo[(EMAIL, user.email)] = user
+            memo[(USERNAME, user.username)] = user
+    return user
+
+
+def get_user(user_id):
+    return _lookup(ID, user_id)
+
+
+def get_user_by_email(email):
+    return _lookup(EMAIL, email)
+
+
+def get_user_by_username(username):
+    return _lookup(USERNAME, username)
+
+
+def invalidate_user(user_id):
+    """Forget a user in this request and in the process cache."""
+    _cache.invalidate(user_id)
+    if has_app_context():
+        g.pop('_identity', None)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    # A new user also invalidates any "no such email/username" memo entries
+    invalidate_user(target.id)
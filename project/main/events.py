@@ -1,112 +1,269 @@
-from flask import request
+from flask import request, current_app
 from flask_socketio import emit, join_room, leave_room
 from project import socketio, db
-from project.models import Card, List, Board # Import Board
+from project.models import Card, List
 from flask_login import current_user # Import current_user
-from sqlalchemy import and_
+from project.access import current_user_can_access
+from project.moves import enqueue_move, PendingMove, LostRace, move_list, list_rows, ListMoveConflict
+from project.bulk import move_cards, delete_cards, InvalidBulkRequest
+from project.archive import archive_cards
+from project.changes import changes_since
+from project.snapshot import load_board_snapshot, snapshot_to_dict
+from project.metrics import timed_event, record_join
+from project.replica import mark_socket_write
+from project import presence
+
+
+def _parse_id(value):
+    """An integer id, sent as 12 or as the DOM id 'card-12'."""
+    if isinstance(value, bool):
+        raise ValueError(f'Not an id: {value!r}')
+    if isinstance(value, int):
+        return value
+    return int(str(value).rsplit('-', 1)[-1])
+
+
+def _parse_ids(values):
+    """A selection of ids; anything but a list of ids refuses the request."""
+    if not isinstance(values, (list, tuple)):
+        raise InvalidBulkRequest('card_ids must be a list of card ids.')
+    try:
+        return [_parse_id(value) for value in values]
+    except (TypeError, ValueError):
+        raise InvalidBulkRequest('card_ids must be a list of card ids.')
+
 
 @socketio.on('join_board')
+@timed_event
 def handle_join_board(data):
     """
     Client emits this event when they load a board page.
     This adds them to a 'room' for that specific board.
     """
     board_id = data['board_id']
-    board = Board.query.get(int(board_id))
 
     # --- NEW: Socket Security Check ---
-    if not current_user.is_authenticated or (board.owner != current_user and current_user not in board.members.all()):
-        print(f"Unauthorized socket join attempt for board {board_id}")
+    if not current_user_can_access(int(board_id)):
+        current_app.logger.warning(f"socket join_board denied sid={request.sid} "
+                                   f"user={current_user.get_id()} board={board_id}")
         return # Do not let them join the room
 
-    join_room(board_id)
-    print(f"Client {request.sid} joined board {board_id}")
+    join_room(str(board_id))
+    record_join(str(board_id))
+    presence.join(int(board_id), request.sid, current_user)
+    current_app.logger.info(f"socket join_board sid={request.sid} board={board_id}")
 
 
 @socketio.on('leave_board')
+@timed_event
 def handle_leave_board(data):
     # ... (This function is fine, no security check needed to leave) ...
     board_id = data['board_id']
-    leave_room(board_id)
-    print(f"Client {request.sid} left board {board_id}")
+    leave_room(str(board_id))
+    presence.leave(int(board_id), request.sid)
+    current_app.logger.info(f"socket leave_board sid={request.sid} board={board_id}")
+
+
+@socketio.on('presence_heartbeat')
+@timed_event
+def handle_presence_heartbeat(data=None):
+    """Sent by open board pages every PRESENCE_HEARTBEAT_SECONDS."""
+    presence.heartbeat(request.sid)
+
+
+@socketio.on('disconnect')
+@timed_event
+def handle_disconnect(reason=None):
+    """Closed tabs and dropped connections never send leave_board."""
+    presence.disconnect(request.sid)
+    current_app.logger.info(f"socket disconnect sid={request.sid} reason={reason}")
 
 
 @socketio.on('card_moved')
+@timed_event
 def handle_card_move(data):
     """
     Fired when a user drags and drops a card.
-    Updates the database and broadcasts the change to other users.
+    Queues the move for its board; the queue updates the database and
+    broadcasts the resulting positions to everyone in the room.
     """
     try:
         # Parse data from client
-        card_id_int = int(data['card_id'].split('-')[1])
-        new_list_id_int = int(data['new_list_id'].split('-')[1])
-        
-        card = Card.query.get_or_404(card_id_int)
+        card_id_int = _parse_id(data['card_id'])
+        new_list_id_int = _parse_id(data['new_list_id'])
+        next_sibling_id = data.get('next_sibling_id')
+        sibling_id_int = _parse_id(next_sibling_id) if next_sibling_id else None
+        # The card version the client rendered; stale drags get move_conflict
+        version = data.get('version')
+        version = int(version) if version is not None else None
+
+        board_id = db.session.query(List.board_id).join(Card, Card.list_id == List.id).filter(
+            Card.id == card_id_int).scalar()
+        if board_id is None:
+            emit('move_error', {'error': 'Card not found.'}, room=request.sid)
+            return
         
         # --- NEW: Socket Security Check ---
-        board = card.list.board
-        if not current_user.is_authenticated or (board.owner != current_user and current_user not in board.members.all()):
-            print(f"Unauthorized socket move attempt by {current_user.id} for board {board.id}")
+        if not current_user_can_access(board_id):
+            current_app.logger.warning(f"socket card_moved denied sid={request.sid} "
+                                       f"user={current_user.get_id()} board={board_id}")
             emit('move_error', {'error': 'You do not have permission to modify this board.'}, room=request.sid)
             return
 
-        # --- (Rest of the function is the same as Module 4) ---
-        
-        next_sibling_id_str = data['next_sibling_id']
-        board_id = board.id # Get board_id for broadcasting
-        
-        old_list_id_int = card.list_id
-        old_position = card.position
-
-        # Calculate new position
-        new_position = 0
-        if next_sibling_id_str:
-            sibling_id_int = int(next_sibling_id_str.split('-')[1])
-            sibling = Card.query.get_or_404(sibling_id_int)
-            new_position = sibling.position
-        else:
-            new_position = db.session.query(db.func.count(Card.id)).filter(
-                Card.list_id == new_list_id_int
-            ).scalar()
-            if old_list_id_int == new_list_id_int and old_position < new_position:
-                 new_position -= 1
-
-        # Database Update Transaction
-        if old_list_id_int == new_list_id_int:
-            if old_position < new_position:
-                # Moving Down
-                db.session.query(Card).filter(
-                    Card.list_id == old_list_id_int,
-                    Card.position > old_position,
-                    Card.position <= new_position
-                ).update({'position': Card.position - 1}, synchronize_session=False)
-            else:
-                # Moving Up
-                db.session.query(Card).filter(
-                    Card.list_id == old_list_id_int,
-                    Card.position >= new_position,
-                    Card.position < old_position
-                ).update({'position': Card.position + 1}, synchronize_session=False)
-        else:
-            # Move to a different list
-            db.session.query(Card).filter(
-                Card.list_id == old_list_id_int,
-                Card.position > old_position
-            ).update({'position': Card.position - 1}, synchronize_session=False)
-            db.session.query(Card).filter(
-                Card.list_id == new_list_id_int,
-                Card.position >= new_position
-            ).update({'position': Card.position + 1}, synchronize_session=False)
-
-        card.list_id = new_list_id_int
-        card.position = new_position
-        db.session.commit()
-        
-        # Broadcast the change
-        emit('card_update_broadcast', data, room=str(board_id), skip_sid=request.sid)
+        enqueue_move(board_id, PendingMove(card_id_int, new_list_id_int, sibling_id_int,
+                                             request.sid, version))
+        # The mover's next page loads read from the primary
+        mark_socket_write(current_user.id)
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error handling card move: {e}")
-        emit('move_error', {'error': str(e)}, room=request.sid)
\ No newline at end of file
+        current_app.logger.warning(f"socket card_moved failed sid={request.sid} error={e!r}")
+        emit('move_error', {'error': str(e)}, room=request.sid)
+
+
+@socketio.on('list_moved')
+@timed_event
+def handle_list_move(data):
+    """
+    Fired when a user drags a list to another place on the board:
+    {list_id, next_sibling_id, version}. Only the moved list's row is
+    written; the result goes to everyone in the room as `list_moved`.
+    """
+    try:
+        list_id = _parse_id(data['list_id'])
+        next_sibling_id = data.get('next_sibling_id')
+        sibling_id = _parse_id(next_sibling_id) if next_sibling_id else None
+        version = data.get('version')
+        version = int(version) if version is not None else None
+
+        board_id = db.session.query(List.board_id).filter(List.id == list_id).scalar()
+        if board_id is None:
+            emit('move_error', {'error': 'List not found.'}, room=request.sid)
+            return
+        if not current_user_can_access(board_id):
+            current_app.logger.warning(f"socket list_moved denied sid={request.sid} "
+                                       f"user={current_user.get_id()} board={board_id}")
+            emit('move_error', {'error': 'You do not have permission to modify this board.'}, room=request.sid)
+            return
+
+        try:
+            move_list(board_id, list_id, sibling_id, version)
+        except (ListMoveConflict, LostRace):
+            # Put the mover's columns back in the order the server has
+            db.session.rollback()
+            emit('list_move_conflict', {
+                'board_id': board_id,
+                'list_id': list_id,
+                'error': 'This list was changed by someone else; showing the current order.',
+                'lists': list_rows(board_id),
+            }, room=request.sid)
+            return
+        mark_socket_write(current_user.id)
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"socket list_moved failed sid={request.sid} error={e!r}")
+        emit('move_error', {'error': str(e)}, room=request.sid)
+
+
+def _bulk_board(data, event):
+    """The board id of a bulk event if the user may change that board, else None."""
+    board_id = int(data['board_id'])
+    if not current_user_can_access(board_id):
+        current_app.logger.warning(f"socket {event} denied sid={request.sid} "
+                                   f"user={current_user.get_id()} board={board_id}")
+        emit('move_error', {'error': 'You do not have permission to modify this board.'}, room=request.sid)
+        return None
+    return board_id
+
+
+@socketio.on('cards_bulk_moved')
+@timed_event
+def handle_cards_bulk_moved(data):
+    """
+    Fired when a user drops a multi-card selection: {board_id, card_ids,
+    new_list_id, next_sibling_id}. The whole selection is moved in one
+    transaction and announced with one `cards_moved_batch`.
+    """
+    try:
+        board_id = _bulk_board(data, 'cards_bulk_moved')
+        if board_id is None:
+            return
+        next_sibling_id = data.get('next_sibling_id')
+        try:
+            list_id = _parse_id(data['new_list_id'])
+            sibling_id = _parse_id(next_sibling_id) if next_sibling_id else None
+        except (TypeError, ValueError):
+            raise InvalidBulkRequest('new_list_id and next_sibling_id must be ids.')
+        move_cards(board_id, _parse_ids(data['card_ids']), list_id, sibling_id)
+        mark_socket_write(current_user.id)
+    except (InvalidBulkRequest, LostRace) as e:
+        db.session.rollback()
+        emit('move_error', {'error': str(e)}, room=request.sid)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"socket cards_bulk_moved failed sid={request.sid} error={e!r}")
+        emit('move_error', {'error': str(e)}, room=request.sid)
+
+
+@socketio.on('cards_bulk_deleted')
+@timed_event
+def handle_cards_bulk_deleted(data):
+    """Fired to delete a multi-card selection: {board_id, card_ids}."""
+    try:
+        board_id = _bulk_board(data, 'cards_bulk_deleted')
+        if board_id is None:
+            return
+        delete_cards(board_id, _parse_ids(data['card_ids']))
+        mark_socket_write(current_user.id)
+    except InvalidBulkRequest as e:
+        db.session.rollback()
+        emit('move_error', {'error': str(e)}, room=request.sid)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"socket cards_bulk_deleted failed sid={request.sid} error={e!r}")
+        emit('move_error', {'error': str(e)}, room=request.sid)
+
+
+@socketio.on('cards_bulk_archived')
+@timed_event
+def handle_cards_bulk_archived(data):
+    """Fired to archive a multi-card selection: {board_id, card_ids}."""
+    try:
+        board_id = _bulk_board(data, 'cards_bulk_archived')
+        if board_id is None:
+            return
+        archive_cards(board_id, _parse_ids(data['card_ids']))
+        mark_socket_write(current_user.id)
+    except InvalidBulkRequest as e:
+        db.session.rollback()
+        emit('move_error', {'error': str(e)}, room=request.sid)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"socket cards_bulk_archived failed sid={request.sid} error={e!r}")
+        emit('move_error', {'error': str(e)}, room=request.sid)
+
+
+@socketio.on('sync_board')
+@timed_event
+def handle_sync_board(data):
+    """
+    Fired by a client after reconnecting or a `resync_required` notice,
+    with the last version it saw.
+    Returns only the changes it missed, or a full snapshot when the
+    change log no longer reaches back that far.
+    """
+    board_id = int(data['board_id'])
+    if not current_user_can_access(board_id):
+        return {'error': 'You do not have permission to view this board.'}
+
+    # This reply covers any deltas skipped while the client was behind
+    socketio.server.manager.clear_resync(request.sid)
+    version, changes = changes_since(board_id, int(data.get('since_version', 0)))
+    if changes is not None:
+        return {'version': version, 'changes': changes}
+
+    snapshot = load_board_snapshot(board_id)
+    if snapshot is None:
+        return {'error': 'Board not found.'}
+    return {'version': snapshot.version, 'snapshot': snapshot_to_dict(snapshot)}
@@ -2,8 +2,15 @@ from flask import render_template, redirect, url_for, flash, abort, request
 from flask_login import login_required, current_user
 from . import main
 from project import db
-from project.models import User, Board, List, Card
-from project.forms import CreateBoardForm, CreateListForm, CreateCardForm, InviteUserForm
+from project.models import Board, List, Card
+from project.forms import NewBoardForm, EditBoardForm, CreateListForm, CreateCardForm, EditListForm, EditCardForm, InviteUserForm
+from project.snapshot import load_board_head
+from project.access import require_access, is_member, OWNER
+from project.replica import read_replica
+from project.identity import get_user, get_user_by_email
+from project.dashboard import boards_page, board_summaries, InvalidCursor, OWNED, SHARED, ALL
+from project.bulk import InvalidBulkRequest
+from project import mutations, archive, cloning, deletion, fragments, presence, search
 
 @main.route("/")
 @main.route("/index")
@@ -14,47 +21,84 @@ def index():
 
 @main.route("/dashboard", methods=['GET', 'POST'])
 @login_required  # This protects the route
+@read_replica
 def dashboard():
     """
     Serves the main dashboard page.
     Handles display of user's boards and creation of new boards.
     """
-    form = CreateBoardForm()
+    form = NewBoardForm()
+    form.template.choices = [(0, 'An empty board')] + [
+        (template.id, template.name) for template in cloning.templates_for(current_user.id)]
     
     # Handle new board creation
     if form.validate_on_submit():
         board_name = form.name.data
-        new_board = Board(name=board_name, owner=current_user)
-        db.session.add(new_board)
-        db.session.commit()
+        if form.template.data:
+            require_access(form.template.data)
+            cloning.clone_board(form.template.data, current_user.id, board_name, form.include_members.data)
+        else:
+            mutations.create_board(current_user, board_name)
         flash('New board created!', 'success')
         return redirect(url_for('main.dashboard'))
     
-    # --- UPDATED: Fetch both owned and shared boards ---
-    owned_boards = Board.query.filter_by(user_id=current_user.id).order_by(Board.date_created.desc()).all()
-    shared_boards = current_user.shared_boards.order_by(Board.date_created.desc()).all()
-    
-    return render_template('dashboard.html', title='Dashboard', form=form, 
-                           owned_boards=owned_boards, shared_boards=shared_boards)
+    # --- UPDATED: One keyset page per section, see project/dashboard.py ---
+    # ?view=all merges owned and shared boards into a single feed.
+    view = ALL if request.args.get('view') == ALL else None
+    try:
+        if view == ALL:
+            all_page = boards_page(current_user.id, ALL, request.args.get('after'))
+            owned_page = shared_page = None
+            boards = all_page.boards
+        else:
+            all_page = None
+            owned_page = boards_page(current_user.id, OWNED, request.args.get('owned_after'))
+            shared_page = boards_page(current_user.id, SHARED, request.args.get('shared_after'))
+            boards = owned_page.boards + shared_page.boards
+    except InvalidCursor:
+        abort(400)
+
+    return render_template('dashboard.html', title='Dashboard', form=form, view=view,
+                           owned_page=owned_page, shared_page=shared_page, all_page=all_page,
+                           summaries=board_summaries([board for board in boards if not board.deleting]),
+                           deleting=deletion.cards_left([board.id for board in boards if board.deleting]),
+                           viewers=presence.viewer_counts([board.id for board in boards]))
+
+
+@main.route("/search")
+@login_required
+def search_cards():
+    """Card search across every board the user can see."""
+    query = request.args.get('q', '').strip()
+    try:
+        page = search.search_cards(current_user.id, query, request.args.get('after'))
+    except InvalidCursor:
+        abort(400)
+    return render_template('search.html', title='Search', query=query, page=page)
 
 
 @main.route("/board/<int:board_id>")
 @login_required
+@read_replica
 def view_board(board_id):
     """
     Displays a specific board, its lists, and its cards.
     """
-    board = Board.query.get_or_404(board_id)
+    # Only the board row here; lists and cards come from the fragment cache
+    board = load_board_head(board_id)
+    if board is None:
+        abort(404)
     
     # --- UPDATED: Security Check ---
     # User must be the owner OR a member to view
-    if board.owner != current_user and current_user not in board.members:
-        abort(403) # Forbidden
+    if board.owner_id != current_user.id:
+        require_access(board.id)
 
     list_form = CreateListForm()
     card_form = CreateCardForm()
+    canvas = fragments.render_board_canvas(board, card_form)
     
-    return render_template('board.html', title=board.name, board=board, 
+    return render_template('board.html', title=board.name, board=board, canvas=canvas,
                            list_form=list_form, card_form=card_form)
 
 # --- CRUD Routes for Lists ---
@@ -65,17 +109,13 @@ def create_list(board_id):
     board = Board.query.get_or_404(board_id)
     
     # --- UPDATED: Security Check ---
-    if board.owner != current_user and current_user not in board.members:
-        abort(403)
+    require_access(board.id)
         
     form = CreateListForm()
     if form.validate_on_submit():
         # ... (rest of function is unchanged)
         list_name = form.name.data
-        position = len(board.lists)
-        new_list = List(name=list_name, board_id=board.id, position=position)
-        db.session.add(new_list)
-        db.session.commit()
+        mutations.create_list(board.id, list_name)
         flash('List created!', 'success')
     else:
         flash('Error creating list.', 'danger')
@@ -90,16 +130,9 @@ def delete_list(list_id):
     board_id = list_to_delete.board_id
     
     # --- UPDATED: Security Check ---
-    if list_to_delete.board.owner != current_user and current_user not in list_to_delete.board.members:
-        abort(403)
+    require_access(board_id)
     
-    # ... (rest of function is unchanged)
-    lists = List.query.filter(List.board_id == board_id, List.position > list_to_delete.position).all()
-    for list_item in lists:
-        list_item.position -= 1
-
-    db.session.delete(list_to_delete)
-    db.session.commit()
+    mutations.delete_list(list_to_delete)
     flash('List deleted.', 'success')
     return redirect(url_for('main.view_board', board_id=board_id))
 
@@ -111,19 +144,14 @@ def create_card(list_id):
     list_item = List.query.get_or_404(list_id)
     
     # --- UPDATED: Security Check ---
-    if list_item.board.owner != current_user and current_user not in list_item.board.members:
-        abort(403)
+    require_access(list_item.board_id)
         
     form = CreateCardForm()
     if form.validate_on_submit():
         # ... (rest of function is unchanged)
         card_title = form.title.data
         card_desc = form.description.data
-        position = len(list_item.cards)
-        new_card = Card(title=card_title, description=card_desc, 
-                        list_id=list_item.id, position=position)
-        db.session.add(new_card)
-        db.session.commit()
+        mutations.create_card(list_item, card_title, card_desc)
         flash('Card created!', 'success')
     else:
         flash('Error creating card.', 'danger')
@@ -138,17 +166,9 @@ def delete_card(card_id):
     board_id = card_to_delete.list.board_id
     
     # --- UPDATED: Security Check ---
-    if card_to_delete.list.board.owner != current_user and current_user not in card_to_delete.list.board.members:
-        abort(403)
+    require_access(board_id)
 
-    # ... (rest of function is unchanged)
-    list_id = card_to_delete.list_id
-    cards = Card.query.filter(Card.list_id == list_id, Card.position > card_to_delete.position).all()
-    for card in cards:
-        card.position -= 1
-
-    db.session.delete(card_to_delete)
-    db.session.commit()
+    mutations.delete_card(card_to_delete)
     flash('Card deleted.', 'success')
     return redirect(url_for('main.view_board', board_id=board_id))
 
@@ -162,12 +182,12 @@ def delete_board(board_id):
     board_to_delete = Board.query.get_or_404(board_id)
     
     # --- UNCHANGED: Only owner can delete ---
-    if board_to_delete.owner != current_user:
-        abort(403)
+    require_access(board_to_delete.id, OWNER)
     
-    db.session.delete(board_to_delete)
-    db.session.commit()
-    flash('Board deleted.', 'success')
+    if mutations.delete_board(board_to_delete):
+        flash('Board is being deleted in the background; it disappears from here when done.', 'info')
+    else:
+        flash('Board deleted.', 'success')
     return redirect(url_for('main.dashboard'))
 
 
@@ -177,18 +197,17 @@ def edit_board(board_id):
     board = Board.query.get_or_404(board_id)
     
     # --- UNCHANGED: Only owner can edit ---
-    if board.owner != current_user:
-        abort(403)
+    require_access(board.id, OWNER)
         
-    form = CreateBoardForm()
+    form = EditBoardForm()
     if form.validate_on_submit():
         # ... (rest of function is unchanged)
-        board.name = form.name.data
-        db.session.commit()
+        mutations.rename_board(board, form.name.data, form.is_template.data)
         flash('Board has been updated!', 'success')
         return redirect(url_for('main.dashboard'))
     elif request.method == 'GET':
         form.name.data = board.name
+        form.is_template.data = board.is_template
         
     return render_template('edit_board.html', title='Edit Board', form=form, board=board)
 
@@ -200,18 +219,23 @@ def edit_list(list_id):
     list_item = List.query.get_or_404(list_id)
     
     # --- UPDATED: Security Check ---
-    if list_item.board.owner != current_user and current_user not in list_item.board.members:
-        abort(403)
+    require_access(list_item.board_id)
         
-    form = CreateListForm()
+    form = EditListForm()
     if form.validate_on_submit():
-        # ... (rest of function is unchanged)
-        list_item.name = form.name.data
-        db.session.commit()
-        flash('List has been updated!', 'success')
-        return redirect(url_for('main.view_board', board_id=list_item.board_id))
+        try:
+            mutations.rename_list(list_item, form.name.data, form.version.data)
+        except mutations.EditConflict:
+            # Keep what was typed, but against the version now in place
+            flash('Someone else changed this list while you were editing it. '
+                  'Check its current name and save again to replace it.', 'warning')
+            form.version.data = list_item.version
+        else:
+            flash('List has been updated!', 'success')
+            return redirect(url_for('main.view_board', board_id=list_item.board_id))
     elif request.method == 'GET':
         form.name.data = list_item.name
+        form.version.data = list_item.version
         
     return render_template('edit_list.html', title='Edit List', form=form, list=list_item)
 
@@ -222,28 +246,106 @@ def edit_card(card_id):
     card = Card.query.get_or_404(card_id)
     
     # --- UPDATED: Security Check ---
-    if card.list.board.owner != current_user and current_user not in card.list.board.members:
-        abort(403)
+    require_access(card.list.board_id)
         
-    form = CreateCardForm()
+    form = EditCardForm()
     if form.validate_on_submit():
-        # ... (rest of function is unchanged)
-        card.title = form.title.data
-        card.description = form.description.data
-        db.session.commit()
-        flash('Card has been updated!', 'success')
-        return redirect(url_for('main.view_board', board_id=card.list.board_id))
+        try:
+            mutations.update_card(card, form.title.data, form.description.data, form.version.data)
+        except mutations.EditConflict:
+            flash('Someone else changed this card while you were editing it. '
+                  'Check its current title and save again to replace it.', 'warning')
+            form.version.data = card.version
+        else:
+            flash('Card has been updated!', 'success')
+            return redirect(url_for('main.view_board', board_id=card.list.board_id))
     elif request.method == 'GET':
         form.title.data = card.title
         form.description.data = card.description
+        form.version.data = card.version
         
     return render_template('edit_card.html', title='Edit Card', form=form, card=card)
 
 
+# --- Archive (Member Access, see project/archive.py) ---
+
+@main.route("/list/archive/<int:list_id>", methods=['POST'])
+@login_required
+def archive_list(list_id):
+    list_item = List.query.get_or_404(list_id)
+    board_id = list_item.board_id
+    require_access(board_id)
+
+    archive.archive_list(list_item)
+    flash('List archived.', 'success')
+    return redirect(url_for('main.view_board', board_id=board_id))
+
+
+@main.route("/card/archive/<int:card_id>", methods=['POST'])
+@login_required
+def archive_card(card_id):
+    card = Card.query.get_or_404(card_id)
+    board_id = card.list.board_id
+    require_access(board_id)
+
+    archive.archive_cards(board_id, [card.id])
+    flash('Card archived.', 'success')
+    return redirect(url_for('main.view_board', board_id=board_id))
+
+
+@main.route("/board/<int:board_id>/archive")
+@login_required
+def view_archive(board_id):
+    """The board's archived lists and cards, newest first, a page of each at a time."""
+    board = load_board_head(board_id)
+    if board is None:
+        abort(404)
+    require_access(board.id)
+    try:
+        lists_page = archive.archived_lists(board.id, request.args.get('lists_after'))
+        cards_page = archive.archived_cards(board.id, request.args.get('cards_after'))
+    except InvalidCursor:
+        abort(400)
+    return render_template('archive.html', title=f'{board.name} archive', board=board,
+                           lists_page=lists_page, cards_page=cards_page)
+
+
+@main.route("/board/<int:board_id>/archive/list/<int:list_id>/restore", methods=['POST'])
+@login_required
+def restore_list(board_id, list_id):
+    board = load_board_head(board_id)
+    if board is None:
+        abort(404)
+    require_access(board.id)
+    try:
+        archive.restore_list(board_id, list_id)
+    except archive.NotArchived:
+        abort(404)
+    flash('List restored.', 'success')
+    return redirect(url_for('main.view_archive', board_id=board_id))
+
+
+@main.route("/board/<int:board_id>/archive/card/<int:card_id>/restore", methods=['POST'])
+@login_required
+def restore_card(board_id, card_id):
+    board = load_board_head(board_id)
+    if board is None:
+        abort(404)
+    require_access(board.id)
+    try:
+        archive.restore_cards(board_id, [card_id])
+    except InvalidBulkRequest as e:
+        flash(str(e), 'danger')
+    else:
+        flash('Card restored.', 'success')
+    return redirect(url_for('main.view_archive', board_id=board_id))
+
+
 # --- NEW: Board Member Management Routes ---
 
 @main.route("/board/<int:board_id>/manage", methods=['GET', 'POST'])
 @login_required
+@read_replica
 def manage_board_members(board_id):
     """
     Page for the board owner to invite/remove members.
@@ -251,21 +353,20 @@ def manage_board_members(board_id):
     board = Board.query.get_or_404(board_id)
     
     # --- Security: ONLY owner can manage members ---
-    if board.owner != current_user:
-        abort(403)
+    require_access(board.id, OWNER)
         
     form = InviteUserForm()
     
     if form.validate_on_submit():
         try:
-            user_to_invite = User.query.filter_by(email=form.email.data).first()
+            # Already looked up (and memoised) by InviteUserForm.validate_email
+            user_to_invite = get_user_by_email(form.email.data)
             if user_to_invite == current_user:
                 flash('You cannot invite yourself.', 'warning')
-            elif user_to_invite in board.members:
+            elif is_member(user_to_invite.id, board.id):
                 flash(f'{user_to_invite.username} is already a member.', 'info')
             else:
-                board.members.append(user_to_invite)
-                db.session.commit()
+                mutations.add_member(board, user_to_invite)
                 flash(f'Invited {user_to_invite.username} to the board.', 'success')
         except Exception as e:
             db.session.rollback()
@@ -285,18 +386,18 @@ def remove_member(board_id, user_id):
     Removes a member from a board.
     """
     board = Board.query.get_or_404(board_id)
-    user_to_remove = User.query.get_or_404(user_id)
+    user_to_remove = get_user(user_id)
+    if user_to_remove is None:
+        abort(404)
     
     # --- Security: ONLY owner can remove members ---
-    if board.owner != current_user:
-        abort(403)
+    require_access(board.id, OWNER)
     
-    if user_to_remove not in board.members:
+    if not is_member(user_to_remove.id, board.id):
         flash(f'{user_to_remove.username} is not a member of this board.', 'warning')
     else:
         try:
-            board.members.remove(user_to_remove)
-            db.session.commit()
+            mutations.remove_member(board, user_to_remove)
             flash(f'Removed {user_to_remove.username} from the board.', 'success')
         except Exception as e:
             db.session.rollback()
@@ -0,0 +1,271 @@
+"""
+Request, socket and SQL timing exposed in Prometheus text format at /metrics.
+
+Recorded when METRICS_ENABLED is on (the default):
+
+- every HTTP request, by endpoint, method and status
+- every Socket.IO event handler wrapped in @timed_event, by event
+- every SQL statement, by operation (SELECT, UPDATE, ...), through
+  SQLAlchemy engine events, plus the number of statements per request
+  or socket event
+- Socket.IO room sizes on join and recipients per broadcast, and slow
+  clients sent `resync_required` (see project/realtime.py)
+- card move batch sizes and commit times (see project/moves.py)
+
+METRICS_SAMPLE_RATE (0..1) records only that share of requests and socket
+events, and of SQL statements run outside them; counts are not scaled back
+up. Metrics live in the process that recorded them: with several workers,
+scrape each worker separately.
+"""
+import bisect
+import random
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from project import db, socketio
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            for key, value in items:
+                lines.extend(self._samples(list(zip(self.labelnames, key)), value))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, pairs, value):
+        return [f'{self.name}_total{_labels(pairs)} {value}']
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self, pairs, value):
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{_labels(pairs + [("le", bound)])} {cumulative}')
+        lines.append(f'{self.name}_bucket{_labels(pairs + [("le", "+Inf")])} {count}')
+        lines.append(f'{self.name}_sum{_labels(pairs)} {total}')
+        lines.append(f'{self.name}_count{_labels(pairs)} {count}')
+        return lines
+
+
+registry = []
+
+http_duration = Histogram('nexus_http_request_duration_seconds', 'HTTP request duration.',
+                          ('endpoint', 'method', 'status'))
+socket_duration = Histogram('nexus_socket_event_duration_seconds', 'Socket.IO handler duration.',
+                            ('event',))
+socket_errors = Counter('nexus_socket_event_errors', 'Socket.IO handlers that raised.', ('event',))
+sql_duration = Histogram('nexus_sql_statement_duration_seconds', 'SQL statement duration.',
+                         ('operation',), SQL_BUCKETS)
+sql_per_unit = Histogram('nexus_sql_statements_per_unit', 'SQL statements per request or socket event.',
+                         ('kind', 'name'), COUNT_BUCKETS)
+room_size = Histogram('nexus_room_size_on_join', 'Clients in a board room after a join.',
+                      buckets=COUNT_BUCKETS)
+broadcast_recipients = Histogram('nexus_broadcast_recipients', 'Local clients reached per broadcast.',
+                                 ('event',), COUNT_BUCKETS)
+resync_notices = Counter('nexus_resync_required', 'Slow clients told to resync instead of queueing deltas.')
+move_batch_size = Histogram('nexus_move_batch_size', 'Card moves applied per batch.',
+                            buckets=COUNT_BUCKETS)
+move_commit_seconds = Histogram('nexus_move_batch_commit_seconds', 'Time to apply and commit a move batch.')
+move_retries = Counter('nexus_move_batch_retries', 'Move batches re-applied after losing a race.')
+move_conflicts = Counter('nexus_move_conflicts', 'Moves answered with move_conflict instead of applied.')
+purge_chunk_seconds = Histogram('nexus_board_purge_chunk_seconds', 'Time to delete one chunk of a board being purged.')
+archive_batch_seconds = Histogram('nexus_auto_archive_batch_seconds', 'Time to archive one batch of the auto-archive job.')
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    for metric in registry:
+        metric.clear()
+
+
+def _enabled():
+    return current_app.config.get('METRICS_ENABLED', True)
+
+
+def _sampled():
+    return _enabled() and random.random() < current_app.config.get('METRICS_SAMPLE_RATE', 1.0)
+
+
+# A "unit" is one HTTP request or socket event; its state lives in g.
+
+def _begin_unit():
+    if _sampled():
+        g._metrics_started = time.perf_counter()
+        g._metrics_statements = 0
+    else:
+        g._metrics_skip = True
+
+
+def _end_unit(kind, name):
+    """Record the unit's statement count and return its duration, or None if unsampled."""
+    started = g.pop('_metrics_started', None)
+    statements = g.pop('_metrics_statements', 0)
+    g.pop('_metrics_skip', None)
+    if started is None:
+        return None
+    sql_per_unit.observe(statements, kind=kind, name=name)
+    return time.perf_counter() - started
+
+
+# --- HTTP ---
+
+def _after_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    duration = _end_unit('http', endpoint)
+    if duration is not None:
+        http_duration.observe(duration, endpoint=endpoint,
+                              method=request.method, status=response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # after_request does not run when a view raises
+    for key in ('_metrics_started', '_metrics_statements', '_metrics_skip'):
+        g.pop(key, None)
+
+
+# --- Socket.IO ---
+
+def timed_event(handler):
+    """Time a Socket.IO handler; put it under @socketio.on(...)."""
+    name = handler.__name__
+
+    @wraps(handler)
+    def wrapped(*args, **kwargs):
+        if not _enabled():
+            return handler(*args, **kwargs)
+        _begin_unit()
+        try:
+            return handler(*args, **kwargs)
+        except Exception:
+            socket_errors.inc(event=name)
+            raise
+        finally:
+            duration = _end_unit('socket', name)
+            if duration is not None:
+                socket_duration.observe(duration, event=name)
+    return wrapped
+
+
+def _local_participants(room):
+    try:
+        return sum(1 for _ in socketio.server.manager.get_participants('/', room))
+    except (AttributeError, KeyError):
+        return 0
+
+
+def record_join(room):
+    if _enabled():
+        room_size.observe(_local_participants(room))
+
+
+def record_broadcast(event_name, room):
+    if _sampled():
+        broadcast_recipients.observe(_local_participants(room), event=event_name)
+
+
+# --- SQL ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['_metrics_query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('_metrics_query_start', None)
+    if started is None or not has_app_context():
+        return
+    if '_metrics_started' in g:
+        g._metrics_statements += 1
+    elif '_metrics_skip' in g or not _sampled():
+        # Part of an unsampled unit, or a background statement that lost the draw
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    sql_duration.observe(time.perf_counter() - started, operation=operation)
+
+
+def init_app(app):
+    """Hook request timing and SQL events into `app` and serve /metrics."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_begin_unit)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def metrics_view():
+        return current_app.response_class(render(), mimetype='text/plain; version=0.0.4')
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
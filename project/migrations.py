@@ -0,0 +1,209 @@
+"""
+Ordered schema migrations for existing databases.
+
+db.create_all() only creates missing tables, it never changes tables that
+already exist. Each revision below is a plain function that brings an older
+database forward; applied revisions are recorded in `schema_migrations`.
+Run them with `flask --app run nexus migrate`. A brand new database created
+by db.create_all() already has the latest schema and can be marked as
+up to date with `flask --app run nexus migrate --stamp`.
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from project import db
+
+REVISIONS = []
+
+
+def revision(rev_id, description):
+    """Register a migration function. Revisions run in declaration order."""
+    def decorator(func):
+        REVISIONS.append((rev_id, description, func))
+        return func
+    return decorator
+
+
+def _ensure_table():
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "id VARCHAR(64) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_revisions():
+    _ensure_table()
+    return {row[0] for row in db.session.execute(text("SELECT id FROM schema_migrations"))}
+
+
+def pending_revisions():
+    applied = applied_revisions()
+    return [rev for rev in REVISIONS if rev[0] not in applied]
+
+
+def _record(rev_id):
+    db.session.execute(
+        text("INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :at)"),
+        {'id': rev_id, 'at': datetime.utcnow()}
+    )
+
+
+def upgrade():
+    """Apply every pending revision, one transaction each. Returns their ids."""
+    done = []
+    for rev_id, description, func in pending_revisions():
+        try:
+            func()
+            _record(rev_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        done.append(rev_id)
+    return done
+
+
+def stamp():
+    """Mark every revision as applied without running it."""
+    pending = pending_revisions()
+    for rev_id, description, func in pending:
+        _record(rev_id)
+    db.session.commit()
+    return [rev[0] for rev in pending]
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in inspect(db.engine).get_columns(table)}
+
+
+# --- Revisions ---
+
+@revision('0001_sparse_positions', 'Float ordering keys for lists and cards')
+def _sparse_positions():
+    from project.ranking import rebalance_all
+    if _dialect() == 'postgresql':
+        db.session.execute(text("ALTER TABLE lists ALTER COLUMN position TYPE DOUBLE PRECISION"))
+        db.session.execute(text("ALTER TABLE cards ALTER COLUMN position TYPE DOUBLE PRECISION"))
+    # SQLite keeps REAL values in the old INTEGER column as-is, so only the
+    # keys themselves need spreading out.
+    rebalance_all()
+
+
+@revision('0002_board_versions', 'Board.version counter (board_changes is created by create_all)')
+def _board_versions():
+    if not _has_column('boards', 'version'):
+        db.session.execute(text("ALTER TABLE boards ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+
+
+@revision('0003_hot_path_indexes', 'Composite indexes for board, list, card and membership lookups')
+def _hot_path_indexes():
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_cards_list_position ON cards (list_id, position)",
+        "CREATE INDEX IF NOT EXISTS ix_lists_board_position ON lists (board_id, position)",
+        "CREATE INDEX IF NOT EXISTS ix_boards_user_created ON boards (user_id, date_created)",
+        "CREATE INDEX IF NOT EXISTS ix_board_members_board_user ON board_members (board_id, user_id)",
+    ]
+    for statement in statements:
+        db.session.execute(text(statement))
+
+
+@revision('0004_card_search', 'Full-text search index over card titles and descriptions')
+def _card_search():
+    from project import search
+    search.rebuild()
+
+
+@revision('0005_row_versions', 'Version columns for optimistic concurrency on lists and cards')
+def _row_versions():
+    _add_version_columns()
+
+
+def _add_version_columns():
+    for table in ('lists', 'cards'):
+        if not _has_column(table, 'version'):
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+
+
+# Foreign keys that cascade when their board goes (see project/deletion.py)
+_CASCADING_TABLES = ('lists', 'cards', 'board_changes', 'board_members')
+
+
+@revision('0006_cascading_deletes', 'ON DELETE CASCADE foreign keys and Board.deleting')
+def _cascading_deletes():
+    if not _has_column('boards', 'deleting'):
+        db.session.execute(text("ALTER TABLE boards ADD COLUMN deleting BOOLEAN NOT NULL DEFAULT FALSE"))
+    inspector = inspect(db.engine)
+    stale = [table for table in _CASCADING_TABLES
+             if any(fk['options'].get('ondelete', '').upper() != 'CASCADE'
+                    for fk in inspector.get_foreign_keys(table))]
+    if not stale:
+        return
+    if _dialect() == 'postgresql':
+        for table in stale:
+            for fk in inspector.get_foreign_keys(table):
+                columns, referred = ', '.join(fk['constrained_columns']), fk['referred_table']
+                db.session.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {fk['name']}"))
+                db.session.execute(text(
+                    f"ALTER TABLE {table} ADD CONSTRAINT {fk['name']} FOREIGN KEY ({columns}) "
+                    f"REFERENCES {referred} ({', '.join(fk['referred_columns'])}) ON DELETE CASCADE"))
+    else:
+        _rebuild_sqlite_tables(stale)
+
+
+@revision('0007_archive', 'Card.entered_list_at and never-reused list and card ids (archive tables come from create_all)')
+def _archive():
+    if not _has_column('cards', 'entered_list_at'):
+        column_type = 'TIMESTAMP' if _dialect() == 'postgresql' else 'DATETIME'
+        db.session.execute(text(f"ALTER TABLE cards ADD COLUMN entered_list_at {column_type}"))
+    # Auto-archiving counts existing cards from their creation
+    db.session.execute(text("UPDATE cards SET entered_list_at = date_created WHERE entered_list_at IS NULL"))
+    if _dialect() == 'sqlite':
+        # Without AUTOINCREMENT SQLite hands out the highest id again after
+        # it is deleted, which would clash with an archived row on restore
+        plain = [name for name in ('lists', 'cards') if 'AUTOINCREMENT' not in (db.session.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': name}
+        ).scalar() or '').upper()]
+        if plain:
+            _rebuild_sqlite_tables(plain)
+
+
+@revision('0008_board_templates', 'Board.is_template')
+def _board_templates():
+    if not _has_column('boards', 'is_template'):
+        db.session.execute(text("ALTER TABLE boards ADD COLUMN is_template BOOLEAN NOT NULL DEFAULT FALSE"))
+
+
+def _rebuild_sqlite_tables(tables):
+    """
+    SQLite cannot alter a foreign key, so copy each table into a new one
+    created from the current model and swap them. Foreign key enforcement
+    has to be off meanwhile and can only be switched outside a transaction,
+    hence a connection of our own.
+    """
+    db.session.commit()
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        conn.commit()
+        try:
+            with conn.begin():
+                for name in tables:
+                    table = db.metadata.tables[name]
+                    old_columns = {c['name'] for c in inspect(conn).get_columns(name)}
+                    columns = ', '.join(c.name for c in table.columns if c.name in old_columns)
+                    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+                    conn.exec_driver_sql(ddl.replace(f'CREATE TABLE {name} ', f'CREATE TABLE {name}_new ', 1))
+                    conn.exec_driver_sql(f"INSERT INTO {name}_new ({columns}) SELECT {columns} FROM {name}")
+                    conn.exec_driver_sql(f"DROP TABLE {name}")
+                    conn.exec_driver_sql(f"ALTER TABLE {name}_new RENAME TO {name}")
+                    for index in table.indexes:
+                        conn.execute(CreateIndex(index))
+                problems = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+                if problems:
+                    raise RuntimeError(f"Foreign key violations after rebuilding tables: {problems[:10]}")
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+            conn.commit()
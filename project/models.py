@@ -1,17 +1,30 @@
+import sqlite3
 from project import db, login_manager
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite only enforces foreign keys, ON DELETE CASCADE included, when asked per connection."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
 
 @login_manager.user_loader
 def load_user(user_id):
     """Required callback for Flask-Login to load a user from session."""
-    return User.query.get(int(user_id))
+    from project.identity import get_user
+    return get_user(int(user_id))
 
 # --- NEW: Many-to-Many Association Table ---
 # This table links Users and Boards (for membership)
 board_members = db.Table('board_members',
-    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('board_id', db.Integer, db.ForeignKey('boards.id'), primary_key=True)
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('board_id', db.Integer, db.ForeignKey('boards.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key serves user -> boards; this serves board -> members
+    db.Index('ix_board_members_board_user', 'board_id', 'user_id')
 )
 
 
@@ -40,45 +53,130 @@ class User(db.Model, UserMixin):
 class Board(db.Model):
     """Board model."""
     __tablename__ = 'boards'
+    # Dashboard: a user's boards, newest first
+    __table_args__ = (db.Index('ix_boards_user_created', 'user_id', 'date_created'),)
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     date_created = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Bumped by every change to the board's contents (see project/changes.py)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Set while a large board is purged in the background (see project/deletion.py)
+    deleting = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Offered as a starting point when creating boards (see project/cloning.py)
+    is_template = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     # Relationship back to the owner (User)
     owner = db.relationship('User', back_populates='owned_boards')
     
-    # Relationship to Lists (one-to-many)
+    # Relationship to Lists (one-to-many). Deleting a board is left to the
+    # database's ON DELETE CASCADE instead of loading every list and card.
     lists = db.relationship('List', backref='board', lazy=True, cascade="all, delete-orphan",
-                            order_by='List.position')
+                            passive_deletes=True, order_by='List.position')
                             
     # --- NEW: Many-to-Many Relationship for *members* ---
     members = db.relationship('User', secondary=board_members,
                               back_populates='shared_boards', lazy='dynamic')
 
+    # Recent changes, used to bring reconnecting clients up to date
+    changes = db.relationship('BoardChange', backref='board', lazy=True, cascade="all, delete-orphan",
+                              passive_deletes=True)
+
 
 class List(db.Model):
     # ... (This model does not need any changes) ...
     __tablename__ = 'lists'
+    # A board's lists in order, and neighbour lookups when moving a list.
+    # AUTOINCREMENT keeps SQLite from reusing the id of an archived list.
+    __table_args__ = (db.Index('ix_lists_board_position', 'board_id', 'position'),
+                      {'sqlite_autoincrement': True})
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    position = db.Column(db.Integer, nullable=False)
+    # Sparse ordering key, see project/ranking.py
+    position = db.Column(db.Float, nullable=False)
     date_created = db.Column(db.DateTime, default=datetime.utcnow)
-    board_id = db.Column(db.Integer, db.ForeignKey('boards.id'), nullable=False)
+    board_id = db.Column(db.Integer, db.ForeignKey('boards.id', ondelete='CASCADE'), nullable=False)
+    # Row version: every ORM UPDATE is conditional on it (see project/moves.py)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    __mapper_args__ = {'version_id_col': version}
     
     cards = db.relationship('Card', backref='list', lazy=True, cascade="all, delete-orphan",
-                            order_by='Card.position')
+                            passive_deletes=True, order_by='Card.position')
 
 
 class Card(db.Model):
     # ... (This model does not need any changes) ...
     __tablename__ = 'cards'
+    # A list's cards in order, and neighbour lookups when moving a card.
+    # AUTOINCREMENT keeps SQLite from reusing the id of an archived card.
+    __table_args__ = (db.Index('ix_cards_list_position', 'list_id', 'position'),
+                      {'sqlite_autoincrement': True})
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    position = db.Column(db.Integer, nullable=False)
+    # Sparse ordering key, see project/ranking.py
+    position = db.Column(db.Float, nullable=False)
     date_created = db.Column(db.DateTime, default=datetime.utcnow)
-    list_id = db.Column(db.Integer, db.ForeignKey('lists.id'), nullable=False)
\ No newline at end of file
+    list_id = db.Column(db.Integer, db.ForeignKey('lists.id', ondelete='CASCADE'), nullable=False)
+    # When the card arrived in its current list, for auto-archiving (see project/archive.py)
+    entered_list_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Row version: every ORM UPDATE is conditional on it (see project/moves.py)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    __mapper_args__ = {'version_id_col': version}
+
+
+# --- Archive: cold copies of archived lists and cards (see project/archive.py) ---
+
+class ArchivedList(db.Model):
+    """A list moved out of `lists`, keeping its id for restoring."""
+    __tablename__ = 'archived_lists'
+    # A board's archive page, newest first
+    __table_args__ = (db.Index('ix_archived_lists_board', 'board_id', 'archived_at', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    position = db.Column(db.Float, nullable=False)
+    date_created = db.Column(db.DateTime)
+    board_id = db.Column(db.Integer, db.ForeignKey('boards.id', ondelete='CASCADE'), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ArchivedCard(db.Model):
+    """A card moved out of `cards`, on its own or with its list."""
+    __tablename__ = 'archived_cards'
+    __table_args__ = (
+        # A board's archive page (cards archived on their own), newest first
+        db.Index('ix_archived_cards_board', 'board_id', 'with_list', 'archived_at', 'id'),
+        # The cards that go back with a restored list
+        db.Index('ix_archived_cards_list', 'list_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    position = db.Column(db.Float, nullable=False)
+    date_created = db.Column(db.DateTime)
+    board_id = db.Column(db.Integer, db.ForeignKey('boards.id', ondelete='CASCADE'), nullable=False)
+    # The list it was in; that list may since be archived or deleted, so no foreign key
+    list_id = db.Column(db.Integer, nullable=False)
+    # Archived together with its list, and restored with it
+    with_list = db.Column(db.Boolean, nullable=False, default=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class BoardChange(db.Model):
+    """One entry in a board's bounded change log."""
+    __tablename__ = 'board_changes'
+    __table_args__ = (db.UniqueConstraint('board_id', 'version'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    board_id = db.Column(db.Integer, db.ForeignKey('boards.id', ondelete='CASCADE'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(40), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
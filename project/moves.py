@@ -0,0 +1,333 @@
+"""
+Per-board queue for `card_moved` events.
+
+Drag events are collected per board for MOVE_BATCH_WINDOW_MS milliseconds,
+applied in arrival order in one transaction, and announced with a single
+`cards_moved_batch` broadcast carrying the resulting authoritative
+positions as compact `[card_id, list_id, position, version]` rows of integer ids
+(the change log keeps the longer, self-describing form). A window of 0 applies every move straight away inside the
+socket handler (this is what the tests use).
+
+Moves are applied optimistically. Cards carry a row version and every
+card UPDATE is conditional on it; the batch's closing board version bump is
+conditional on the board version read before any neighbour positions were.
+If another worker committed in between, the batch is rolled back and
+re-applied from fresh reads after a short randomised backoff, up to
+MOVE_RETRY_ATTEMPTS times. A mover whose move cannot be applied as asked
+(its card changed since the version the client sent, or every attempt lost
+the race) gets a `move_conflict` with the authoritative positions of the
+lists involved instead.
+
+List drags (`list_moved`) are rare next to card drags, so they are applied
+straight away by move_list() rather than queued, under the same board
+version check and retries. Like a card move, a list move only writes the
+moved list's own row with the midpoint of its new neighbours' keys.
+"""
+import random
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from project import db, socketio
+from project.models import Board, List, Card
+from project.ranking import (card_position_before, list_position_before, schedule_card_rebalance,
+                             schedule_list_rebalance)
+from project.changes import record_change
+from project import metrics
+
+# `version` is the card version the client saw, or None to skip that check
+PendingMove = namedtuple('PendingMove', 'card_id new_list_id next_sibling_id sid version', defaults=(None,))
+
+
+class MoveStats:
+    """
+    Counters used to tune MOVE_BATCH_WINDOW_MS. Each batch is also recorded
+    in the nexus_move_batch_* histograms at /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self.moves = 0
+        self.max_batch_size = 0
+        self.commit_seconds_total = 0.0
+        self.max_commit_seconds = 0.0
+
+    def record(self, batch_size, commit_seconds):
+        with self._lock:
+            self.batches += 1
+            self.moves += batch_size
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.commit_seconds_total += commit_seconds
+            self.max_commit_seconds = max(self.max_commit_seconds, commit_seconds)
+        metrics.move_batch_size.observe(batch_size)
+        metrics.move_commit_seconds.observe(commit_seconds)
+
+    def as_dict(self):
+        with self._lock:
+            batches = self.batches or 1
+            return {
+                'batches': self.batches,
+                'moves': self.moves,
+                'mean_batch_size': self.moves / batches,
+                'max_batch_size': self.max_batch_size,
+                'mean_commit_seconds': self.commit_seconds_total / batches,
+                'max_commit_seconds': self.max_commit_seconds,
+            }
+
+
+stats = MoveStats()
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def enqueue_move(board_id, move):
+    """Queue a move for `board_id`; the caller has already checked access."""
+    window_ms = current_app.config.get('MOVE_BATCH_WINDOW_MS', 30)
+    with _queues_lock:
+        queue = _queues.setdefault(board_id, [])
+        queue.append(move)
+        first_in_window = len(queue) == 1
+
+    if window_ms <= 0:
+        flush_board(board_id)
+    elif first_in_window:
+        app = current_app._get_current_object()
+        socketio.start_background_task(_flush_later, app, board_id, window_ms / 1000.0)
+
+
+def _flush_later(app, board_id, delay):
+    socketio.sleep(delay)
+    with app.app_context():
+        try:
+            flush_board(board_id)
+        finally:
+            db.session.remove()
+
+
+def _apply(board_id, moves):
+    """
+    Apply moves in order. Returns (results by card id, rejected moves,
+    conflicting moves, lists to rebalance).
+    """
+    results = OrderedDict()
+    rejected = []
+    conflicts = []
+    rebalance = set()
+
+    for move in moves:
+        card = db.session.get(Card, move.card_id)
+        target = db.session.get(List, move.new_list_id)
+        if card is None or target is None or target.board_id != board_id or card.list.board_id != board_id:
+            rejected.append((move, 'Card or list no longer exists on this board.'))
+            continue
+        if move.version is not None and move.version != card.version:
+            conflicts.append(move)
+            continue
+
+        sibling = db.session.get(Card, move.next_sibling_id) if move.next_sibling_id else None
+        if sibling is not None and sibling.list_id != target.id:
+            sibling = None
+        position, needs_rebalance = card_position_before(target.id, sibling, exclude_id=card.id)
+
+        if card.list_id != target.id:
+            card.entered_list_at = datetime.utcnow()
+        card.list_id = target.id
+        card.position = position
+        # UPDATE ... WHERE version = <read>; bumps card.version for the next move
+        db.session.flush()
+        if needs_rebalance:
+            rebalance.add(target.id)
+
+        # A card moved twice in one window only reports where it ended up
+        results.pop(card.id, None)
+        results[card.id] = (target.id, position, card.version)
+    return results, rejected, conflicts, rebalance
+
+
+def logged_moves(results):
+    """Moves as stored in the change log and returned by `sync_board`."""
+    return [{'card_id': f'card-{card_id}', 'list_id': f'list-{list_id}', 'position': position,
+             'version': version}
+            for card_id, (list_id, position, version) in results.items()]
+
+
+def packed_moves(results):
+    """Moves as broadcast: one `[card_id, list_id, position, version]` row each."""
+    return [[card_id, list_id, position, version]
+            for card_id, (list_id, position, version) in results.items()]
+
+
+class LostRace(Exception):
+    """Every attempt of commit_with_retries() was overtaken by another writer."""
+
+
+def commit_with_retries(board_id, attempt_once):
+    """
+    Call attempt_once(seen) with the board version read before anything
+    else, then commit. Whenever a concurrent writer invalidated those reads
+    (StaleDataError from a versioned row or from record_change(...,
+    expected_version=seen)), roll back and start over, up to
+    MOVE_RETRY_ATTEMPTS times. Returns attempt_once's result or raises
+    LostRace.
+    """
+    attempts = max(1, current_app.config.get('MOVE_RETRY_ATTEMPTS', 5))
+    backoff = current_app.config.get('MOVE_RETRY_BACKOFF_MS', 10) / 1000.0
+    for attempt in range(attempts):
+        try:
+            seen = db.session.query(Board.version).filter(Board.id == board_id).scalar()
+            result = attempt_once(seen)
+            db.session.commit()
+            return result
+        except (StaleDataError, OperationalError) as e:
+            # Another writer got there first: a row we read changed, or the
+            # database refused us the lock (SQLite busy, PostgreSQL deadlock)
+            db.session.rollback()
+            metrics.move_retries.inc()
+            current_app.logger.info(f"Move batch for board {board_id} lost a race "
+                                    f"(attempt {attempt + 1}/{attempts}): {e}")
+            if attempt + 1 < attempts:
+                # Capped exponential backoff with full jitter, so the losers
+                # do not collide again
+                socketio.sleep(random.uniform(0, backoff * 2 ** min(attempt, 6)))
+    raise LostRace(f"Board {board_id} changed under every one of {attempts} attempts")
+
+
+def _apply_with_retries(board_id, moves):
+    """
+    Apply and commit a batch. Returns (results, rejected, conflicts,
+    rebalance, board version); when every attempt lost, all moves come
+    back as conflicts.
+    """
+    def attempt_once(seen):
+        results, rejected, conflicts, rebalance = _apply(board_id, moves)
+        version = None
+        if results:
+            version = record_change(board_id, 'cards_moved', {'moves': logged_moves(results)},
+                                    expected_version=seen)
+        return results, rejected, conflicts, rebalance, version
+
+    try:
+        return commit_with_retries(board_id, attempt_once)
+    except LostRace:
+        return OrderedDict(), [], list(moves), set(), None
+
+
+def authoritative_cards(list_ids):
+    """`[card_id, list_id, position, version]` rows for every card in these lists."""
+    rows = db.session.query(Card.id, Card.list_id, Card.position, Card.version).filter(
+        Card.list_id.in_(list_ids)
+    ).order_by(Card.list_id, Card.position, Card.id).all()
+    return [list(row) for row in rows]
+
+
+def _send_conflict(board_id, move):
+    """Tell a mover where its card and the lists it touched really stand."""
+    metrics.move_conflicts.inc()
+    current_list = db.session.query(Card.list_id).filter(Card.id == move.card_id).scalar()
+    list_ids = {list_id for list_id in (current_list, move.new_list_id) if list_id is not None}
+    socketio.emit('move_conflict', {
+        'board_id': board_id,
+        'card_id': move.card_id,
+        'error': 'This card was changed by someone else; showing the current order.',
+        'cards': authoritative_cards(list_ids),
+    }, room=move.sid)
+
+
+def flush_board(board_id):
+    """Apply and broadcast everything queued for `board_id`."""
+    with _queues_lock:
+        moves = _queues.pop(board_id, [])
+    if not moves:
+        return
+
+    started = time.perf_counter()
+    try:
+        results, rejected, conflicts, rebalance, version = _apply_with_retries(board_id, moves)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Error applying move batch for board {board_id}: {e}")
+        for sid in {move.sid for move in moves}:
+            socketio.emit('move_error', {'error': str(e)}, room=sid)
+        return
+    stats.record(len(moves), time.perf_counter() - started)
+
+    for list_id in rebalance:
+        schedule_card_rebalance(list_id)
+    for move, error in rejected:
+        socketio.emit('move_error', {'error': error}, room=move.sid)
+    for move in conflicts:
+        _send_conflict(board_id, move)
+    if results:
+        broadcast_moves(board_id, version, results)
+
+
+def broadcast_moves(board_id, version, results):
+    """One `cards_moved_batch` to the board's room."""
+    metrics.record_broadcast('cards_moved_batch', str(board_id))
+    socketio.emit('cards_moved_batch', {
+        'board_id': board_id,
+        'version': version,
+        'moves': packed_moves(results),
+    }, room=str(board_id))
+
+
+# --- Lists ---
+
+class ListMoveConflict(Exception):
+    """The list changed since the version the client dragged."""
+
+
+def list_rows(board_id):
+    """`[list_id, position, version]` rows for every list on a board, in order."""
+    rows = db.session.query(List.id, List.position, List.version).filter(
+        List.board_id == board_id).order_by(List.position, List.id).all()
+    return [list(row) for row in rows]
+
+
+def logged_lists(rows):
+    """List moves as stored in the change log ('lists_moved')."""
+    return [{'id': list_id, 'position': position, 'version': version} for list_id, position, version in rows]
+
+
+def move_list(board_id, list_id, next_sibling_id=None, version=None):
+    """
+    Put a list in front of `next_sibling_id` (None: at the end of the board),
+    commit and broadcast `list_moved`. `version` is the list version the
+    client saw, or None to skip that check. Returns the `[list_id, position,
+    version]` row; raises ListMoveConflict or LostRace instead of moving.
+    """
+    def attempt_once(seen):
+        item = db.session.get(List, list_id)
+        if version is not None and version != item.version:
+            raise ListMoveConflict(f"List {list_id} is at version {item.version}, not {version}")
+        sibling = db.session.get(List, next_sibling_id) if next_sibling_id else None
+        if sibling is not None and (sibling.board_id != board_id or sibling.id == list_id):
+            sibling = None
+        position, needs_rebalance = list_position_before(board_id, sibling, exclude_id=list_id)
+        item.position = position
+        # UPDATE ... WHERE version = <read>
+        db.session.flush()
+        row = [list_id, position, item.version]
+        board_version = record_change(board_id, 'lists_moved', {'lists': logged_lists([row])},
+                                      expected_version=seen)
+        return row, board_version, needs_rebalance
+
+    row, board_version, needs_rebalance = commit_with_retries(board_id, attempt_once)
+    if needs_rebalance:
+        schedule_list_rebalance(board_id)
+    broadcast_lists(board_id, board_version, [row])
+    return row
+
+
+def broadcast_lists(board_id, version, rows):
+    """One `list_moved` to the board's room with `[list_id, position, version]` rows."""
+    metrics.record_broadcast('list_moved', str(board_id))
+    socketio.emit('list_moved', {'board_id': board_id, 'version': version, 'lists': rows}, room=str(board_id))
@@ -0,0 +1,153 @@
+"""
+Board, list and card mutations shared by the HTML routes and the JSON API.
+
+Each function assumes the caller has already checked access. It writes the
+change, records it in the board's change log, keeps the search index in
+step (see project/search.py), commits and announces the new version to the
+board's Socket.IO room.
+
+Lists and cards carry a row version and every UPDATE is conditional on it.
+Edits take the version the client started from and raise EditConflict,
+writing nothing, when the row has changed since then. Deletes are not
+conditional.
+"""
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.orm.exc import StaleDataError
+from project import db
+from project.models import Board, List, Card
+from project.ranking import next_list_position, next_card_position
+from project.changes import commit_change, card_payload, list_payload
+from project.access import invalidate_board
+from project.dashboard import forget_summary
+from project import deletion, search
+
+
+class EditConflict(Exception):
+    """The list or card was changed by someone else since the client read it."""
+
+
+def _check_version(row, expected_version):
+    if expected_version is not None and expected_version != row.version:
+        raise EditConflict(f"{type(row).__name__} {row.id} is at version {row.version}, "
+                           f"not {expected_version}")
+
+
+def _commit_edit(board_id, kind, row, payload):
+    """commit_change(), turning a concurrent write to `row` into EditConflict."""
+    try:
+        # Write the row first, so the payload carries its new version
+        db.session.flush()
+        commit_change(board_id, kind, payload(row))
+    except StaleDataError as e:
+        db.session.rollback()
+        raise EditConflict(str(e))
+
+
+# --- Boards ---
+
+def create_board(owner, name):
+    new_board = Board(name=name, owner=owner)
+    db.session.add(new_board)
+    db.session.commit()
+    return new_board
+
+
+def rename_board(board, name, is_template=None):
+    board.name = name
+    if is_template is not None:
+        board.is_template = is_template
+    commit_change(board.id, 'board_updated', {'name': name})
+    return board
+
+
+def delete_board(board):
+    """
+    Delete a board and everything on it. Boards with more than
+    BOARD_DELETE_ASYNC_CARDS cards are only marked here and purged in the
+    background (see project/deletion.py); returns True in that case.
+    """
+    board_id = board.id
+    if deletion.card_count(board_id) > current_app.config.get('BOARD_DELETE_ASYNC_CARDS', 5000):
+        deletion.start(board)
+        return True
+    search.remove_board(board_id)
+    # One statement: lists, cards, changes and members follow by ON DELETE CASCADE
+    db.session.execute(delete(Board).where(Board.id == board_id))
+    db.session.commit()
+    deletion.forget_board(board_id)
+    return False
+
+
+# --- Members ---
+
+def add_member(board, user):
+    board.members.append(user)
+    db.session.commit()
+    invalidate_board(board.id)
+    forget_summary(board.id)
+
+
+def remove_member(board, user):
+    board.members.remove(user)
+    db.session.commit()
+    invalidate_board(board.id)
+    forget_summary(board.id)
+
+
+# --- Lists ---
+
+def create_list(board_id, name):
+    new_list = List(name=name, board_id=board_id, position=next_list_position(board_id))
+    db.session.add(new_list)
+    db.session.flush()
+    commit_change(board_id, 'list_created', list_payload(new_list))
+    return new_list
+
+
+def rename_list(list_item, name, expected_version=None):
+    _check_version(list_item, expected_version)
+    list_item.name = name
+    _commit_edit(list_item.board_id, 'list_updated', list_item, list_payload)
+    return list_item
+
+
+def delete_list(list_item):
+    board_id, list_id = list_item.board_id, list_item.id
+    search.remove_list(list_id)
+    # Positions are sparse keys, so the remaining lists keep theirs as-is.
+    # Not versioned: a delete wins over a concurrent move or rename, and its
+    # cards follow by ON DELETE CASCADE
+    db.session.execute(delete(List).where(List.id == list_id))
+    commit_change(board_id, 'list_deleted', {'id': list_id})
+
+
+# --- Cards ---
+
+def create_card(list_item, title, description=None):
+    new_card = Card(title=title, description=description,
+                    list_id=list_item.id, position=next_card_position(list_item.id))
+    db.session.add(new_card)
+    db.session.flush()
+    search.index_card(new_card.id, list_item.board_id, title, description)
+    commit_change(list_item.board_id, 'card_created', card_payload(new_card))
+    return new_card
+
+
+def update_card(card, title, description, expected_version=None):
+    _check_version(card, expected_version)
+    board_id = card.list.board_id
+    card.title = title
+    card.description = description
+    search.index_card(card.id, board_id, title, description)
+    _commit_edit(board_id, 'card_updated', card, card_payload)
+    return card
+
+
+def delete_card(card):
+    board_id, card_id = card.list.board_id, card.id
+    search.remove_card(card_id)
+    # Positions are sparse keys, so the remaining cards keep theirs as-is.
+    # Not versioned: a delete wins over a concurrent move or edit
+    db.session.execute(delete(Card).where(Card.id == card_id))
+    commit_change(board_id, 'card_deleted', {'id': card_id})
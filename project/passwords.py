@@ -0,0 +1,111 @@
+"""
+Password hashing with a configurable cost and an optional process pool.
+
+BCRYPT_LOG_ROUNDS sets the bcrypt cost (Flask-Bcrypt reads the same key).
+With PASSWORD_HASH_WORKERS > 0, hashing and verification run on a process
+pool of that size instead of the request worker, so a burst of logins
+cannot starve other requests or socket traffic of CPU. Under eventlet or
+gevent the waiting request yields to other greenlets while the pool works.
+
+Hashes made with a different cost are upgraded on the next successful login
+(see verify_and_upgrade).
+"""
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from flask_bcrypt import Bcrypt
+from project import db, socketio
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+# --- Pool side: plain functions so they can be pickled to the workers ---
+
+def _hash_in_worker(password, rounds, prefix):
+    return Bcrypt().generate_password_hash(password, rounds, prefix).decode('utf-8')
+
+
+def _check_in_worker(password_hash, password):
+    return Bcrypt().check_password_hash(password_hash, password)
+
+
+def _get_pool():
+    """The process pool, or None when hashing runs inline."""
+    global _pool, _pool_pid
+    workers = current_app.config.get('PASSWORD_HASH_WORKERS', 0)
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        # A pool inherited through fork() belongs to the parent process
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(fn, *args):
+    pool = _get_pool()
+    if pool is None:
+        return fn(*args)
+    future = pool.submit(fn, *args)
+    if socketio.async_mode in ('eventlet', 'gevent'):
+        # Blocking on the future would block the whole event loop
+        while not future.done():
+            socketio.sleep(0.005)
+    return future.result()
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+# --- Public API ---
+
+def log_rounds():
+    return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+
+def hash_password(password):
+    """Hash `password` at the configured cost. Returns a str."""
+    prefix = current_app.config.get('BCRYPT_HASH_PREFIX', '2b')
+    return _run(_hash_in_worker, password, log_rounds(), prefix)
+
+
+def check_password(password_hash, password):
+    return _run(_check_in_worker, password_hash, password)
+
+
+def hash_cost(password_hash):
+    """The cost a bcrypt hash was made with, e.g. 12 for '$2b$12$...'."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != log_rounds()
+
+
+def verify_and_upgrade(user, password):
+    """
+    Check `password` against the user's hash. On success, re-hash it at the
+    configured cost if the stored hash uses a different one.
+    """
+    if not check_password(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+        db.session.commit()
+    return True
@@ -0,0 +1,253 @@
+"""
+Who is looking at which board.
+
+Every socket that joins a board room is recorded as (board, sid, user) with
+the time it was last seen. Clients send `presence_heartbeat` every
+PRESENCE_HEARTBEAT_SECONDS; `leave_board` and `disconnect` remove their
+sids at once, and sids not heard from for PRESENCE_TIMEOUT_SECONDS are
+swept on later heartbeats, so a lost disconnect cannot leave a ghost viewer.
+
+Changes are announced with a `presence_update` broadcast to the board room,
+at most once per PRESENCE_DEBOUNCE_MS per board, so join/leave churn on a
+busy board costs one broadcast per window. Viewer counts for a page of
+boards (the dashboard) come from the index, never from a query per board.
+
+PRESENCE_BACKEND picks where the index lives: 'memory' (per process, the
+default) or 'sqlite:////path/presence.db', a file shared by all workers on
+a host (the same stand-in for a shared store as SQLiteQueueManager).
+"""
+import sqlite3
+import threading
+import time
+from flask import current_app
+from project import socketio
+
+
+class MemoryPresence:
+    """board id -> {sid: (user id, username, last seen)}, plus sid -> board ids."""
+
+    def __init__(self):
+        self._boards = {}
+        self._sids = {}
+        self._lock = threading.Lock()
+
+    def join(self, board_id, sid, user_id, username, now):
+        with self._lock:
+            self._boards.setdefault(board_id, {})[sid] = (user_id, username, now)
+            self._sids.setdefault(sid, set()).add(board_id)
+
+    def _remove(self, board_id, sid):
+        entries = self._boards.get(board_id)
+        if entries is None or entries.pop(sid, None) is None:
+            return False
+        if not entries:
+            del self._boards[board_id]
+        boards = self._sids.get(sid)
+        if boards is not None:
+            boards.discard(board_id)
+            if not boards:
+                del self._sids[sid]
+        return True
+
+    def leave(self, board_id, sid):
+        with self._lock:
+            return self._remove(board_id, sid)
+
+    def drop_sid(self, sid):
+        with self._lock:
+            boards = list(self._sids.get(sid, ()))
+            for board_id in boards:
+                self._remove(board_id, sid)
+            return boards
+
+    def touch(self, sid, now):
+        with self._lock:
+            for board_id in self._sids.get(sid, ()):
+                user_id, username, _ = self._boards[board_id][sid]
+                self._boards[board_id][sid] = (user_id, username, now)
+
+    def expire(self, cutoff):
+        with self._lock:
+            stale = [(board_id, sid) for board_id, entries in self._boards.items()
+                     for sid, entry in entries.items() if entry[2] < cutoff]
+            for board_id, sid in stale:
+                self._remove(board_id, sid)
+            return {board_id for board_id, _ in stale}
+
+    def viewers(self, board_id, cutoff):
+        with self._lock:
+            entries = list(self._boards.get(board_id, {}).values())
+        return sorted({(user_id, username) for user_id, username, seen in entries if seen >= cutoff})
+
+    def counts(self, board_ids, cutoff):
+        with self._lock:
+            return {board_id: len({entry[0] for entry in self._boards[board_id].values() if entry[2] >= cutoff})
+                    for board_id in board_ids if board_id in self._boards}
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+            self._sids.clear()
+
+
+class SQLitePresence:
+    """The same index in a SQLite file, shared by the worker processes on a host."""
+
+    def __init__(self, url):
+        self.path = url[len('sqlite:///'):]
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS presence ("
+                "board_id INTEGER NOT NULL, sid TEXT NOT NULL, user_id INTEGER NOT NULL, "
+                "username TEXT NOT NULL, last_seen REAL NOT NULL, PRIMARY KEY (board_id, sid))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_presence_sid ON presence (sid)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _run(self, sql, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def join(self, board_id, sid, user_id, username, now):
+        self._run("INSERT OR REPLACE INTO presence VALUES (?, ?, ?, ?, ?)",
+                  (board_id, sid, user_id, username, now))
+
+    def leave(self, board_id, sid):
+        return bool(self._run("DELETE FROM presence WHERE board_id = ? AND sid = ? RETURNING board_id",
+                              (board_id, sid)))
+
+    def drop_sid(self, sid):
+        return [row[0] for row in self._run("DELETE FROM presence WHERE sid = ? RETURNING board_id", (sid,))]
+
+    def touch(self, sid, now):
+        self._run("UPDATE presence SET last_seen = ? WHERE sid = ?", (now, sid))
+
+    def expire(self, cutoff):
+        return {row[0] for row in self._run("DELETE FROM presence WHERE last_seen < ? RETURNING board_id",
+                                            (cutoff,))}
+
+    def viewers(self, board_id, cutoff):
+        return [tuple(row) for row in self._run(
+            "SELECT DISTINCT user_id, username FROM presence WHERE board_id = ? AND last_seen >= ? "
+            "ORDER BY user_id", (board_id, cutoff))]
+
+    def counts(self, board_ids, cutoff):
+        board_ids = list(board_ids)
+        if not board_ids:
+            return {}
+        marks = ','.join('?' * len(board_ids))
+        return dict(self._run(
+            f"SELECT board_id, COUNT(DISTINCT user_id) FROM presence "
+            f"WHERE board_id IN ({marks}) AND last_seen >= ? GROUP BY board_id",
+            (*board_ids, cutoff)))
+
+    def clear(self):
+        self._run("DELETE FROM presence")
+
+
+_backend = None
+_backend_setting = None
+_backend_lock = threading.Lock()
+_last_sweep = 0.0
+_pending = set()  # boards with a presence_update already scheduled
+_pending_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend, _backend_setting
+    setting = current_app.config.get('PRESENCE_BACKEND', 'memory')
+    with _backend_lock:
+        if setting != _backend_setting:
+            if setting == 'memory':
+                _backend = MemoryPresence()
+            elif setting.startswith('sqlite:///'):
+                _backend = SQLitePresence(setting)
+            else:
+                raise ValueError(f'Unknown PRESENCE_BACKEND {setting!r}')
+            _backend_setting = setting
+        return _backend
+
+
+def _cutoff():
+    return time.time() - current_app.config.get('PRESENCE_TIMEOUT_SECONDS', 90)
+
+
+def join(board_id, sid, user):
+    get_backend().join(board_id, sid, user.id, user.username, time.time())
+    _changed(board_id)
+
+
+def leave(board_id, sid):
+    if get_backend().leave(board_id, sid):
+        _changed(board_id)
+
+
+def disconnect(sid):
+    for board_id in get_backend().drop_sid(sid):
+        _changed(board_id)
+
+
+def heartbeat(sid):
+    """Mark `sid` as still there, and sweep out sids that stopped beating."""
+    global _last_sweep
+    get_backend().touch(sid, time.time())
+    timeout = current_app.config.get('PRESENCE_TIMEOUT_SECONDS', 90)
+    now = time.monotonic()
+    if now - _last_sweep > timeout / 3:
+        _last_sweep = now
+        for board_id in get_backend().expire(_cutoff()):
+            _changed(board_id)
+
+
+def viewers(board_id):
+    """Distinct (user id, username) pairs viewing `board_id`."""
+    return get_backend().viewers(board_id, _cutoff())
+
+
+def viewer_counts(board_ids):
+    """board id -> number of distinct users viewing it; boards nobody views are left out."""
+    return get_backend().counts(board_ids, _cutoff())
+
+
+def _changed(board_id):
+    window_ms = current_app.config.get('PRESENCE_DEBOUNCE_MS', 1000)
+    if window_ms <= 0:
+        announce(board_id)
+        return
+    with _pending_lock:
+        if board_id in _pending:
+            return
+        _pending.add(board_id)
+    app = current_app._get_current_object()
+    socketio.start_background_task(_announce_later, app, board_id, window_ms / 1000.0)
+
+
+def _announce_later(app, board_id, delay):
+    socketio.sleep(delay)
+    with _pending_lock:
+        _pending.discard(board_id)
+    with app.app_context():
+        announce(board_id)
+
+
+def announce(board_id):
+    """Broadcast the current viewers of `board_id` to its room."""
+    users = viewers(board_id)
+    limit = current_app.config.get('PRESENCE_LIST_LIMIT', 50)
+    socketio.emit('presence_update', {
+        'board_id': board_id,
+        'count': len(users),
+        'users': [{'id': user_id, 'username': username} for user_id, username in users[:limit]],
+    }, room=str(board_id))
+
+
+def clear():
+    get_backend().clear()
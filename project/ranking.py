@@ -0,0 +1,259 @@
+"""
+Sparse ordering keys for lists and cards.
+
+Positions are floats spaced RANK_STEP apart. Inserting or moving an item
+gives it the midpoint of its new neighbours, so only that one row is written
+and nothing else in the list has to be renumbered. Repeated inserts into the
+same gap eventually make neighbours too close to split, at which point the
+parent is rebalanced back to evenly spaced keys in a background task.
+"""
+import threading
+from flask import current_app
+from sqlalchemy import bindparam, func, inspect, select, update
+from project import db, socketio
+from project.models import List, Card
+from project.changes import record_change, announce_change
+
+# Distance between neighbours after a rebalance / when appending.
+RANK_STEP = 1024.0
+
+# Once two neighbours are closer than this we schedule a rebalance.
+MIN_RANK_GAP = 1e-6
+
+
+def rank_between(before, after):
+    """Return a key that sorts between `before` and `after` (either may be None)."""
+    if before is None and after is None:
+        return 0.0
+    if before is None:
+        return after - RANK_STEP
+    if after is None:
+        return before + RANK_STEP
+    return (before + after) / 2.0
+
+
+def ranks_between(before, after, count):
+    """`count` increasing keys between `before` and `after`, evenly spread over the gap."""
+    if before is None and after is None:
+        return [index * RANK_STEP for index in range(count)]
+    if before is None:
+        return [after - (count - index) * RANK_STEP for index in range(count)]
+    if after is None:
+        return [before + (index + 1) * RANK_STEP for index in range(count)]
+    step = (after - before) / (count + 1)
+    return [before + (index + 1) * step for index in range(count)]
+
+
+def gap_too_small(before, position, after):
+    """True when `position` sits too close to one of its neighbours."""
+    if before is not None and position - before < MIN_RANK_GAP:
+        return True
+    if after is not None and after - position < MIN_RANK_GAP:
+        return True
+    return False
+
+
+# --- Key calculation ---
+
+def next_list_position(board_id):
+    """Key for a list appended to the end of a board."""
+    last = db.session.query(func.max(List.position)).filter(List.board_id == board_id).scalar()
+    return rank_between(last, None)
+
+
+def next_card_position(list_id):
+    """Key for a card appended to the end of a list."""
+    last = db.session.query(func.max(Card.position)).filter(Card.list_id == list_id).scalar()
+    return rank_between(last, None)
+
+
+def card_position_before(list_id, sibling, exclude_id=None):
+    """
+    Key for a card dropped directly in front of `sibling` in `list_id`.
+    Returns (position, needs_rebalance).
+    """
+    if sibling is None:
+        query = db.session.query(func.max(Card.position)).filter(Card.list_id == list_id)
+        if exclude_id is not None:
+            query = query.filter(Card.id != exclude_id)
+        before = query.scalar()
+        return rank_between(before, None), False
+
+    query = db.session.query(func.max(Card.position)).filter(
+        Card.list_id == list_id,
+        Card.position < sibling.position
+    )
+    if exclude_id is not None:
+        query = query.filter(Card.id != exclude_id)
+    before = query.scalar()
+    position = rank_between(before, sibling.position)
+    return position, gap_too_small(before, position, sibling.position)
+
+
+def list_position_before(board_id, sibling, exclude_id=None):
+    """
+    Key for a list dropped directly in front of `sibling` on `board_id`.
+    Returns (position, needs_rebalance).
+    """
+    query = db.session.query(func.max(List.position)).filter(List.board_id == board_id)
+    if exclude_id is not None:
+        query = query.filter(List.id != exclude_id)
+    if sibling is None:
+        return rank_between(query.scalar(), None), False
+
+    before = query.filter(List.position < sibling.position).scalar()
+    position = rank_between(before, sibling.position)
+    return position, gap_too_small(before, position, sibling.position)
+
+
+# --- Rebalancing ---
+
+def _respace(model, rows):
+    """
+    Rewrite the given (id, version) rows to evenly spaced keys, in order.
+    Like any ORM update, each row is only written if its version still
+    matches, else StaleDataError.
+    """
+    values = [{'id': row.id, 'version': row.version, 'position': index * RANK_STEP}
+              for index, row in enumerate(rows)]
+    if values:
+        db.session.execute(update(model), values)
+
+
+def rebalance_cards(list_id):
+    """Respace every card in a list, keeping the current order. Returns the rows."""
+    rows = db.session.query(Card.id, Card.version).filter(Card.list_id == list_id).order_by(
+        Card.position, Card.id).all()
+    _respace(Card, rows)
+    return rows
+
+
+def _record_card_respace(list_id, rows):
+    """
+    Log respaced cards as a 'cards_moved' change, so open boards and cached
+    board fragments (which show card positions) pick up the new keys.
+    """
+    board_id = db.session.query(List.board_id).filter(List.id == list_id).scalar()
+    if board_id is None or not rows:
+        return None, None
+    return board_id, record_change(board_id, 'cards_moved', {'moves': _card_moves(list_id, rows)})
+
+
+def _card_moves(list_id, rows):
+    return [{'card_id': f'card-{row.id}', 'list_id': f'list-{list_id}', 'position': index * RANK_STEP,
+             'version': row.version + 1}
+            for index, row in enumerate(rows)]
+
+
+def rebalance_lists(board_id):
+    """Respace every list on a board, keeping the current order. Returns the rows."""
+    rows = db.session.query(List.id, List.version).filter(List.board_id == board_id).order_by(
+        List.position, List.id).all()
+    _respace(List, rows)
+    return rows
+
+
+def _record_list_respace(board_id, rows):
+    """Log respaced lists as a 'lists_moved' change; open boards order columns by key."""
+    if not rows:
+        return None
+    lists = [{'id': row.id, 'position': index * RANK_STEP, 'version': row.version + 1}
+             for index, row in enumerate(rows)]
+    return record_change(board_id, 'lists_moved', {'lists': lists})
+
+
+def rebalance_board(board_id):
+    """
+    Respace the lists of a board and the cards inside each of them, and log
+    them as a 'lists_moved' and a 'cards_moved' change like the background
+    rebalance does. Does not commit; returns the new board version, or None
+    if there was nothing to respace.
+    """
+    list_rows = rebalance_lists(board_id)
+    version = _record_list_respace(board_id, list_rows)
+    moves = []
+    for row in list_rows:
+        moves.extend(_card_moves(row.id, rebalance_cards(row.id)))
+    if moves:
+        version = record_change(board_id, 'cards_moved', {'moves': moves})
+    return version
+
+
+def _respace_unversioned(table, parent_column, parent_id):
+    """_respace() with plain table UPDATEs, for a schema without row versions."""
+    ids = db.session.execute(
+        select(table.c.id).where(parent_column == parent_id).order_by(table.c.position, table.c.id)
+    ).scalars().all()
+    if ids:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('row_id')).values(position=bindparam('key')),
+            [{'row_id': row_id, 'key': index * RANK_STEP} for index, row_id in enumerate(ids)])
+
+
+def rebalance_all():
+    """
+    Respace every board. This is also the migration path from the old dense
+    0..n-1 integer positions: their order is kept, only the gaps change.
+    Does not commit; returns {board id: new version or None}, empty when
+    run before the row versions exist.
+    """
+    from project.models import Board
+    board_ids = [row.id for row in db.session.query(Board.id)]
+    columns = {column['name'] for column in inspect(db.engine).get_columns('lists')}
+    if 'version' not in columns:
+        # Migration 0001 runs before 0005 adds the version columns
+        lists, cards = List.__table__, Card.__table__
+        for board_id in board_ids:
+            _respace_unversioned(lists, lists.c.board_id, board_id)
+        for list_id in db.session.execute(select(lists.c.id)).scalars().all():
+            _respace_unversioned(cards, cards.c.list_id, list_id)
+        return {}
+    return {board_id: rebalance_board(board_id) for board_id in board_ids}
+
+
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _run_rebalance(app, key):
+    kind, parent_id = key
+    try:
+        with app.app_context():
+            try:
+                board_id = version = None
+                if kind == 'cards':
+                    rows = rebalance_cards(parent_id)
+                    board_id, version = _record_card_respace(parent_id, rows)
+                else:
+                    board_id = parent_id
+                    version = _record_list_respace(board_id, rebalance_lists(parent_id))
+                db.session.commit()
+                if version is not None:
+                    announce_change(board_id, version)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"Rebalance of {kind} {parent_id} failed: {e}")
+            finally:
+                db.session.remove()
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def _schedule(key):
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    app = current_app._get_current_object()
+    socketio.start_background_task(_run_rebalance, app, key)
+
+
+def schedule_card_rebalance(list_id):
+    """Respace a list's cards in the background (deduplicated per list)."""
+    _schedule(('cards', list_id))
+
+
+def schedule_list_rebalance(board_id):
+    """Respace a board's lists in the background (deduplicated per board)."""
+    _schedule(('lists', board_id))
@@ -0,0 +1,195 @@
+"""
+Socket.IO server options for single- and multi-process deployments.
+
+With one process, rooms live in memory and nothing else is needed. To run
+several worker processes behind one port, every worker must share a
+message queue so that `emit(..., room=...)` reaches clients connected to
+any of them. SOCKETIO_MESSAGE_QUEUE selects the backend:
+
+    redis://host:6379/0      Redis (needs the `redis` package)
+    amqp://...               anything Kombu supports
+    sqlite:////tmp/queue.db  SQLiteQueueManager below, a local stand-in
+                             for Redis used by the tests and benchmarks
+
+SOCKETIO_ASYNC_MODE picks eventlet, gevent or threading (empty = auto).
+SOCKETIO_TRANSPORTS=websocket lets workers run without sticky sessions.
+
+Every client manager built here applies per-client backpressure to board
+deltas (see BackpressureManager); SOCKETIO_CLIENT_QUEUE_LIMIT sets how many
+undelivered packets a client may have before deltas stop queueing for it.
+"""
+import sqlite3
+import threading
+import time
+import socketio as python_socketio
+from project import metrics
+
+# Broadcasts that only bring a client from one board version to the next.
+# Dropping them is safe because `sync_board` can replay them all.
+DELTA_EVENTS = frozenset({'cards_moved_batch', 'list_moved', 'board_changed'})
+RESYNC_EVENT = 'resync_required'
+
+
+class BackpressureManager(python_socketio.Manager):
+    """
+    Client manager that stops queueing board deltas for slow clients.
+
+    When a client already has `client_queue_limit` packets waiting in its
+    Engine.IO queue, the delta is not queued for it; instead it gets one
+    `resync_required` notice and no further deltas until it calls
+    `sync_board` (clear_resync), which fetches everything it skipped in one
+    reply. A slow client therefore costs at most the limit plus one notice,
+    however busy the board is. Other events are always delivered.
+
+    Runs where packets are handed to local clients, so with a message queue
+    each worker applies it to its own clients.
+    """
+    client_queue_limit = 100
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._resync_pending = set()
+        self._resync_lock = threading.Lock()
+
+    def _queue_depth(self, eio_sid):
+        socket = self.server.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None,
+             callback=None, to=None, **kwargs):
+        room = to or room
+        if event not in DELTA_EVENTS or room is None or callback or not self.client_queue_limit:
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                callback=callback, **kwargs)
+
+        skip = list(skip_sid) if isinstance(skip_sid, list) else [skip_sid]
+        notify = []
+        with self._resync_lock:
+            for sid, eio_sid in self.get_participants(namespace, room):
+                if sid in self._resync_pending:
+                    skip.append(sid)
+                elif self._queue_depth(eio_sid) >= self.client_queue_limit:
+                    self._resync_pending.add(sid)
+                    skip.append(sid)
+                    notify.append(sid)
+        super().emit(event, data, namespace, room=room, skip_sid=skip, **kwargs)
+        for sid in notify:
+            metrics.resync_notices.inc()
+            super().emit(RESYNC_EVENT, {'room': room}, namespace, room=sid)
+
+    def clear_resync(self, sid):
+        """`sid` has caught up; send it deltas again."""
+        with self._resync_lock:
+            self._resync_pending.discard(sid)
+
+    def disconnect(self, sid, namespace, **kwargs):
+        self.clear_resync(sid)
+        return super().disconnect(sid, namespace, **kwargs)
+
+
+class SQLiteQueueManager(python_socketio.PubSubManager, BackpressureManager):
+    """
+    Pub/sub client manager backed by a shared SQLite file.
+
+    Every published message is a row; each process polls for rows newer
+    than the last one it has seen. Old rows are pruned after `retention`
+    seconds. Only meant for tests and single-machine deployments.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None,
+                 poll_interval=0.01, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('sqlite:///'):]
+        self.poll_interval = poll_interval
+        self.retention = retention
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS socketio_messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _sleep(self, seconds):
+        if self.server is not None:
+            self.server.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _publish(self, data):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO socketio_messages (channel, payload, created) VALUES (?, ?, ?)",
+                (self.channel, self.json.dumps(data), time.time())
+            )
+        finally:
+            conn.close()
+
+    def _listen(self):
+        conn = self._connect()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM socketio_messages").fetchone()[0]
+        last_prune = time.time()
+        while True:
+            rows = conn.execute(
+                "SELECT id, payload FROM socketio_messages WHERE channel = ? AND id > ? ORDER BY id",
+                (self.channel, last_id)
+            ).fetchall()
+            for row_id, payload in rows:
+                last_id = row_id
+                yield payload
+            if time.time() - last_prune > self.retention:
+                last_prune = time.time()
+                conn.execute("DELETE FROM socketio_messages WHERE created < ?",
+                             (last_prune - self.retention,))
+            if not rows:
+                self._sleep(self.poll_interval)
+
+
+def queue_manager_class(url):
+    """
+    The pub/sub manager for a message queue URL, with backpressure mixed in
+    below the pub/sub layer so it applies to messages from other workers.
+    """
+    if url.startswith('sqlite:///'):
+        # Flask-SocketIO only knows the network brokers
+        return SQLiteQueueManager
+    if url.startswith(('redis://', 'rediss://')):
+        base = python_socketio.RedisManager
+    elif url.startswith('kafka://'):
+        base = python_socketio.KafkaManager
+    elif url.startswith('zmq'):
+        base = python_socketio.ZmqManager
+    else:
+        base = python_socketio.KombuManager
+    return type(f'Backpressure{base.__name__}', (base, BackpressureManager), {})
+
+
+def socketio_options(config, write_only=False):
+    """Keyword arguments for SocketIO.init_app() built from the app config."""
+    options = {}
+    async_mode = config.get('SOCKETIO_ASYNC_MODE')
+    if async_mode:
+        options['async_mode'] = async_mode
+
+    transports = config.get('SOCKETIO_TRANSPORTS')
+    if transports:
+        options['transports'] = [t.strip() for t in transports.split(',') if t.strip()]
+
+    url = config.get('SOCKETIO_MESSAGE_QUEUE')
+    channel = config.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    if url:
+        manager = queue_manager_class(url)(url, channel=channel, write_only=write_only)
+    else:
+        manager = BackpressureManager()
+    manager.client_queue_limit = config.get('SOCKETIO_CLIENT_QUEUE_LIMIT', BackpressureManager.client_queue_limit)
+    options['client_manager'] = manager
+    return options
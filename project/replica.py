@@ -0,0 +1,103 @@
+"""
+Read-replica routing.
+
+With DATABASE_REPLICA_URL (SQLALCHEMY_REPLICA_URI) set, views decorated with
+@read_replica send their SELECTs to a replica engine on GET/HEAD requests.
+The engine is separate from Flask-SQLAlchemy's binds, so models and
+create_all() only ever see the primary. Everything else --
+mutations, socket moves, background tasks, board access checks (which are
+cached, see project/access.py) and any SELECT issued while the session is
+flushing -- stays on the primary.
+
+Read-your-writes: after a request of a user's that wrote to the database
+(an ORM flush or an INSERT/UPDATE/DELETE through the session), or after a
+socket move, their reads stay on the primary for REPLICA_STICKY_SECONDS.
+HTTP writes record this in the Flask session cookie, so it holds across
+workers; socket moves record it per process.
+"""
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, request, session
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql import Select
+
+REPLICA = 'nexus_replica'  # key in app.extensions
+
+_socket_writes = {}  # user id -> monotonic time until which reads use the primary
+_socket_writes_lock = threading.Lock()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that can send plain SELECTs to the replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and isinstance(clause, Select) and not self._flushing
+                and has_app_context() and g.get('_read_replica')):
+            engine = current_app.extensions.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    if has_app_context():
+        g._db_write = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _executed(orm_execute_state):
+    if not orm_execute_state.is_select and has_app_context():
+        g._db_write = True
+
+
+def enabled():
+    return REPLICA in current_app.extensions
+
+
+def _sticky():
+    if session.get('_primary_until', 0) > time.time():
+        return True
+    if current_user.is_authenticated:
+        with _socket_writes_lock:
+            return _socket_writes.get(current_user.id, 0) > time.monotonic()
+    return False
+
+
+def read_replica(view):
+    """Serve this view's GET/HEAD reads from the replica when one is configured."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if request.method in ('GET', 'HEAD') and enabled() and not _sticky():
+            g._read_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def mark_socket_write(user_id):
+    """Keep `user_id` on the primary for a while after a socket mutation."""
+    if enabled():
+        until = time.monotonic() + current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+        with _socket_writes_lock:
+            _socket_writes[user_id] = until
+            # Drop expired entries now and then so the map stays small
+            if len(_socket_writes) > 10000:
+                now = time.monotonic()
+                for key in [k for k, v in _socket_writes.items() if v <= now]:
+                    del _socket_writes[key]
+
+
+def _remember_write(response):
+    if g.get('_db_write') and response.status_code < 400 and enabled():
+        session['_primary_until'] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    return response
+
+
+def init_app(app):
+    url = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if url:
+        app.extensions[REPLICA] = create_engine(url, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        app.after_request(_remember_write)
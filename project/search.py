@@ -0,0 +1,242 @@
+"""
+Full-text search over card titles and descriptions.
+
+Cards are indexed in `card_search`, keyed by card id and carrying the
+card's board so results can be limited to boards the user may see:
+
+- SQLite: an FTS5 virtual table (rowid = card id), ranked with bm25().
+  The board is indexed as a token ('b42'), so FTS5 intersects the query
+  words with the user's boards before ranking; users with more than
+  MAX_BOARD_TERMS boards are filtered on the stored value instead.
+- PostgreSQL: a table with a weighted `tsvector` under a GIN index and
+  a board_id B-tree, ranked with ts_rank()
+
+Titles weigh more than descriptions. Every word of a query must match, as
+a prefix, so "rel pla" finds "Release plan". The index is created with the
+other tables (db.create_all() or migration 0004), updated in the same
+transaction as each card mutation (see project/mutations.py and
+project/board_io.py), and rebuilt from the cards table with
+`flask --app run nexus reindex`.
+
+Result pages are ordered by (rank, card id) and continue from an opaque
+cursor holding the last hit's key, like the dashboard feeds.
+"""
+import base64
+import re
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event, select, text
+from project import db
+from project.models import Board, List, Card
+from project.dashboard import InvalidCursor
+
+SearchHit = namedtuple('SearchHit', 'card_id title description list_id list_name board_id board_name')
+SearchPage = namedtuple('SearchPage', 'hits next_cursor')
+
+MAX_TERMS = 8
+MAX_BOARD_TERMS = 200
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS card_search USING fts5("
+    "title, description, board, prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+]
+_POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS card_search ("
+    "card_id INTEGER PRIMARY KEY REFERENCES cards (id) ON DELETE CASCADE, "
+    "board_id INTEGER NOT NULL, document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_card_search_document ON card_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_card_search_board ON card_search (board_id)",
+]
+_POSTGRES_DOCUMENT = ("setweight(to_tsvector('simple', {title}), 'A') || "
+                      "setweight(to_tsvector('simple', coalesce({description}, '')), 'B')")
+
+# Column holding the card id
+_KEY = {'sqlite': 'rowid', 'postgresql': 'card_id'}
+# Boards being purged (see project/deletion.py) are left out
+_ACCESSIBLE_BOARDS = ("SELECT id FROM boards WHERE NOT deleting AND (user_id = :user_id "
+                      "OR id IN (SELECT board_id FROM board_members WHERE user_id = :user_id))")
+
+
+def _dialect(bind=None):
+    return (bind or db.session.get_bind()).dialect.name
+
+
+def create_index(connection):
+    """Create the search table for this connection's database if it is missing."""
+    statements = {'sqlite': _SQLITE_DDL, 'postgresql': _POSTGRES_DDL}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_with_tables(target, connection, **kw):
+    create_index(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_with_tables(target, connection, **kw):
+    connection.execute(text("DROP TABLE IF EXISTS card_search"))
+
+
+# --- Index maintenance (no commits; callers commit with their change) ---
+
+def index_card(card_id, board_id, title, description):
+    """Add or replace one card in the index."""
+    params = {'card_id': card_id, 'board_id': board_id, 'title': title, 'description': description}
+    if _dialect() == 'postgresql':
+        db.session.execute(text(
+            "INSERT INTO card_search (card_id, board_id, document) VALUES (:card_id, :board_id, "
+            + _POSTGRES_DOCUMENT.format(title=':title', description=':description') +
+            ") ON CONFLICT (card_id) DO UPDATE SET board_id = EXCLUDED.board_id, document = EXCLUDED.document"
+        ), params)
+    else:
+        db.session.execute(text(
+            "INSERT OR REPLACE INTO card_search (rowid, title, description, board) "
+            "VALUES (:card_id, :title, coalesce(:description, ''), 'b' || :board_id)"
+        ), params)
+
+
+def _delete_where_card_in(subquery, params):
+    db.session.execute(text(f"DELETE FROM card_search WHERE {_KEY[_dialect()]} IN ({subquery})"), params)
+
+
+def remove_card(card_id):
+    _delete_where_card_in("SELECT :card_id", {'card_id': card_id})
+
+
+def remove_cards(card_ids):
+    """Drop a chunk of cards from the index; call before deleting them."""
+    if card_ids:
+        db.session.execute(text(f"DELETE FROM card_search WHERE {_KEY[_dialect()]} IN "
+                                f"({', '.join(str(int(card_id)) for card_id in card_ids)})"))
+
+
+def remove_list(list_id):
+    """Drop a list's cards from the index; call before deleting the list."""
+    _delete_where_card_in("SELECT id FROM cards WHERE list_id = :list_id", {'list_id': list_id})
+
+
+def remove_board(board_id):
+    """Drop a board's cards from the index; call before deleting the board."""
+    _delete_where_card_in(
+        "SELECT cards.id FROM cards JOIN lists ON lists.id = cards.list_id WHERE lists.board_id = :board_id",
+        {'board_id': board_id})
+
+
+def _insert_from_cards(where='', params=None):
+    select_cards = ("FROM cards JOIN lists ON lists.id = cards.list_id" + where)
+    if _dialect() == 'postgresql':
+        db.session.execute(text(
+            "INSERT INTO card_search (card_id, board_id, document) SELECT cards.id, lists.board_id, "
+            + _POSTGRES_DOCUMENT.format(title='cards.title', description='cards.description')
+            + " " + select_cards
+        ), params or {})
+    else:
+        db.session.execute(text(
+            "INSERT INTO card_search (rowid, title, description, board) "
+            "SELECT cards.id, cards.title, coalesce(cards.description, ''), 'b' || lists.board_id "
+            + select_cards
+        ), params or {})
+
+
+def index_cards(card_ids):
+    """Add a chunk of cards to the index, e.g. after restoring them from the archive."""
+    if card_ids:
+        _insert_from_cards(f" WHERE cards.id IN ({', '.join(str(int(card_id)) for card_id in card_ids)})")
+
+
+def index_list(list_id):
+    """Add a list's cards to the index."""
+    _insert_from_cards(" WHERE cards.list_id = :list_id", {'list_id': list_id})
+
+
+def index_board(board_id):
+    """(Re)index every card of one board, e.g. after a bulk import."""
+    remove_board(board_id)
+    _insert_from_cards(" WHERE lists.board_id = :board_id", {'board_id': board_id})
+
+
+def rebuild():
+    """Rebuild the whole index from the cards table. Returns the number of cards indexed."""
+    create_index(db.session.connection())
+    db.session.execute(text("DELETE FROM card_search"))
+    _insert_from_cards()
+    if _dialect() == 'sqlite':
+        # Merge the b-tree segments written by the bulk insert
+        db.session.execute(text("INSERT INTO card_search (card_search) VALUES ('optimize')"))
+    return db.session.execute(text("SELECT COUNT(*) FROM card_search")).scalar()
+
+
+# --- Queries ---
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _postgres_matches(user_id, terms):
+    """(SQL, query) ranking the user's matching cards; lower score = better."""
+    sql = ("SELECT card_id, -ts_rank(document, to_tsquery('simple', :query)) AS score "
+           "FROM card_search WHERE document @@ to_tsquery('simple', :query) "
+           f"AND board_id IN ({_ACCESSIBLE_BOARDS})")
+    return sql, ' & '.join(f'{term}:*' for term in terms)
+
+
+def _sqlite_matches(user_id, terms):
+    """Same for FTS5; (None, None) when the user has no boards at all."""
+    words = '{title description} : (' + ' '.join(f'"{term}"*' for term in terms) + ')'
+    sql = "SELECT rowid AS card_id, bm25(card_search, 4.0, 1.0, 0.0) AS score FROM card_search " \
+          "WHERE card_search MATCH :query"
+    board_ids = db.session.execute(text(_ACCESSIBLE_BOARDS), {'user_id': user_id}).scalars().all()
+    if not board_ids:
+        return None, None
+    if len(board_ids) <= MAX_BOARD_TERMS:
+        # Only cards of these boards are ranked
+        return sql, words + ' AND board : (' + ' OR '.join(f'b{board_id}' for board_id in board_ids) + ')'
+    # A long OR costs more than checking each match's stored board
+    return sql + f" AND board IN (SELECT 'b' || id FROM ({_ACCESSIBLE_BOARDS}))", words
+
+
+def encode_cursor(score, card_id):
+    raw = f'{score!r}|{card_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, card_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return float(score), int(card_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+def search_cards(user_id, query, cursor=None, limit=None):
+    """One page of the cards matching `query` on boards `user_id` can access, best first."""
+    limit = limit or current_app.config.get('SEARCH_PAGE_SIZE', 20)
+    terms = _terms(query)
+    if not terms:
+        return SearchPage([], None)
+    matches = _postgres_matches if _dialect() == 'postgresql' else _sqlite_matches
+    sql, match_query = matches(user_id, terms)
+    if sql is None:
+        return SearchPage([], None)
+
+    sql = f"SELECT card_id, score FROM ({sql}) AS matches"
+    params = {'query': match_query, 'user_id': user_id, 'limit': limit + 1}
+    if cursor:
+        params['after_score'], params['after_id'] = decode_cursor(cursor)
+        sql += " WHERE score > :after_score OR (score = :after_score AND card_id > :after_id)"
+    sql += " ORDER BY score, card_id LIMIT :limit"
+    # One extra row tells us whether there is a next page
+    ranked = db.session.execute(text(sql), params).all()
+
+    page = ranked[:limit]
+    rows = db.session.execute(
+        select(Card.id, Card.title, Card.description, List.id, List.name, Board.id, Board.name)
+        .join(List, List.id == Card.list_id).join(Board, Board.id == List.board_id)
+        .where(Card.id.in_([row.card_id for row in page]))
+    ).all() if page else []
+    by_id = {row[0]: SearchHit(*row) for row in rows}
+    hits = [by_id[row.card_id] for row in page if row.card_id in by_id]
+    next_cursor = encode_cursor(page[-1].score, page[-1].card_id) if len(ranked) > limit else None
+    return SearchPage(hits, next_cursor)
@@ -0,0 +1,87 @@
+"""
+Read-only board snapshots.
+
+Walking board.lists and then list.cards lazily costs one query per list.
+load_board_snapshot() instead pulls the board, its owner, member ids, lists
+and cards in four fixed queries no matter how big the board is, and returns
+plain named tuples that templates and socket handlers can share.
+"""
+from collections import namedtuple
+from project import db
+from project.models import User, Board, List, Card, board_members
+
+BoardHead = namedtuple('BoardHead', 'id name version owner_id owner_username date_created')
+BoardSnapshot = namedtuple('BoardSnapshot', 'id name version owner_id owner_username member_ids lists')
+ListSnapshot = namedtuple('ListSnapshot', 'id name position version cards')
+CardSnapshot = namedtuple('CardSnapshot', 'id title description position list_id version')
+
+
+def load_board_head(board_id):
+    """Return the BoardHead (no lists or cards) for `board_id`, or None (also while it is being deleted)."""
+    row = db.session.query(
+        Board.id, Board.name, Board.version, Board.user_id, User.username, Board.date_created
+    ).join(User, User.id == Board.user_id).filter(Board.id == board_id, ~Board.deleting).first()
+    return BoardHead(*row) if row is not None else None
+
+
+def load_board_snapshot(board_id, head=None):
+    """
+    Return a BoardSnapshot for `board_id`, or None if it does not exist.
+    Pass a BoardHead that was just loaded to save the first query.
+    """
+    if head is None:
+        head = load_board_head(board_id)
+    if head is None:
+        return None
+
+    member_ids = frozenset(
+        row.user_id for row in db.session.query(board_members.c.user_id).filter(
+            board_members.c.board_id == board_id)
+    )
+
+    list_rows = db.session.query(List.id, List.name, List.position, List.version).filter(
+        List.board_id == board_id
+    ).order_by(List.position, List.id).all()
+
+    card_rows = db.session.query(
+        Card.id, Card.title, Card.description, Card.position, Card.list_id, Card.version
+    ).join(List, List.id == Card.list_id).filter(
+        List.board_id == board_id
+    ).order_by(Card.position, Card.id).all()
+
+    cards_by_list = {row.id: [] for row in list_rows}
+    for row in card_rows:
+        cards_by_list[row.list_id].append(CardSnapshot(*row))
+
+    lists = tuple(
+        ListSnapshot(row.id, row.name, row.position, row.version, tuple(cards_by_list[row.id]))
+        for row in list_rows
+    )
+    return BoardSnapshot(head.id, head.name, head.version, head.owner_id, head.owner_username,
+                         member_ids, lists)
+
+
+def can_view(snapshot, user_id):
+    """True if `user_id` owns the snapshotted board or is a member of it."""
+    return snapshot.owner_id == user_id or user_id in snapshot.member_ids
+
+
+def snapshot_to_dict(snapshot):
+    """JSON-friendly form of a snapshot, for socket payloads and the API."""
+    return {
+        'id': snapshot.id,
+        'name': snapshot.name,
+        'version': snapshot.version,
+        'owner_id': snapshot.owner_id,
+        'member_ids': sorted(snapshot.member_ids),
+        'lists': [
+            {
+                'id': list_item.id,
+                'name': list_item.name,
+                'position': list_item.position,
+                'version': list_item.version,
+                'cards': [card._asdict() for card in list_item.cards],
+            }
+            for list_item in snapshot.lists
+        ],
+    }
@@ -1,5 +1,7 @@
-// Connect to the WebSocket server
-const socket = io();
+// Connect to the WebSocket server. Transports come from SOCKETIO_TRANSPORTS,
+// so multi-worker deployments can skip long-polling (no sticky sessions needed)
+const transports = (document.currentScript.dataset.transports || 'polling,websocket').split(',');
+const socket = io({ transports });
 
 // Wait for the DOM to be fully loaded before running the script
 document.addEventListener('DOMContentLoaded', () => {
@@ -8,26 +10,51 @@ document.addEventListener('DOMContentLoaded', () => {
     const boardContainer = document.querySelector('.board-container');
     const boardId = boardContainer.dataset.boardId;
 
+    // Last board version this page reflects (see project/changes.py)
+    let boardVersion = parseInt(boardContainer.dataset.version, 10) || 0;
+
     // Emit 'join_board' event to server
     if (boardId) {
         socket.emit('join_board', { 'board_id': boardId });
     }
+
+    // Tell the server we are still here (see project/presence.py)
+    const heartbeatSeconds = parseInt(boardContainer.dataset.heartbeat, 10) || 30;
+    setInterval(() => socket.emit('presence_heartbeat', { 'board_id': boardId }), heartbeatSeconds * 1000);
+
+    // Rooms are lost on disconnect: rejoin, then fetch what we missed
+    socket.io.on('reconnect', () => {
+        socket.emit('join_board', { 'board_id': boardId });
+        syncBoard();
+    });
     
     // --- (Module 3 Code) ---
     const draggables = document.querySelectorAll('.card');
     const containers = document.querySelectorAll('.list-column');
 
-    draggables.forEach(draggable => {
+    draggables.forEach(makeDraggable);
+
+    function makeDraggable(draggable) {
         draggable.addEventListener('dragstart', () => {
             draggable.classList.add('dragging');
         });
 
+        // Ctrl/Cmd-click adds a card to the selection that is dragged or
+        // deleted as a whole (see project/bulk.py)
+        draggable.addEventListener('click', e => {
+            if (!(e.ctrlKey || e.metaKey) || e.target.closest('a, button')) return;
+            e.preventDefault();
+            draggable.classList.toggle('selected');
+        });
+
         draggable.addEventListener('dragend', () => {
             draggable.classList.remove('dragging');
         });
-    });
+    }
+
+    containers.forEach(makeDropTarget);
 
-    containers.forEach(container => {
+    function makeDropTarget(container) {
         container.addEventListener('dragover', e => {
             e.preventDefault();
             const draggable = document.querySelector('.dragging');
@@ -63,18 +90,124 @@ document.addEventListener('DOMContentLoaded', () => {
             const afterElement = getDragAfterElement(newCardContainer, e.clientY);
             const nextSibling = afterElement ? afterElement : null;
 
-            // Prepare data payload for the server
+            const selection = selectedCards();
+            if (draggable.classList.contains('selected') && selection.length > 1) {
+                dropSelection(selection, newCardContainer, nextSibling);
+                return;
+            }
+
+            // Prepare data payload for the server (integer ids)
             const data = {
-                'card_id': draggable.id,
-                'new_list_id': newCardContainer.id,
-                'next_sibling_id': nextSibling ? nextSibling.id : null
+                'card_id': idOf(draggable),
+                'new_list_id': idOf(newCardContainer),
+                'next_sibling_id': nextSibling ? idOf(nextSibling) : null,
+                // The version we saw; if someone else moved or edited the
+                // card since, the server answers with move_conflict
+                'version': parseInt(draggable.dataset.version, 10)
             };
 
             // Emit the 'card_moved' event to the server
             socket.emit('card_moved', data);
+            // Each accepted move bumps the version by one, so a second drag
+            // before the broadcast arrives is not mistaken for a stale one
+            draggable.dataset.version = data.version + 1;
+        });
+    }
+
+    function selectedCards() {
+        return [...document.querySelectorAll('.card.selected')];
+    }
+
+    function clearSelection() {
+        selectedCards().forEach(card => card.classList.remove('selected'));
+    }
+
+    /**
+     * Moves every selected card, in page order, in front of nextSibling:
+     * one cards_bulk_moved instead of a drag per card. The broadcast that
+     * follows puts them at their authoritative positions.
+     */
+    function dropSelection(selection, cardContainer, nextSibling) {
+        while (nextSibling && nextSibling.classList.contains('selected')) {
+            nextSibling = nextSibling.nextElementSibling;
+        }
+        selection.forEach(card => {
+            cardContainer.insertBefore(card, nextSibling);
+            card.dataset.version = (parseInt(card.dataset.version, 10) || 0) + 1;
+        });
+        socket.emit('cards_bulk_moved', {
+            'board_id': boardId,
+            'card_ids': selection.map(idOf),
+            'new_list_id': idOf(cardContainer),
+            'next_sibling_id': nextSibling ? idOf(nextSibling) : null
+        });
+        clearSelection();
+    }
+
+    // Delete removes the whole selection, A archives it, Escape drops it
+    document.addEventListener('keydown', e => {
+        const selection = selectedCards();
+        if (!selection.length || e.target.closest('input, textarea')) return;
+        if (e.key === 'Escape') {
+            clearSelection();
+        } else if (e.key === 'Delete' && confirm(`Delete ${selection.length} cards?`)) {
+            socket.emit('cards_bulk_deleted', { 'board_id': boardId, 'card_ids': selection.map(idOf) });
+            clearSelection();
+        } else if (e.key === 'a' && !e.ctrlKey && !e.metaKey) {
+            socket.emit('cards_bulk_archived', { 'board_id': boardId, 'card_ids': selection.map(idOf) });
+            clearSelection();
+        }
+    });
+
+    // --- Dragging lists by their header ---
+    const boardCanvas = document.querySelector('.board-canvas');
+    document.querySelectorAll('.list-header').forEach(makeListDraggable);
+
+    function makeListDraggable(header) {
+        const column = header.closest('.list-column');
+        header.addEventListener('dragstart', () => column.classList.add('list-dragging'));
+        header.addEventListener('dragend', () => column.classList.remove('list-dragging'));
+    }
+
+    boardCanvas.addEventListener('dragover', e => {
+        const column = document.querySelector('.list-column.list-dragging');
+        if (!column) return;
+        e.preventDefault();
+        boardCanvas.insertBefore(column, getListAfterElement(e.clientX) || newListForm());
+    });
+
+    boardCanvas.addEventListener('drop', e => {
+        const column = document.querySelector('.list-column.list-dragging');
+        if (!column) return;
+        e.preventDefault();
+        const nextSibling = column.nextElementSibling;
+        const version = parseInt(column.dataset.version, 10);
+        socket.emit('list_moved', {
+            'list_id': parseInt(column.dataset.listId, 10),
+            'next_sibling_id': nextSibling && nextSibling.classList.contains('list-column')
+                ? parseInt(nextSibling.dataset.listId, 10) : null,
+            'version': version
         });
+        column.dataset.version = version + 1;
     });
 
+    function newListForm() {
+        return boardCanvas.querySelector('.new-list-form');
+    }
+
+    function getListAfterElement(x) {
+        const columns = [...boardCanvas.querySelectorAll('.list-column:not(.list-dragging)')];
+        return columns.find(column => {
+            const box = column.getBoundingClientRect();
+            return x < box.left + box.width / 2;
+        });
+    }
+
+    // 'card-12' -> 12
+    function idOf(element) {
+        return parseInt(element.id.split('-')[1], 10);
+    }
+
     function getDragAfterElement(container, y) {
         const draggableElements = [...container.querySelectorAll('.card:not(.dragging)')];
 
@@ -94,33 +227,361 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Module 4: Add Socket.IO Listener ---
     
     /**
-     * Listens for 'card_update_broadcast' events from the server.
-     * This event is fired when *another* user moves a card.
-     * We must then manually move the card on our own screen.
+     * Listens for 'cards_moved_batch' events from the server.
+     * The server applies queued drags in batches and sends back the
+     * authoritative list and position of every card it moved, including
+     * our own, so every screen ends up in the same order. Each move is a
+     * compact [cardId, listId, position, version] row.
+     */
+    socket.on('cards_moved_batch', (data) => {
+        if (data.version > boardVersion + 1) {
+            // We missed something in between; the sync includes this batch
+            syncBoard();
+            return;
+        }
+        data.moves.forEach(([cardId, listId, position, version]) => {
+            placeCard({ card_id: `card-${cardId}`, list_id: `list-${listId}`, position, version });
+        });
+        boardVersion = Math.max(boardVersion, data.version);
+    });
+
+    /**
+     * A list was dragged somewhere else; rows are [listId, position, version].
+     */
+    socket.on('list_moved', (data) => {
+        if (data.version > boardVersion + 1) {
+            syncBoard();
+            return;
+        }
+        data.lists.forEach(([id, position, version]) => placeList({ id, position, version }));
+        boardVersion = Math.max(boardVersion, data.version);
+    });
+
+    socket.on('list_move_conflict', (data) => {
+        console.warn('List move not applied:', data.error);
+        data.lists.forEach(([id, position, version]) => placeList({ id, position, version }));
+    });
+
+    /**
+     * We fell behind and the server stopped queueing updates for us; one
+     * sync fetches everything we skipped and turns them back on.
+     */
+    socket.on('resync_required', () => {
+        syncBoard();
+    });
+
+    /**
+     * Any other change (cards or lists created, edited or deleted) is only
+     * announced by version; clients that are behind ask for the deltas.
+     */
+    socket.on('board_changed', (data) => {
+        if (data.version > boardVersion) {
+            syncBoard();
+        }
+    });
+
+    function syncBoard() {
+        socket.emit('sync_board', { 'board_id': boardId, 'since_version': boardVersion }, (result) => {
+            if (result.error) {
+                console.error('Sync failed:', result.error);
+                return;
+            }
+            // The change log was truncated: redraw from the full board
+            if (result.snapshot) {
+                renderSnapshot(result.snapshot);
+                boardVersion = result.version;
+                return;
+            }
+            // A kind this page does not know how to apply
+            if (!result.changes.every(applyChange)) {
+                window.location.reload();
+                return;
+            }
+            boardVersion = Math.max(boardVersion, result.version);
+        });
+    }
+
+    /**
+     * Redraws lists and cards from a snapshot (project/snapshot.py),
+     * reusing the elements already on the page.
+     */
+    function renderSnapshot(snapshot) {
+        document.querySelector('.board-header h1').textContent = `Board: ${snapshot.name}`;
+        const columns = new Set();
+        const cards = new Set();
+        snapshot.lists.forEach(listData => {
+            const column = boardCanvas.querySelector(`.list-column[data-list-id="${listData.id}"]`)
+                || buildList(listData);
+            updateList(column, listData);
+            boardCanvas.insertBefore(column, newListForm());
+            columns.add(column);
+
+            const container = column.querySelector('.card-container');
+            listData.cards.forEach(cardData => {
+                let card = document.getElementById(`card-${cardData.id}`);
+                if (card) {
+                    updateCard(card, cardData);
+                } else {
+                    card = buildCard(cardData);
+                }
+                card.dataset.position = cardData.position;
+                container.appendChild(card);
+                cards.add(card);
+            });
+        });
+        boardCanvas.querySelectorAll('.list-column').forEach(column => {
+            if (!columns.has(column)) column.remove();
+        });
+        boardCanvas.querySelectorAll('.card').forEach(card => {
+            if (!cards.has(card)) card.remove();
+        });
+    }
+
+    /**
+     * Applies one change-log entry to the page. Returns false for kinds
+     * it does not know, which need a full render.
      */
-    socket.on('card_update_broadcast', (data) => {
-        console.log('Broadcast received:', data);
+    function applyChange({ version, kind, payload }) {
+        if (version <= boardVersion) {
+            return true;
+        }
+        switch (kind) {
+            case 'cards_moved':
+                payload.moves.forEach(placeCard);
+                break;
+            case 'card_created':
+                if (!addCard(payload)) return false;
+                break;
+            case 'cards_restored':
+                if (!payload.cards.every(addCard)) return false;
+                break;
+            case 'card_updated': {
+                const card = document.getElementById(`card-${payload.id}`);
+                if (!card) return false;
+                updateCard(card, payload);
+                break;
+            }
+            case 'card_deleted': {
+                const card = document.getElementById(`card-${payload.id}`);
+                if (card) card.remove();
+                break;
+            }
+            case 'cards_deleted':
+            case 'cards_archived':
+                payload.ids.forEach(id => {
+                    const card = document.getElementById(`card-${id}`);
+                    if (card) card.remove();
+                });
+                break;
+            case 'lists_moved':
+                payload.lists.forEach(placeList);
+                break;
+            case 'list_created':
+            case 'list_restored':
+                if (!document.getElementById(`list-${payload.id}`)) {
+                    boardCanvas.insertBefore(buildList(payload), newListForm());
+                }
+                placeList(payload);
+                // A restored list comes back with the cards archived along with it
+                (payload.cards || []).forEach(addCard);
+                break;
+            case 'list_updated': {
+                const list = document.getElementById(`list-${payload.id}`);
+                if (!list) return false;
+                const column = list.closest('.list-column');
+                column.querySelector('.list-header h3').textContent = payload.name;
+                column.dataset.version = payload.version;
+                break;
+            }
+            case 'list_deleted':
+            case 'list_archived': {
+                const list = document.getElementById(`list-${payload.id}`);
+                if (list) list.closest('.list-column').remove();
+                break;
+            }
+            case 'board_updated':
+                document.querySelector('.board-header h1').textContent = `Board: ${payload.name}`;
+                break;
+            default:
+                return false;
+        }
+        boardVersion = version;
+        return true;
+    }
+
+    // A card from a card_created or *_restored payload, at its position
+    function addCard(cardData) {
+        const list = document.getElementById(`list-${cardData.list_id}`);
+        if (!list) return false;
+        const card = document.getElementById(`card-${cardData.id}`) || buildCard(cardData);
+        list.appendChild(card);
+        placeCard({ card_id: card.id, list_id: list.id, position: cardData.position, version: cardData.version });
+        return true;
+    }
 
-        const { card_id, new_list_id, next_sibling_id } = data;
+    // Same markup as the card loop in board.html
+    function buildCard({ id, title, description, position, version }) {
+        const card = document.createElement('div');
+        card.className = 'card';
+        card.id = `card-${id}`;
+        card.draggable = true;
+        card.dataset.position = position;
+        card.dataset.version = version;
+        card.innerHTML = `
+            <div class="card-header">
+                <h4></h4>
+                <div class="card-actions">
+                    <a href="/card/edit/${id}" class="btn-edit-small">Edit</a>
+                    <form method="POST" action="/card/archive/${id}">
+                        <button type="submit" class="btn-edit-small">Archive</button>
+                    </form>
+                    <form method="POST" action="/card/delete/${id}"
+                          onsubmit="return confirm('Delete this card?');">
+                        <button type="submit" class="btn-delete">X</button>
+                    </form>
+                </div>
+            </div>`;
+        card.querySelector('h4').textContent = title;
+        setCardDescription(card, description);
+        makeDraggable(card);
+        return card;
+    }
+
+    function updateCard(card, { title, description, version }) {
+        card.querySelector('h4').textContent = title;
+        setCardDescription(card, description);
+        card.dataset.version = version;
+    }
+
+    // Same markup as the list loop in _board_canvas.html
+    function buildList(listData) {
+        const id = listData.id;
+        const column = document.createElement('div');
+        column.className = 'list-column';
+        column.dataset.listId = id;
+        column.innerHTML = `
+            <div class="list-header" draggable="true">
+                <h3></h3>
+                <div class="list-actions">
+                    <a href="/list/edit/${id}" class="btn-edit-small">Edit</a>
+                    <form method="POST" action="/list/archive/${id}">
+                        <button type="submit" class="btn-edit-small">Archive</button>
+                    </form>
+                    <form method="POST" action="/list/delete/${id}"
+                          onsubmit="return confirm('Delete this list and all its cards?');">
+                        <button type="submit" class="btn-delete">X</button>
+                    </form>
+                </div>
+            </div>
+
+            <div class="card-container" id="list-${id}"></div>
+
+            <div class="card-form">
+                <form method="POST" action="/card/create/${id}">
+                    <div>
+                        <input id="title" name="title" type="text" placeholder="New Card Title" required maxlength="200">
+                    </div>
+                    <div>
+                        <textarea id="description" name="description" placeholder="Description..." rows="2" maxlength="500"></textarea>
+                    </div>
+                    <div>
+                        <input id="submit" name="submit" type="submit" value="Add Card">
+                    </div>
+                </form>
+            </div>`;
+        // The new-list form carries this page's CSRF token, when there is one
+        const csrf = newListForm().querySelector('input[name="csrf_token"]');
+        if (csrf) {
+            column.querySelector('.card-form form').prepend(csrf.cloneNode());
+        }
+        updateList(column, listData);
+        makeDropTarget(column);
+        makeListDraggable(column.querySelector('.list-header'));
+        return column;
+    }
+
+    function updateList(column, { name, position, version }) {
+        column.querySelector('.list-header h3').textContent = name;
+        column.dataset.position = position;
+        column.dataset.version = version;
+    }
+
+    function setCardDescription(card, description) {
+        let paragraph = card.querySelector(':scope > p');
+        if (!description) {
+            if (paragraph) paragraph.remove();
+            return;
+        }
+        if (!paragraph) {
+            paragraph = document.createElement('p');
+            card.appendChild(paragraph);
+        }
+        paragraph.textContent = description;
+    }
 
+    function placeCard({ card_id, list_id, position, version }) {
         const card = document.getElementById(card_id);
-        const newList = document.getElementById(new_list_id);
+        const newList = document.getElementById(list_id);
 
         if (!card || !newList) {
             console.error('Error: Card or List not found on this page.');
             return;
         }
 
-        // Find the sibling to insert before
-        const nextSibling = next_sibling_id ? document.getElementById(next_sibling_id) : null;
+        card.dataset.position = position;
+        if (version !== undefined) {
+            card.dataset.version = version;
+        }
+
+        // Insert before the first card with a larger position
+        const nextSibling = [...newList.querySelectorAll('.card')].find(other =>
+            other !== card && parseFloat(other.dataset.position) > position
+        );
 
-        // Perform the same DOM manipulation as the drag-and-drop
         if (nextSibling) {
             newList.insertBefore(card, nextSibling);
         } else {
             // If no sibling, append to the end of the list
             newList.appendChild(card);
         }
+    }
+
+    function placeList({ id, position, version }) {
+        const column = boardCanvas.querySelector(`.list-column[data-list-id="${id}"]`);
+        if (!column) return;
+        column.dataset.position = position;
+        column.dataset.version = version;
+        const nextSibling = [...boardCanvas.querySelectorAll('.list-column')].find(other =>
+            other !== column && parseFloat(other.dataset.position) > position
+        );
+        boardCanvas.insertBefore(column, nextSibling || newListForm());
+    }
+
+    /**
+     * Debounced list of who else has this board open.
+     */
+    socket.on('presence_update', (data) => {
+        const names = data.users.map(user => user.username);
+        const more = data.count - names.length;
+        const presence = document.querySelector('.board-presence');
+        presence.textContent = data.count
+            ? `Viewing: ${names.join(', ')}${more > 0 ? ` and ${more} more` : ''}`
+            : '';
+    });
+
+    socket.on('move_error', (data) => {
+        console.error('Move rejected:', data.error);
+    });
+
+    /**
+     * Our drag lost to someone else's change: put the lists it touched
+     * back the way the server has them.
+     */
+    socket.on('move_conflict', (data) => {
+        console.warn('Move not applied:', data.error);
+        data.cards.forEach(([cardId, listId, position, version]) => {
+            placeCard({ card_id: `card-${cardId}`, list_id: `list-${listId}`, position, version });
+        });
     });
 
     // Optional: Add a listener for when the page is unloaded
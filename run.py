@@ -1,3 +1,14 @@
+import os
+
+# eventlet/gevent have to patch the standard library before anything else
+# is imported (see SOCKETIO_ASYNC_MODE in config.py)
+if os.environ.get('SOCKETIO_ASYNC_MODE') == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif os.environ.get('SOCKETIO_ASYNC_MODE') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
 from project import create_app, db, socketio # Import socketio
 
 app = create_app()
@@ -6,6 +17,10 @@ if __name__ == '__main__':
     with app.app_context():
         # This creates all database tables 
         db.create_all()
+    # debug=True serves from a reloader child process; archive from that one only
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from project import archive
+        archive.start_auto_archive(app)
     # app.run(debug=True) # <-- We can't use this anymore
     socketio.run(app, debug=True) # <-- Use this to run the app
     
@@ -0,0 +1,65 @@
+"""
+Micro-benchmark: logins per second per core at each bcrypt cost.
+
+Not collected by the normal test run (the file name does not start with
+test_). Run it with either of
+
+    python -m pytest tests/bench_passwords.py -s
+    python -m tests.bench_passwords
+
+BENCH_BCRYPT_COSTS (default "4,8,10,12") picks the costs to measure and
+BENCH_LOGINS (default 20) the verifications timed per cost. Inline numbers
+are one core; pool numbers use one worker per CPU and are divided by the
+CPU count.
+"""
+import json
+import os
+import time
+from flask_bcrypt import Bcrypt
+from project import create_app, passwords
+from config import TestConfig
+
+
+def _costs():
+    return [int(c) for c in os.environ.get('BENCH_BCRYPT_COSTS', '4,8,10,12').split(',')]
+
+
+def measure(app, cost, logins):
+    password_hash = Bcrypt().generate_password_hash('password123', cost).decode('utf-8')
+    cores = os.cpu_count() or 1
+    result = {'cost': cost}
+    with app.app_context():
+        for mode, workers in (('inline', 0), ('pool', cores)):
+            app.config['PASSWORD_HASH_WORKERS'] = workers
+            passwords.check_password(password_hash, 'password123')  # warm up / start the pool
+            pool = passwords._get_pool()
+            started = time.perf_counter()
+            if pool is None:
+                for _ in range(logins):
+                    passwords.check_password(password_hash, 'password123')
+            else:
+                futures = [pool.submit(passwords._check_in_worker, password_hash, 'password123')
+                           for _ in range(logins)]
+                assert all(f.result() for f in futures)
+            elapsed = time.perf_counter() - started
+            per_core = logins / elapsed / (1 if pool is None else cores)
+            result[f'{mode}_logins_per_sec_per_core'] = round(per_core, 1)
+            passwords.shutdown_pool()
+    return result
+
+
+def run():
+    app = create_app(TestConfig)
+    logins = int(os.environ.get('BENCH_LOGINS', 20))
+    report = {'cpus': os.cpu_count(), 'results': [measure(app, cost, logins) for cost in _costs()]}
+    print(json.dumps(report, indent=2))
+    return report
+
+
+def test_login_throughput():
+    report = run()
+    assert all(r['inline_logins_per_sec_per_core'] > 0 for r in report['results'])
+
+
+if __name__ == '__main__':
+    run()
@@ -1,8 +1,13 @@
 import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
 from project import create_app, db, socketio
 from project.models import User, Board
 from config import TestConfig
 from project import bcrypt
+from project.access import clear_cache
+from project.dashboard import clear_summaries
+from project import identity, fragments, presence
 
 @pytest.fixture(scope='session')
 def app():
@@ -21,6 +26,12 @@ def db_session(app):
         yield db
         db.session.remove()
         db.drop_all()
+        fragments.clear()
+        presence.clear()
+    # Row ids are reused by the next test, so cached permissions must go too
+    clear_cache()
+    clear_summaries()
+    identity.clear_cache()
 
 @pytest.fixture(scope='function')
 def client(app):
@@ -59,4 +70,25 @@ def logged_in_client(client, registered_user):
         'password': 'password123'
     }, follow_redirects=True)
     yield client
-    client.get('/auth/logout', follow_redirects=True)
\ No newline at end of file
+    client.get('/auth/logout', follow_redirects=True)
+
+@pytest.fixture(scope='function')
+def count_queries(db_session):
+    """
+    Context manager that records every SQL statement run inside it.
+    Usage: `with count_queries() as statements: ...; len(statements)`.
+    """
+    @contextmanager
+    def _count():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return _count
\ No newline at end of file
@@ -0,0 +1,41 @@
+import pytest
+from project.models import Board
+from project.access import can_access, MEMBER, OWNER
+
+
+@pytest.fixture
+def shared_board(db_session, registered_user, registered_user_2):
+    """A board owned by user 1 and shared with user 2."""
+    board = Board(name="Shared Board", owner=registered_user)
+    board.members.append(registered_user_2)
+    db_session.session.add(board)
+    db_session.session.commit()
+    return board
+
+
+def test_access_levels(shared_board, registered_user, registered_user_2):
+    """Owners have both levels, members only MEMBER, strangers nothing."""
+    assert can_access(registered_user.id, shared_board.id, OWNER)
+    assert can_access(registered_user.id, shared_board.id, MEMBER)
+    assert can_access(registered_user_2.id, shared_board.id, MEMBER)
+    assert not can_access(registered_user_2.id, shared_board.id, OWNER)
+    assert not can_access(registered_user_2.id, shared_board.id + 1, MEMBER)
+
+
+def test_access_is_cached(shared_board, registered_user_2, count_queries):
+    """The first check is one query, repeated checks hit the cache."""
+    user_id, board_id = registered_user_2.id, shared_board.id
+    with count_queries() as statements:
+        for _ in range(5):
+            assert can_access(user_id, board_id)
+    assert len(statements) == 1
+
+
+def test_remove_member_invalidates_cache(logged_in_client, shared_board, registered_user_2):
+    """A removed member loses access straight away."""
+    user_id, board_id = registered_user_2.id, shared_board.id
+    assert can_access(user_id, board_id)
+
+    logged_in_client.post(f'/board/{board_id}/remove_member/{user_id}', follow_redirects=True)
+
+    assert not can_access(user_id, board_id)
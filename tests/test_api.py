@@ -0,0 +1,82 @@
+import pytest
+from project.models import Board, List, Card
+
+
+@pytest.fixture
+def api_board(db_session, registered_user):
+    """A board with one list holding one card."""
+    board = Board(name="API Board", owner=registered_user)
+    list1 = List(name="To Do", position=0, board=board)
+    card1 = Card(title="Existing", position=0, list=list1)
+    db_session.session.add_all([board, list1, card1])
+    db_session.session.commit()
+    return {'board_id': board.id, 'list_id': list1.id, 'card_id': card1.id}
+
+
+def test_api_requires_login(client, api_board):
+    """Anonymous API calls get a JSON 401, not a login redirect."""
+    response = client.get(f'/api/v1/boards/{api_board["board_id"]}')
+    assert response.status_code == 401
+    assert 'error' in response.get_json()
+
+
+def test_api_create_card(logged_in_client, api_board):
+    """Creating a card returns just that card and bumps the board version."""
+    response = logged_in_client.post(f'/api/v1/lists/{api_board["list_id"]}/cards',
+                                     json={'title': 'From API', 'description': 'JSON'})
+    assert response.status_code == 201
+    data = response.get_json()
+    assert data['title'] == 'From API'
+    assert data['list_id'] == api_board['list_id']
+    assert Board.query.get(api_board['board_id']).version == 1
+
+
+def test_api_validation_error(logged_in_client, api_board):
+    """Bodies are validated with the same rules as the HTML forms."""
+    response = logged_in_client.post(f'/api/v1/lists/{api_board["list_id"]}/cards', json={'title': ''})
+    assert response.status_code == 400
+    assert 'title' in response.get_json()['fields']
+
+
+def test_api_patch_and_delete_card(logged_in_client, api_board):
+    """PATCH keeps omitted fields; DELETE answers 204."""
+    card_url = f'/api/v1/cards/{api_board["card_id"]}'
+    response = logged_in_client.patch(card_url, json={'description': 'Now described'})
+    assert response.get_json()['title'] == 'Existing'
+    assert response.get_json()['description'] == 'Now described'
+
+    assert logged_in_client.delete(card_url).status_code == 204
+    assert logged_in_client.get(card_url).status_code == 404
+
+
+def test_api_board_etag(logged_in_client, api_board):
+    """Unchanged boards answer If-None-Match with 304; changes invalidate the tag."""
+    board_url = f'/api/v1/boards/{api_board["board_id"]}'
+    first = logged_in_client.get(board_url)
+    assert first.status_code == 200
+    assert first.get_json()['lists'][0]['cards'][0]['title'] == 'Existing'
+
+    etag = first.headers['ETag']
+    assert logged_in_client.get(board_url, headers={'If-None-Match': etag}).status_code == 304
+
+    logged_in_client.post(f'/api/v1/boards/{api_board["board_id"]}/lists', json={'name': 'Done'})
+    again = logged_in_client.get(board_url, headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert [l['name'] for l in again.get_json()['lists']] == ['To Do', 'Done']
+
+
+def test_api_missing_board_is_not_found(db_session, logged_in_client, registered_user):
+    """A board id nobody has used yet is a 404, and does not stay denied once it exists."""
+    assert logged_in_client.get('/api/v1/boards/1').status_code == 404
+    board = Board(name="Later", owner=registered_user)
+    db_session.session.add(board)
+    db_session.session.commit()
+    assert board.id == 1
+    assert logged_in_client.get('/api/v1/boards/1').status_code == 200
+
+
+def test_api_forbidden_for_strangers(client, api_board, registered_user_2):
+    """Users without access get a JSON 403."""
+    client.post('/auth/login', data={'email': registered_user_2.email, 'password': 'password456'})
+    response = client.delete(f'/api/v1/cards/{api_board["card_id"]}')
+    assert response.status_code == 403
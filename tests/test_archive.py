@@ -0,0 +1,150 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from project import db, mutations, archive
+from project.bulk import move_cards
+from project.models import Board, List, Card, ArchivedList, ArchivedCard
+from project.changes import changes_since
+from project.search import search_cards
+
+
+@pytest.fixture
+def done_board(db_session, registered_user):
+    """'Doing' with three cards and 'Done' with four."""
+    board = Board(name="Release", owner=registered_user)
+    db_session.session.add(board)
+    db_session.session.commit()
+    doing = mutations.create_list(board.id, "Doing")
+    done = mutations.create_list(board.id, "Done")
+    doing_cards = [mutations.create_card(doing, f"Task {n}").id for n in range(3)]
+    done_cards = [mutations.create_card(done, f"Shipped {n}").id for n in range(4)]
+    return board.id, doing.id, done.id, doing_cards, done_cards
+
+
+def _order(list_id):
+    return [row.id for row in db.session.query(Card.id).filter(Card.list_id == list_id).order_by(Card.position)]
+
+
+def _hits(user, query):
+    return sorted(hit.card_id for hit in search_cards(user.id, query).hits)
+
+
+def test_archive_and_restore_cards(logged_in_client, done_board, registered_user):
+    board_id, doing, done, doing_cards, done_cards = done_board
+    version_before = changes_since(board_id, 0)[0]
+
+    response = logged_in_client.post(f'/api/v1/boards/{board_id}/cards/bulk-archive',
+                                     json={'card_ids': done_cards[:2]})
+    assert response.get_json() == {'version': version_before + 1, 'archived': done_cards[:2]}
+    # Moved out of the hot tables, not flagged
+    assert _order(done) == done_cards[2:]
+    assert sorted(db.session.scalars(select(ArchivedCard.id))) == done_cards[:2]
+    assert _hits(registered_user, "shipped") == done_cards[2:]
+    assert changes_since(board_id, version_before)[1][0]['kind'] == 'cards_archived'
+
+    listed = logged_in_client.get(f'/api/v1/boards/{board_id}/archive/cards').get_json()
+    assert [card['id'] for card in listed['cards']] == done_cards[1::-1]
+    assert listed['cards'][0]['list_name'] == 'Done'
+
+    # Back at the end of the list they came from, under the same ids
+    response = logged_in_client.post(f'/api/v1/boards/{board_id}/archive/cards/restore',
+                                     json={'card_ids': done_cards[:2]})
+    assert response.get_json()['restored'] == done_cards[:2]
+    assert _order(done) == done_cards[2:] + done_cards[:2]
+    assert _hits(registered_user, "shipped") == done_cards
+    assert db.session.scalar(select(func.count(ArchivedCard.id))) == 0
+
+    # Cards no longer in the archive are refused
+    url = f'/api/v1/boards/{board_id}/archive/cards/restore'
+    assert logged_in_client.post(url, json={'card_ids': done_cards[:1]}).status_code == 400
+
+
+def test_archive_and_restore_list(logged_in_client, done_board, registered_user):
+    board_id, doing, done, doing_cards, done_cards = done_board
+    logged_in_client.post(f'/card/archive/{doing_cards[0]}')
+    logged_in_client.post(f'/list/archive/{doing}')
+
+    assert db.session.get(List, doing) is None
+    assert db.session.get(ArchivedList, doing) is not None
+    page = logged_in_client.get(f'/board/{board_id}')
+    assert b'Task 1' not in page.data and b'Shipped 0' in page.data
+    archive_page = logged_in_client.get(f'/board/{board_id}/archive')
+    assert b'Doing' in archive_page.data and b'2 cards' in archive_page.data and b'Task 0' in archive_page.data
+
+    logged_in_client.post(f'/board/{board_id}/archive/list/{doing}/restore')
+    # At the end of the board, with the cards archived along with it
+    assert [row.id for row in db.session.query(List.id).filter(List.board_id == board_id).order_by(
+        List.position)] == [done, doing]
+    assert _order(doing) == doing_cards[1:]
+    assert _hits(registered_user, "task") == doing_cards[1:]
+
+    # The card archived on its own stays archived until restored itself
+    logged_in_client.post(f'/board/{board_id}/archive/card/{doing_cards[0]}/restore')
+    assert _order(doing) == doing_cards[1:] + doing_cards[:1]
+    assert logged_in_client.post(f'/board/{board_id}/archive/list/{doing}/restore').status_code == 404
+
+
+def test_archive_pages_and_ids(logged_in_client, done_board):
+    board_id, doing, done, doing_cards, done_cards = done_board
+    for card_id in done_cards:
+        archive.archive_cards(board_id, [card_id])
+    # A new card never takes the id of an archived one
+    assert mutations.create_card(db.session.get(List, done), "New").id > max(done_cards)
+
+    url = f'/api/v1/boards/{board_id}/archive/cards?limit=3'
+    first = logged_in_client.get(url).get_json()
+    second = logged_in_client.get(f"{url}&after={first['next']}").get_json()
+    assert [card['id'] for card in first['cards'] + second['cards']] == done_cards[::-1]
+    assert second['next'] is None
+    assert logged_in_client.get(f'{url}&after=nonsense').status_code == 400
+
+
+def test_auto_archive_in_batches(app, done_board, registered_user):
+    board_id, doing, done, doing_cards, done_cards = done_board
+    old = datetime.utcnow() - timedelta(days=40)
+    db.session.execute(update(Card).values(entered_list_at=old))
+    db.session.commit()
+    # Moving a card into Done starts its clock again
+    move_cards(board_id, [doing_cards[0]], done)
+
+    app.config['AUTO_ARCHIVE_BATCH_SIZE'] = 3
+    try:
+        assert archive.auto_archive() == 4
+    finally:
+        app.config['AUTO_ARCHIVE_BATCH_SIZE'] = 500
+    assert _order(done) == [doing_cards[0]]
+    assert _order(doing) == doing_cards[1:]
+    kinds = [change['kind'] for change in changes_since(board_id, 0)[1]]
+    assert kinds.count('cards_archived') == 2
+    assert archive.auto_archive() == 0
+
+
+def test_restores_log_full_rows(done_board):
+    """Restores log card_created / list_created-style rows, so open boards apply them in place."""
+    board_id, doing, done, doing_cards, done_cards = done_board
+    archive.archive_cards(board_id, done_cards[:2])
+    archive.archive_list(db.session.get(List, doing))
+    version_before = changes_since(board_id, 0)[0]
+
+    archive.restore_cards(board_id, done_cards[:2])
+    archive.restore_list(board_id, doing)
+    cards_restored, list_restored = changes_since(board_id, version_before)[1]
+    assert cards_restored['kind'] == 'cards_restored'
+    card = cards_restored['payload']['cards'][0]
+    assert set(card) == {'id', 'list_id', 'title', 'description', 'position', 'version'}
+    assert [(c['id'], c['list_id']) for c in cards_restored['payload']['cards']] == [
+        (card_id, done) for card_id in done_cards[:2]]
+
+    assert list_restored['kind'] == 'list_restored'
+    payload = list_restored['payload']
+    assert (payload['id'], payload['name']) == (doing, 'Doing')
+    assert {'position', 'version'} <= set(payload)
+    assert [c['id'] for c in payload['cards']] == doing_cards
+    assert payload['cards'][0]['version'] == db.session.get(Card, doing_cards[0]).version
+
+
+def test_restore_on_a_missing_board_is_not_found(logged_in_client, done_board):
+    board_id, doing, done, doing_cards, done_cards = done_board
+    missing = board_id + 1
+    assert logged_in_client.post(f'/board/{missing}/archive/list/{doing}/restore').status_code == 404
+    assert logged_in_client.post(f'/board/{missing}/archive/card/{done_cards[0]}/restore').status_code == 404
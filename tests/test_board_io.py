@@ -0,0 +1,83 @@
+import json
+import pytest
+from project import db
+from project.models import Board, List, Card
+from project.board_io import export_board, import_board, BoardImportError
+
+
+@pytest.fixture
+def export_source(db_session, registered_user):
+    """A board with two lists and a handful of cards."""
+    board = Board(name="Source Board", owner=registered_user)
+    todo = List(name="To Do", position=0, board=board)
+    done = List(name="Done", position=1024, board=board)
+    cards = [Card(title=f"Card {i}", position=i, list=todo if i % 2 else done) for i in range(6)]
+    db_session.session.add_all([board, todo, done] + cards)
+    db_session.session.commit()
+    return board
+
+
+def test_export_import_round_trip(export_source, registered_user_2, count_queries):
+    """An exported board imports as an identical copy, with chunked card INSERTs."""
+    lines = list(export_board(export_source.id))
+    assert json.loads(lines[0]) == {'type': 'board', 'id': export_source.id, 'name': 'Source Board'}
+
+    with count_queries() as statements:
+        board_id, lists, cards = import_board(lines, registered_user_2.id, chunk_size=2)
+    assert (lists, cards) == (2, 6)
+    card_inserts = [s for s in statements if s.startswith('INSERT INTO cards')]
+    assert len(card_inserts) == 3
+
+    copy = db.session.get(Board, board_id)
+    assert copy.name == 'Source Board'
+    assert copy.user_id == registered_user_2.id
+    assert [l.name for l in copy.lists] == ['To Do', 'Done']
+    assert [c.title for c in copy.lists[0].cards] == ['Card 1', 'Card 3', 'Card 5']
+
+
+def test_import_rejects_bad_lines(db_session, registered_user):
+    """Errors name the offending line and roll the whole import back."""
+    lines = [
+        '{"type": "board", "name": "Broken"}',
+        '{"type": "list", "id": 1, "name": "To Do"}',
+        '{"type": "card", "list_id": 99, "title": "Orphan"}',
+    ]
+    with pytest.raises(BoardImportError, match='Line 3'):
+        import_board(lines, registered_user.id)
+    assert Board.query.count() == 0
+
+
+@pytest.mark.parametrize('record', [
+    '{"type": "list", "id": 2, "name": "Later", "position": "abc"}',
+    '{"type": "card", "list_id": 1, "title": "Typed", "position": "abc"}',
+    '{"type": "card", "list_id": 1, "title": "Typed", "position": true}',
+    '{"type": "card", "list_id": 1, "title": "Typed", "description": 7}',
+    '{"type": "card", "list_id": [1], "title": "Typed"}',
+])
+def test_import_rejects_wrong_types(logged_in_client, record):
+    """Fields of the wrong JSON type are a 400 naming the line, not a 500."""
+    lines = ['{"type": "board", "name": "Typed"}', '{"type": "list", "id": 1, "name": "To Do"}', record]
+    response = logged_in_client.post('/api/v1/boards/import', data='\n'.join(lines),
+                                     content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert 'Line 3' in response.get_data(as_text=True)
+    assert Board.query.count() == 0
+
+
+def test_cli_export_and_api_import(app, logged_in_client, export_source, tmp_path):
+    """`flask nexus export` output can be posted to the import endpoint."""
+    target = tmp_path / 'board.jsonl'
+    result = app.test_cli_runner().invoke(args=['nexus', 'export', str(export_source.id),
+                                                '-o', str(target)])
+    assert result.exit_code == 0
+
+    response = logged_in_client.post('/api/v1/boards/import?name=Imported',
+                                     data=target.read_bytes(),
+                                     content_type='application/x-ndjson')
+    assert response.status_code == 201
+    assert response.get_json()['name'] == 'Imported'
+    assert response.get_json()['cards'] == 6
+
+    exported = logged_in_client.get(f'/api/v1/boards/{response.get_json()["id"]}/export')
+    assert exported.mimetype == 'application/x-ndjson'
+    assert len(exported.data.splitlines()) == 1 + 2 + 6
@@ -0,0 +1,127 @@
+import pytest
+from project import db, socketio
+from project.models import Board, Card
+from project.changes import changes_since
+from project.search import search_cards
+from project import mutations
+
+
+@pytest.fixture
+def sprint_board(db_session, registered_user):
+    """'Sprint' with ten cards and 'Done' with two."""
+    board = Board(name="Team", owner=registered_user)
+    db_session.session.add(board)
+    db_session.session.commit()
+    sprint = mutations.create_list(board.id, "Sprint")
+    done = mutations.create_list(board.id, "Done")
+    sprint_cards = [mutations.create_card(sprint, f"Task {n}").id for n in range(10)]
+    done_cards = [mutations.create_card(done, f"Shipped {n}").id for n in range(2)]
+    return board.id, sprint.id, done.id, sprint_cards, done_cards
+
+
+def _joined_client(app, logged_in_client, board_id):
+    client = socketio.test_client(app, flask_test_client=logged_in_client)
+    client.emit('join_board', {'board_id': str(board_id)})
+    client.get_received()
+    return client
+
+
+def _order(list_id):
+    return [row.id for row in db.session.query(Card.id).filter(Card.list_id == list_id).order_by(Card.position)]
+
+
+def test_bulk_move_is_one_transaction_and_one_broadcast(app, logged_in_client, sprint_board, count_queries):
+    board_id, sprint, done, sprint_cards, done_cards = sprint_board
+    client = _joined_client(app, logged_in_client, board_id)
+    version_before = changes_since(board_id, 0)[0]
+    selection = [sprint_cards[7], sprint_cards[2], sprint_cards[5]]
+
+    with count_queries() as statements:
+        client.emit('cards_bulk_moved', {'board_id': str(board_id), 'card_ids': selection,
+                                         'new_list_id': f'list-{done}', 'next_sibling_id': done_cards[1]})
+    received = client.get_received()
+    assert [m['name'] for m in received] == ['cards_moved_batch']
+    batch = received[0]['args'][0]
+    assert batch['version'] == version_before + 1
+    assert [row[0] for row in batch['moves']] == selection
+    assert all(row[1] == done and row[3] == 2 for row in batch['moves'])
+
+    # In the order given, between the two cards already there
+    assert _order(done) == [done_cards[0]] + selection + [done_cards[1]]
+    assert _order(sprint) == [card for card in sprint_cards if card not in selection]
+    version, changes = changes_since(board_id, version_before)
+    assert [change['kind'] for change in changes] == ['cards_moved']
+    # One UPDATE for the whole selection
+    assert sum(s.lstrip().upper().startswith('UPDATE CARDS') for s in statements) == 1
+
+    # The statement count does not grow with the selection
+    with count_queries() as more_statements:
+        client.emit('cards_bulk_moved', {'board_id': str(board_id), 'card_ids': sprint_cards[:6],
+                                         'new_list_id': done, 'next_sibling_id': done_cards[1]})
+    assert len(more_statements) == len(statements)
+    assert _order(done) == [done_cards[0], sprint_cards[7]] + sprint_cards[:6] + [done_cards[1]]
+
+
+def test_bulk_delete(app, logged_in_client, sprint_board, registered_user):
+    board_id, sprint, done, sprint_cards, done_cards = sprint_board
+    client = _joined_client(app, logged_in_client, board_id)
+    version_before = changes_since(board_id, 0)[0]
+
+    client.emit('cards_bulk_deleted', {'board_id': board_id, 'card_ids': [f'card-{c}' for c in sprint_cards[:4]]})
+    assert [m['name'] for m in client.get_received()] == ['board_changed']
+    assert _order(sprint) == sprint_cards[4:]
+    assert changes_since(board_id, version_before)[1] == [
+        {'version': version_before + 1, 'kind': 'cards_deleted', 'payload': {'ids': sprint_cards[:4]}}]
+    assert sorted(hit.card_id for hit in search_cards(registered_user.id, "task").hits) == sprint_cards[4:]
+
+
+def test_bulk_requests_are_all_or_nothing(app, logged_in_client, sprint_board, registered_user_2):
+    board_id, sprint, done, sprint_cards, done_cards = sprint_board
+    other = Board(name="Other", owner=registered_user_2)
+    db.session.add(other)
+    db.session.commit()
+    foreign = mutations.create_card(mutations.create_list(other.id, "Theirs"), "Not yours").id
+
+    client = _joined_client(app, logged_in_client, board_id)
+    client.emit('cards_bulk_moved', {'board_id': board_id, 'card_ids': [sprint_cards[0], foreign],
+                                     'new_list_id': done})
+    received = client.get_received()
+    assert [m['name'] for m in received] == ['move_error']
+    client.emit('cards_bulk_deleted', {'board_id': other.id, 'card_ids': [foreign]})
+    assert client.get_received()[0]['args'][0]['error'].startswith('You do not have permission')
+    assert _order(sprint) == sprint_cards and db.session.get(Card, foreign) is not None
+
+    url = f'/api/v1/boards/{board_id}/cards'
+    response = logged_in_client.post(f'{url}/bulk-delete', json={'card_ids': [sprint_cards[0], foreign]})
+    assert response.status_code == 400
+    assert logged_in_client.post(f'{url}/bulk-move', json={'card_ids': sprint_cards[:2]}).status_code == 400
+    assert logged_in_client.post(f'/api/v1/boards/{other.id}/cards/bulk-delete',
+                                 json={'card_ids': [foreign]}).status_code == 403
+    # A string is not split into ids, and true is not list 1
+    digits = ''.join(str(card) for card in sprint_cards[:2])
+    assert logged_in_client.post(f'{url}/bulk-delete', json={'card_ids': digits}).status_code == 400
+    assert logged_in_client.post(f'{url}/bulk-delete', json={'card_ids': [True]}).status_code == 400
+    assert logged_in_client.post(f'{url}/bulk-move', json={'card_ids': sprint_cards[:1],
+                                                           'list_id': True}).status_code == 400
+    assert logged_in_client.post(f'{url}/bulk-move', json={'card_ids': sprint_cards[:1], 'list_id': done,
+                                                           'next_sibling_id': True}).status_code == 400
+    client.emit('cards_bulk_deleted', {'board_id': board_id, 'card_ids': digits})
+    client.emit('cards_bulk_moved', {'board_id': board_id, 'card_ids': sprint_cards[:1], 'new_list_id': True})
+    assert [m['name'] for m in client.get_received()] == ['move_error', 'move_error']
+    assert _order(sprint) == sprint_cards
+
+
+def test_bulk_api(logged_in_client, sprint_board):
+    board_id, sprint, done, sprint_cards, done_cards = sprint_board
+    url = f'/api/v1/boards/{board_id}/cards'
+
+    response = logged_in_client.post(f'{url}/bulk-move', json={
+        'card_ids': sprint_cards[:3], 'list_id': done, 'next_sibling_id': done_cards[0]})
+    assert response.status_code == 200
+    moves = response.get_json()['moves']
+    assert [move['card_id'] for move in moves] == [f'card-{card}' for card in sprint_cards[:3]]
+    assert _order(done) == sprint_cards[:3] + done_cards
+
+    response = logged_in_client.post(f'{url}/bulk-delete', json={'card_ids': done_cards})
+    assert response.get_json()['deleted'] == done_cards
+    assert _order(done) == sprint_cards[:3]
@@ -0,0 +1,63 @@
+import pytest
+from project.models import Board, List, BoardChange
+
+
+@pytest.fixture
+def versioned_board(db_session, registered_user):
+    """A board with one empty list."""
+    board = Board(name="Versioned Board", owner=registered_user)
+    list1 = List(name="List 1", position=0, board=board)
+    db_session.session.add_all([board, list1])
+    db_session.session.commit()
+    return {'board_id': board.id, 'list_id': list1.id}
+
+
+def _sync(socket_client, board_id, since):
+    return socket_client.emit('sync_board', {'board_id': board_id, 'since_version': since},
+                              callback=True)
+
+
+def test_mutations_bump_version(logged_in_client, versioned_board):
+    """Each route mutation bumps the version and logs one change."""
+    list_id = versioned_board['list_id']
+    logged_in_client.post(f'/card/create/{list_id}', data={'title': 'First'})
+    logged_in_client.post(f'/list/edit/{list_id}', data={'name': 'Renamed'})
+
+    board = Board.query.get(versioned_board['board_id'])
+    kinds = [c.kind for c in BoardChange.query.order_by(BoardChange.version)]
+    assert board.version == 2
+    assert kinds == ['card_created', 'list_updated']
+
+
+def test_sync_board_returns_deltas(app, socket_client, logged_in_client, versioned_board):
+    """A client behind by a few versions receives only what it missed."""
+    socket_client.flask_test_client = logged_in_client
+    list_id = versioned_board['list_id']
+    for title in ('One', 'Two', 'Three'):
+        logged_in_client.post(f'/card/create/{list_id}', data={'title': title})
+
+    result = _sync(socket_client, versioned_board['board_id'], 1)
+    assert result['version'] == 3
+    assert [c['version'] for c in result['changes']] == [2, 3]
+    assert [c['payload']['title'] for c in result['changes']] == ['Two', 'Three']
+
+    assert _sync(socket_client, versioned_board['board_id'], 3)['changes'] == []
+
+
+def test_sync_board_falls_back_to_snapshot(app, socket_client, logged_in_client, versioned_board):
+    """Once the log is truncated past the client's version, it gets a snapshot."""
+    socket_client.flask_test_client = logged_in_client
+    list_id = versioned_board['list_id']
+    app.config['CHANGE_LOG_SIZE'] = 2
+    try:
+        for title in ('One', 'Two', 'Three', 'Four'):
+            logged_in_client.post(f'/card/create/{list_id}', data={'title': title})
+    finally:
+        app.config['CHANGE_LOG_SIZE'] = 500
+
+    assert BoardChange.query.count() == 2
+    result = _sync(socket_client, versioned_board['board_id'], 0)
+    assert 'changes' not in result
+    assert result['snapshot']['version'] == 4
+    titles = [c['title'] for c in result['snapshot']['lists'][0]['cards']]
+    assert titles == ['One', 'Two', 'Three', 'Four']
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import event, select
+from project import db, mutations
+from project.models import Board, List, Card, board_members
+from project.cloning import clone_board
+from project.search import search_cards
+
+
+@pytest.fixture
+def template(db_session, registered_user, registered_user_2):
+    """A template shared with user 2: three lists, the middle one added last."""
+    board = Board(name="Sprint template", owner=registered_user, is_template=True)
+    board.members.append(registered_user_2)
+    db_session.session.add(board)
+    db_session.session.commit()
+    todo = mutations.create_list(board.id, "To Do")
+    done = mutations.create_list(board.id, "Done")
+    doing = mutations.create_list(board.id, "Doing")
+    doing.position = (todo.position + done.position) / 2
+    db_session.session.commit()
+    for n in range(4):
+        mutations.create_card(todo, f"Standup {n}", "Daily")
+    mutations.create_card(doing, "Retro")
+    return board.id
+
+
+def _layout(board_id):
+    """[(list name, [card titles])] in board order."""
+    lists = db.session.execute(select(List.id, List.name).where(List.board_id == board_id).order_by(
+        List.position)).all()
+    return [(name, db.session.scalars(select(Card.title).where(Card.list_id == list_id).order_by(
+        Card.position)).all()) for list_id, name in lists]
+
+
+def test_clone_copies_lists_and_cards_in_fixed_statements(template, registered_user, count_queries):
+    with count_queries() as statements:
+        board_id, lists, cards = clone_board(template, registered_user.id, "Sprint 1")
+    assert (lists, cards) == (3, 5)
+    assert _layout(board_id) == _layout(template) == [
+        ('To Do', [f"Standup {n}" for n in range(4)]), ('Doing', ['Retro']), ('Done', [])]
+    # New rows, not the template's
+    copied = db.session.scalars(select(Card.id).join(List).where(List.board_id == board_id)).all()
+    original = db.session.scalars(select(Card.id).join(List).where(List.board_id == template)).all()
+    assert not set(copied) & set(original)
+    assert len(search_cards(registered_user.id, "standup").hits) == 8
+    assert db.session.get(Board, board_id).is_template is False
+
+    # The statement count does not grow with the board
+    for n in range(20):
+        mutations.create_card(db.session.get(List, db.session.scalar(
+            select(List.id).where(List.board_id == template, List.name == 'Done'))), f"Shipped {n}")
+    with count_queries() as more_statements:
+        clone_board(template, registered_user.id, "Sprint 2")
+    assert len(more_statements) == len(statements)
+
+
+def test_clone_keeps_cards_with_their_lists_when_the_board_changes(template, registered_user):
+    expected = _layout(template)
+    todo, doing = (db.session.scalar(select(List.id).where(List.board_id == template, List.name == name))
+                   for name in ("To Do", "Doing"))
+
+    def reorder_source(conn, cursor, statement, parameters, context, executemany):
+        # Another request commits between reading the lists and copying the cards
+        if statement.lstrip().upper().startswith('INSERT INTO CARDS'):
+            raw = cursor.connection
+            raw.execute("UPDATE lists SET position = position + 1000000 WHERE id = ?", (todo,))
+            raw.execute("INSERT INTO lists (name, position, board_id, version) VALUES ('Backlog', -1, ?, 0)",
+                        (template,))
+            raw.execute("UPDATE lists SET position = -2 WHERE id = ?", (doing,))
+
+    event.listen(db.engine, 'before_cursor_execute', reorder_source)
+    try:
+        board_id, lists, cards = clone_board(template, registered_user.id, "Sprint 1")
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', reorder_source)
+    # The copy is the board as it was read, every card under its own list
+    assert (lists, cards) == (3, 5)
+    assert _layout(board_id) == expected
+
+
+def test_clone_members_and_access(template, client, registered_user, registered_user_2):
+    # User 2 is a member of the template and copies it with its members
+    client.post('/auth/login', data={'email': registered_user_2.email, 'password': 'password456'})
+    response = client.post(f'/api/v1/boards/{template}/clone', json={'name': 'Mine', 'include_members': True})
+    assert response.status_code == 201
+    copy = response.get_json()
+    assert (copy['name'], copy['owner_id'], copy['cards']) == ('Mine', registered_user_2.id, 5)
+    # The new owner is not also a member of their own board
+    members = db.session.scalars(select(board_members.c.user_id).where(board_members.c.board_id == copy['id'])).all()
+    assert members == []
+
+    other = Board(name="Private", owner=registered_user)
+    db.session.add(other)
+    db.session.commit()
+    assert client.post(f'/api/v1/boards/{other.id}/clone', json={}).status_code == 403
+
+
+def test_dashboard_creates_from_template(logged_in_client, template, registered_user_2):
+    page = logged_in_client.get('/dashboard')
+    assert b'Sprint template' in page.data and b'Start from' in page.data
+
+    logged_in_client.post('/dashboard', data={'name': 'Sprint 7', 'template': template,
+                                              'include_members': 'y'})
+    board = db.session.execute(select(Board).where(Board.name == 'Sprint 7')).scalar_one()
+    assert _layout(board.id) == _layout(template)
+    assert [member.id for member in board.members] == [registered_user_2.id]
+
+    # Templates are switched on and off from the board's edit page and the API
+    logged_in_client.post(f'/board/edit/{template}', data={'name': 'Sprint template'})
+    assert db.session.get(Board, template).is_template is False
+    response = logged_in_client.patch(f'/api/v1/boards/{template}', json={'is_template': True})
+    assert response.get_json()['is_template'] is True
@@ -0,0 +1,193 @@
+import random
+import threading
+import pytest
+from sqlalchemy import update
+from project import db, socketio, mutations
+from project.models import Board, List, Card
+from project.changes import changes_since
+from project import moves
+from project.moves import enqueue_move, PendingMove
+
+
+@pytest.fixture
+def crowded_board(db_session, registered_user):
+    """Three lists of ten cards each."""
+    board = Board(name="Busy Board", owner=registered_user)
+    lists = [List(name=f"List {n}", position=n * 1024.0, board=board) for n in range(3)]
+    cards = [Card(title=f"Card {n}", position=(n % 10) * 1024.0, list=lists[n // 10]) for n in range(30)]
+    db_session.session.add_all([board] + lists + cards)
+    db_session.session.commit()
+    return board.id, [item.id for item in lists], [card.id for card in cards]
+
+
+def _positions():
+    return {row.id: (row.list_id, row.position)
+            for row in db.session.query(Card.id, Card.list_id, Card.position)}
+
+
+def test_parallel_movers_keep_a_permutation(app, crowded_board, monkeypatch):
+    """
+    Workers racing to drop cards into the same lists never lose a card or
+    give two cards of a list the same position, and the change log replays
+    to exactly what is in the database.
+    """
+    board_id, list_ids, card_ids = crowded_board
+    before = _positions()
+    monkeypatch.setitem(app.config, 'MOVE_RETRY_ATTEMPTS', 50)
+    monkeypatch.setitem(app.config, 'MOVE_RETRY_BACKOFF_MS', 1)
+    refused, errors = [], []
+    real_emit = socketio.emit
+
+    def emit(event, *args, **kwargs):
+        if event in ('move_error', 'move_conflict'):
+            refused.append(event)
+        return real_emit(event, *args, **kwargs)
+    monkeypatch.setattr(socketio, 'emit', emit)
+
+    def mover(seed):
+        rng = random.Random(seed)
+        # Each worker thread gets its own app context, so its own session
+        with app.app_context():
+            try:
+                for _ in range(25):
+                    # Aim for the top of a list, so drops keep landing in the same gaps
+                    target = rng.choice(list_ids)
+                    siblings = db.session.query(Card.id).filter(Card.list_id == target).order_by(
+                        Card.position).limit(2).all()
+                    sibling = rng.choice([row.id for row in siblings] + [None])
+                    enqueue_move(board_id, PendingMove(rng.choice(card_ids), target, sibling, f'mover-{seed}'))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=mover, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and refused == []
+
+    after = _positions()
+    assert sorted(after) == sorted(card_ids)
+    for list_id in list_ids:
+        keys = [position for owner, position in after.values() if owner == list_id]
+        assert len(set(keys)) == len(keys)
+
+    # What clients were told adds up to the same board
+    version, changes = changes_since(board_id, 0)
+    replayed = dict(before)
+    for change in changes:
+        for move in change['payload']['moves']:
+            card_id = int(move['card_id'].split('-')[1])
+            replayed[card_id] = (int(move['list_id'].split('-')[1]), move['position'])
+    assert replayed == after
+
+
+def test_lost_race_is_retried(app, crowded_board, monkeypatch):
+    """A batch whose neighbour reads went stale is re-applied, not committed."""
+    board_id, list_ids, card_ids = crowded_board
+    real_position_before = moves.card_position_before
+    calls = []
+
+    def competing_move():
+        with app.app_context():
+            enqueue_move(board_id, PendingMove(card_ids[20], list_ids[0], card_ids[5], 'other'))
+            db.session.remove()
+
+    def racing_position_before(list_id, sibling, exclude_id=None):
+        position = real_position_before(list_id, sibling, exclude_id=exclude_id)
+        calls.append(exclude_id)
+        if len(calls) == 1:
+            # Another worker drops a card into the same gap in the meantime
+            thread = threading.Thread(target=competing_move)
+            thread.start()
+            thread.join()
+        return position
+
+    monkeypatch.setattr(moves, 'card_position_before', racing_position_before)
+    enqueue_move(board_id, PendingMove(card_ids[25], list_ids[0], card_ids[5], 'me'))
+
+    # Ours, theirs, then ours again from fresh reads
+    assert calls == [card_ids[25], card_ids[20], card_ids[25]]
+    after = _positions()
+    gap = (after[card_ids[4]][1], after[card_ids[5]][1])
+    ours, theirs = after[card_ids[25]], after[card_ids[20]]
+    assert ours[0] == theirs[0] == list_ids[0]
+    assert gap[0] < theirs[1] < ours[1] < gap[1]
+
+
+def test_stale_drag_gets_move_conflict(app, crowded_board, logged_in_client):
+    """A drag based on an old card version is answered with the real state."""
+    board_id, list_ids, card_ids = crowded_board
+    client = socketio.test_client(app, flask_test_client=logged_in_client)
+    client.emit('join_board', {'board_id': str(board_id)})
+    card = db.session.get(Card, card_ids[0])
+    mutations.update_card(card, "Renamed elsewhere", None)
+    assert card.version == 2
+    client.get_received()
+
+    client.emit('card_moved', {'card_id': card_ids[0], 'new_list_id': list_ids[1],
+                               'next_sibling_id': None, 'version': 1})
+    received = client.get_received()
+    assert [m['name'] for m in received] == ['move_conflict']
+    conflict = received[0]['args'][0]
+    assert conflict['card_id'] == card_ids[0]
+    # Every card of the card's list and of the list it was dropped on
+    assert sorted(row[0] for row in conflict['cards']) == card_ids[:20]
+    assert conflict['cards'][0] == [card_ids[0], list_ids[0], 0.0, 2]
+    assert db.session.get(Card, card_ids[0]).list_id == list_ids[0]
+
+    client.emit('card_moved', {'card_id': card_ids[0], 'new_list_id': list_ids[1],
+                               'next_sibling_id': None, 'version': 2})
+    received = client.get_received()
+    assert received[-1]['name'] == 'cards_moved_batch'
+    assert received[-1]['args'][0]['moves'] == [[card_ids[0], list_ids[1], 10 * 1024.0, 3]]
+
+
+def test_stale_edits_are_refused(logged_in_client, crowded_board):
+    """Edit forms and PATCH with an old version do not overwrite newer changes."""
+    board_id, list_ids, card_ids = crowded_board
+    card_id = card_ids[0]
+    page = logged_in_client.get(f'/card/edit/{card_id}')
+    assert b'name="version" type="hidden" value="1"' in page.data
+
+    mutations.update_card(db.session.get(Card, card_id), "Changed elsewhere", None)
+    response = logged_in_client.post(f'/card/edit/{card_id}',
+                                     data={'title': 'Mine', 'description': '', 'version': '1'})
+    assert b'Someone else changed this card' in response.data
+    assert b'value="2"' in response.data
+    assert db.session.get(Card, card_id).title == "Changed elsewhere"
+
+    # Saving again, now against the version shown, goes through
+    response = logged_in_client.post(f'/card/edit/{card_id}',
+                                     data={'title': 'Mine', 'description': '', 'version': '2'})
+    assert response.status_code == 302
+
+    assert logged_in_client.patch(f'/api/v1/cards/{card_id}',
+                                  json={'title': 'Late', 'version': 2}).status_code == 409
+    response = logged_in_client.patch(f'/api/v1/cards/{card_id}', json={'title': 'On time', 'version': 3})
+    assert response.get_json()['version'] == 4
+
+    list_url = f'/api/v1/lists/{list_ids[0]}'
+    assert logged_in_client.patch(list_url, json={'name': 'Renamed', 'version': 0}).status_code == 409
+    assert logged_in_client.patch(list_url, json={'name': 'Renamed'}).get_json()['version'] == 2
+
+
+def test_delete_after_a_concurrent_change(logged_in_client, crowded_board):
+    """Deleting a list or card that moved since it was loaded still deletes it."""
+    board_id, list_ids, card_ids = crowded_board
+    card = db.session.get(Card, card_ids[0])
+    list_item = db.session.get(List, list_ids[1])
+    # Another worker bumps both rows behind this session's back
+    with db.engine.begin() as conn:
+        conn.execute(update(Card.__table__).where(Card.id == card.id).values(version=Card.version + 1))
+        conn.execute(update(List.__table__).where(List.id == list_item.id).values(version=List.version + 1))
+
+    mutations.delete_card(card)
+    mutations.delete_list(list_item)
+    assert db.session.get(Card, card_ids[0]) is None
+    assert db.session.get(List, list_ids[1]) is None
+    assert db.session.query(Card).filter(Card.list_id == list_ids[1]).count() == 0
+    kinds = [change['kind'] for change in changes_since(board_id, 0)[1][-2:]]
+    assert kinds == ['card_deleted', 'list_deleted']
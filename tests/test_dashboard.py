@@ -0,0 +1,122 @@
+import pytest
+from datetime import datetime, timedelta
+from project.models import Board, List, Card
+from project.dashboard import (boards_page, board_summaries, decode_cursor,
+                               InvalidCursor, OWNED, SHARED, ALL)
+from project import mutations
+
+
+@pytest.fixture
+def many_boards(db_session, registered_user, registered_user_2):
+    """45 boards owned by user 1 and 5 owned by user 2 shared with user 1, all distinct ages."""
+    start = datetime(2024, 1, 1)
+    for i in range(50):
+        owner = registered_user if i < 45 else registered_user_2
+        board = Board(name=f"Board {i}", owner=owner, date_created=start + timedelta(minutes=i))
+        if i >= 45:
+            board.members.append(registered_user)
+        db_session.session.add(board)
+    db_session.session.commit()
+    return registered_user.id
+
+
+def _walk(user_id, feed, limit):
+    names, cursor = [], None
+    while True:
+        page = boards_page(user_id, feed, cursor, limit)
+        names += [b.name for b in page.boards]
+        cursor = page.next_cursor
+        if cursor is None:
+            return names
+
+
+def test_pages_cover_every_board_once(app, many_boards):
+    with app.test_request_context():
+        owned = _walk(many_boards, OWNED, 20)
+        shared = _walk(many_boards, SHARED, 20)
+        merged = _walk(many_boards, ALL, 7)
+
+    assert owned == [f"Board {i}" for i in range(44, -1, -1)]
+    assert shared == [f"Board {i}" for i in range(49, 44, -1)]
+    assert merged == [f"Board {i}" for i in range(49, -1, -1)]
+
+
+def test_cursor_breaks_ties_on_id(app, db_session, registered_user):
+    """Boards created in the same instant are neither skipped nor repeated."""
+    same = datetime(2024, 1, 1)
+    for i in range(5):
+        db_session.session.add(Board(name=f"Tie {i}", owner=registered_user, date_created=same))
+    db_session.session.commit()
+
+    with app.test_request_context():
+        assert sorted(_walk(registered_user.id, OWNED, 2)) == [f"Tie {i}" for i in range(5)]
+
+
+def test_invalid_cursor(app, db_session):
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor")
+
+
+def test_summaries_one_query_and_cached(app, db_session, registered_user, registered_user_2, count_queries):
+    board = Board(name="Counted", owner=registered_user)
+    board.members.append(registered_user_2)
+    for i in range(3):
+        list_item = List(name=f"L{i}", position=i, board=board)
+        db_session.session.add(list_item)
+        for j in range(4):
+            db_session.session.add(Card(title=f"C{i}{j}", position=j, list=list_item))
+    db_session.session.add(Board(name="Empty", owner=registered_user))
+    db_session.session.commit()
+
+    with app.test_request_context():
+        page = boards_page(registered_user.id, OWNED)
+        with count_queries() as statements:
+            summaries = board_summaries(page.boards)
+        assert len(statements) == 1
+        counted = next(b for b in page.boards if b.name == "Counted")
+        assert tuple(summaries[counted.id]) == (3, 12, 1)
+
+        # Unchanged versions are served from the cache
+        with count_queries() as statements:
+            board_summaries(page.boards)
+        assert statements == []
+
+        # A new card bumps the version, so the next page recounts
+        mutations.create_card(board.lists[0], "New")
+        page = boards_page(registered_user.id, OWNED)
+        assert board_summaries(page.boards)[counted.id].cards == 13
+
+
+def test_dashboard_paginates(logged_in_client, many_boards):
+    response = logged_in_client.get('/dashboard')
+    assert b"Board 44" in response.data
+    assert b"Board 24" not in response.data
+    assert b"owned_after=" in response.data
+    assert b"Board 49" in response.data  # shared with the user
+
+    cursor = response.data.split(b"owned_after=")[1].split(b'"')[0].split(b"&")[0].decode()
+    older = logged_in_client.get(f'/dashboard?owned_after={cursor}')
+    assert b"Board 24" in older.data
+    assert b"Board 44" not in older.data
+
+    assert logged_in_client.get('/dashboard?owned_after=garbage').status_code == 400
+
+
+def test_dashboard_query_count_is_flat(logged_in_client, many_boards, count_queries):
+    """Rendering the dashboard costs the same with 50 boards as with 5000."""
+    logged_in_client.get('/dashboard')
+    with count_queries() as statements:
+        logged_in_client.get('/dashboard?view=all')
+    # user load, one page query, one summary query
+    assert len(statements) <= 3
+
+
+def test_api_board_feed(logged_in_client, many_boards):
+    first = logged_in_client.get('/api/v1/boards?feed=all&limit=30').get_json()
+    assert len(first['boards']) == 30
+    assert first['boards'][0]['name'] == "Board 49"
+    assert first['boards'][0]['owner_username'] == "testuser2"
+    rest = logged_in_client.get(f"/api/v1/boards?feed=all&limit=30&after={first['next']}").get_json()
+    assert len(rest['boards']) == 20
+    assert rest['next'] is None
+    assert logged_in_client.get('/api/v1/boards?feed=bogus').status_code == 400
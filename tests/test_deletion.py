@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import func, select, text
+from project import db, socketio, mutations, deletion
+from project.models import Board, List, Card, BoardChange, board_members
+from project.search import search_cards
+
+
+@pytest.fixture
+def big_board(db_session, registered_user, registered_user_2):
+    """A board shared with user 2: two lists of 25 cards, indexed for search."""
+    board = Board(name="Archive", owner=registered_user)
+    board.members.append(registered_user_2)
+    db_session.session.add(board)
+    db_session.session.commit()
+    lists = [mutations.create_list(board.id, f"List {n}") for n in range(2)]
+    for n in range(50):
+        mutations.create_card(lists[n % 2], f"Invoice {n}")
+    return board.id
+
+
+def _rows_left(board_id):
+    return {
+        'lists': db.session.scalar(select(func.count(List.id)).where(List.board_id == board_id)),
+        'cards': db.session.scalar(select(func.count(Card.id))),
+        'changes': db.session.scalar(select(func.count(BoardChange.id)).where(BoardChange.board_id == board_id)),
+        'members': db.session.scalar(select(func.count()).select_from(board_members).where(
+            board_members.c.board_id == board_id)),
+        'indexed': db.session.execute(text("SELECT COUNT(*) FROM card_search")).scalar(),
+    }
+
+
+def test_small_board_cascades_in_one_statement(big_board, count_queries):
+    """Lists, cards, changes and members go with the board row, without loading them."""
+    board = db.session.get(Board, big_board)
+    with count_queries() as statements:
+        assert mutations.delete_board(board) is False
+    assert not any(s.lstrip().upper().startswith('SELECT LISTS') for s in statements)
+    assert sum(s.lstrip().upper().startswith('DELETE') for s in statements) == 2
+    assert db.session.get(Board, big_board) is None
+    assert _rows_left(big_board) == dict(lists=0, cards=0, changes=0, members=0, indexed=0)
+
+
+def test_large_board_is_purged_in_the_background(app, big_board, registered_user, registered_user_2,
+                                                 logged_in_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'BOARD_DELETE_ASYNC_CARDS', 10)
+    monkeypatch.setitem(app.config, 'BOARD_DELETE_CHUNK_SIZE', 20)
+    monkeypatch.setitem(app.config, 'BOARD_DELETE_PAUSE_MS', 0)
+    scheduled = []
+    monkeypatch.setattr(socketio, 'start_background_task', lambda *args: scheduled.append(args))
+
+    response = logged_in_client.delete(f'/api/v1/boards/{big_board}')
+    assert response.status_code == 202
+    assert response.get_json() == {'board_id': big_board, 'deleting': True, 'cards_left': 50}
+    assert response.headers['Location'].endswith(f'/api/v1/boards/{big_board}/deletion')
+    assert len(scheduled) == 1
+
+    # Gone for everyone at once, but still listed with its progress for the owner
+    assert logged_in_client.get(f'/board/{big_board}').status_code in (403, 404)
+    assert search_cards(registered_user.id, "invoice").hits == []
+    page = logged_in_client.get('/dashboard')
+    assert b'Being deleted &middot; 50 cards left' in page.data
+    board = logged_in_client.get('/api/v1/boards').get_json()['boards'][0]
+    assert board['deleting'] is True and board['cards_left'] == 50
+    assert logged_in_client.get(f'/api/v1/boards/{big_board}/deletion').get_json()['cards_left'] == 50
+    with app.app_context():
+        shared = deletion.cards_left([big_board])
+        assert shared == {big_board: 50}
+        from project.dashboard import boards_page
+        assert boards_page(registered_user_2.id, 'shared').boards == []
+
+    # The worker deletes 20 cards per transaction, then the board itself
+    chunks = []
+    real_commit = db.session.commit
+    monkeypatch.setattr(db.session, 'commit', lambda: (chunks.append(
+        db.session.scalar(select(func.count(Card.id)))), real_commit()))
+    assert deletion.purge(big_board) == 50
+    assert chunks == [30, 10, 0, 0]
+    assert db.session.get(Board, big_board) is None
+    assert _rows_left(big_board) == dict(lists=0, cards=0, changes=0, members=0, indexed=0)
+    assert logged_in_client.get(f'/api/v1/boards/{big_board}/deletion').status_code == 404
+
+
+def test_purge_deleted_resumes_interrupted_purges(app, big_board, monkeypatch):
+    monkeypatch.setattr(socketio, 'start_background_task', lambda *args: None)
+    monkeypatch.setitem(app.config, 'BOARD_DELETE_ASYNC_CARDS', 10)
+    assert mutations.delete_board(db.session.get(Board, big_board)) is True
+
+    result = app.test_cli_runner().invoke(args=['nexus', 'purge-deleted'])
+    assert result.exit_code == 0
+    assert f'Purged board {big_board} (50 cards).' in result.output
+    assert db.session.get(Board, big_board) is None
@@ -0,0 +1,78 @@
+import pytest
+from project import db, fragments, mutations
+from project.models import Board, List, Card
+from project.fragments import MemoryFragmentCache, DiskFragmentCache
+
+
+@pytest.fixture
+def shared_board(db_session, registered_user, registered_user_2):
+    board = Board(name="Cached Board", owner=registered_user)
+    board.members.append(registered_user_2)
+    list_item = List(name="Todo", position=0, board=board)
+    db_session.session.add_all([board, list_item, Card(title="First card", position=0, list=list_item)])
+    db_session.session.commit()
+    return board.id
+
+
+def test_second_view_skips_lists_and_cards(logged_in_client, shared_board, count_queries):
+    first = logged_in_client.get(f'/board/{shared_board}')
+    with count_queries() as statements:
+        second = logged_in_client.get(f'/board/{shared_board}')
+    assert second.data == first.data
+    assert not any('FROM cards' in s or 'FROM lists' in s for s in statements)
+
+
+def test_mutation_bumps_fragment(logged_in_client, shared_board):
+    logged_in_client.get(f'/board/{shared_board}')
+    list_item = List.query.filter_by(board_id=shared_board).first()
+    mutations.create_card(list_item, "Second card")
+    assert b"Second card" in logged_in_client.get(f'/board/{shared_board}').data
+
+    card = Card.query.filter_by(title="First card").first()
+    mutations.update_card(card, "Renamed card", None)
+    response = logged_in_client.get(f'/board/{shared_board}')
+    assert b"Renamed card" in response.data
+    assert b"First card" not in response.data
+
+
+def test_owner_link_not_cached(logged_in_client, client, shared_board, registered_user_2, app):
+    # The owner warms the cache; the member must not see the owner's link
+    assert b"Manage Members" in logged_in_client.get(f'/board/{shared_board}').data
+    logged_in_client.get('/auth/logout')
+    client.post('/auth/login', data={'email': registered_user_2.email, 'password': 'password456'})
+    response = client.get(f'/board/{shared_board}')
+    assert b"First card" in response.data
+    assert b"Manage Members" not in response.data
+
+
+def test_csrf_token_per_session(app, logged_in_client, shared_board, monkeypatch):
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', True)
+    response = logged_in_client.get(f'/board/{shared_board}')
+    assert fragments.CSRF_PLACEHOLDER.encode() not in response.data
+    assert b'name="csrf_token" value="' in response.data
+
+
+def test_memory_backend_evicts_by_size():
+    cache = MemoryFragmentCache(max_bytes=25)
+    cache.set((1, 0, 0), 'a' * 10)
+    cache.set((2, 0, 0), 'b' * 10)
+    assert cache.get((1, 0, 0)) == 'a' * 10  # now most recently used
+    cache.set((3, 0, 0), 'c' * 10)
+    assert cache.get((2, 0, 0)) is None
+    assert cache.get((1, 0, 0)) and cache.get((3, 0, 0))
+    # A newer version replaces the old one
+    cache.set((1, 1, 0), 'A')
+    assert cache.get((1, 0, 0)) is None and cache.get((1, 1, 0)) == 'A'
+
+
+def test_disk_backend(tmp_path):
+    cache = DiskFragmentCache(str(tmp_path), max_bytes=25)
+    cache.set((1, 0, 0), 'a' * 10)
+    cache.set((2, 0, 0), 'b' * 10)
+    cache.set((2, 1, 0), 'B' * 10)
+    assert cache.get((2, 0, 0)) is None
+    assert cache.get((2, 1, 0)) == 'B' * 10
+    cache.set((3, 0, 0), 'c' * 10)
+    assert len(list(tmp_path.glob('*.html'))) == 2
+    cache.invalidate(3)
+    assert cache.get((3, 0, 0)) is None
@@ -0,0 +1,56 @@
+import pytest
+from project import identity
+from project.models import Board
+
+
+def _user_selects(statements):
+    return [s for s in statements if 'FROM users' in s]
+
+
+def test_request_memo(app, registered_user, count_queries):
+    user_id, email = registered_user.id, registered_user.email
+    with app.test_request_context():
+        with count_queries() as statements:
+            user = identity.get_user_by_email(email)
+            assert identity.get_user_by_email(email) is user
+            assert identity.get_user(user_id) is user
+            assert identity.get_user_by_username('testuser') is user
+            assert identity.get_user_by_email('nobody@example.com') is None
+            assert identity.get_user_by_email('nobody@example.com') is None
+        assert len(_user_selects(statements)) == 2
+
+
+def test_invite_looks_up_invitee_once(logged_in_client, registered_user, registered_user_2, count_queries):
+    board = Board(name="Invite Board", owner=registered_user)
+    identity.db.session.add(board)
+    identity.db.session.commit()
+    board_id = board.id
+
+    with count_queries() as statements:
+        logged_in_client.post(f'/board/{board_id}/manage', data={'email': registered_user_2.email})
+    # The form validator and the route share one lookup of the invitee
+    assert len([s for s in statements if 'WHERE users.email' in s]) == 1
+
+
+def test_cross_request_cache(app, registered_user, count_queries, monkeypatch):
+    monkeypatch.setitem(app.config, 'USER_CACHE_TTL', 60)
+    user_id = registered_user.id
+    with app.test_request_context():
+        identity.get_user(user_id)
+
+    with app.test_request_context():
+        with count_queries() as statements:
+            user = identity.get_user(user_id)
+            assert identity.get_user_by_email('test@example.com') is user
+        assert _user_selects(statements) == []
+        assert user.username == 'testuser'
+
+        # Changing the user drops the cached copy
+        user.username = 'renamed'
+        identity.db.session.commit()
+
+    with app.test_request_context():
+        with count_queries() as statements:
+            assert identity.get_user_by_username('testuser') is None
+            assert identity.get_user(user_id).username == 'renamed'
+        assert len(_user_selects(statements)) == 2
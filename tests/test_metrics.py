@@ -0,0 +1,68 @@
+import pytest
+from project import metrics, socketio
+from project.models import Board
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.clear()
+    yield
+    metrics.clear()
+
+
+def _sample(text, prefix):
+    """The value of the first exposition line starting with `prefix`."""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_histogram_exposition():
+    histogram = metrics.Histogram('nexus_test_seconds', 'Test.', ('kind',), buckets=(0.1, 1.0))
+    try:
+        histogram.observe(0.05, kind='a')
+        histogram.observe(0.5, kind='a')
+        histogram.observe(5, kind='a')
+        lines = histogram.render()
+    finally:
+        metrics.registry.remove(histogram)
+    assert lines[:2] == ['# HELP nexus_test_seconds Test.', '# TYPE nexus_test_seconds histogram']
+    assert 'nexus_test_seconds_bucket{kind="a",le="0.1"} 1' in lines
+    assert 'nexus_test_seconds_bucket{kind="a",le="1.0"} 2' in lines
+    assert 'nexus_test_seconds_bucket{kind="a",le="+Inf"} 3' in lines
+    assert 'nexus_test_seconds_count{kind="a"} 3' in lines
+
+
+def test_http_and_sql_metrics(logged_in_client):
+    metrics.clear()  # logging in already visited the dashboard
+    logged_in_client.get('/dashboard')
+    text = logged_in_client.get('/metrics').get_data(as_text=True)
+
+    assert _sample(text, 'nexus_http_request_duration_seconds_count{endpoint="main.dashboard",method="GET",status="200"}') == 1
+    assert _sample(text, 'nexus_sql_statements_per_unit_count{kind="http",name="main.dashboard"}') == 1
+    assert _sample(text, 'nexus_sql_statement_duration_seconds_count{operation="SELECT"}') >= 2
+
+
+def test_socket_metrics(app, socket_client, logged_in_client, registered_user):
+    board = Board(name="Metrics Board", owner=registered_user)
+    metrics.db.session.add(board)
+    metrics.db.session.commit()
+    socket_client.flask_test_client = logged_in_client
+
+    socket_client.emit('join_board', {'board_id': str(board.id)})
+    text = metrics.render()
+    assert _sample(text, 'nexus_socket_event_duration_seconds_count{event="handle_join_board"}') == 1
+    assert _sample(text, 'nexus_room_size_on_join_count') == 1
+
+    logged_in_client.post(f'/list/create/{board.id}', data={'name': 'Todo'})
+    assert _sample(metrics.render(), 'nexus_broadcast_recipients_count{event="board_changed"}') == 1
+
+
+def test_sampling_off(app, logged_in_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_SAMPLE_RATE', 0.0)
+    metrics.clear()
+    logged_in_client.get('/dashboard')
+    text = metrics.render()
+    assert 'nexus_http_request_duration_seconds_count' not in text
+    assert 'nexus_sql_statement_duration_seconds_count' not in text
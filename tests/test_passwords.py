@@ -0,0 +1,51 @@
+import pytest
+from flask_bcrypt import Bcrypt
+from project import passwords
+from project.models import User
+
+
+@pytest.fixture
+def pool_workers(app, monkeypatch):
+    """Run hashing on a one-process pool for the duration of a test."""
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_WORKERS', 1)
+    yield
+    passwords.shutdown_pool()
+
+
+def test_hash_uses_configured_cost(app):
+    with app.app_context():
+        password_hash = passwords.hash_password('secret')
+        assert passwords.hash_cost(password_hash) == app.config['BCRYPT_LOG_ROUNDS']
+        assert passwords.check_password(password_hash, 'secret')
+        assert not passwords.check_password(password_hash, 'wrong')
+
+
+def test_hash_on_process_pool(app, pool_workers):
+    with app.app_context():
+        password_hash = passwords.hash_password('secret')
+        assert passwords._pool is not None
+        assert passwords.check_password(password_hash, 'secret')
+        assert not passwords.check_password(password_hash, 'wrong')
+
+
+def test_login_rehashes_old_cost(client, db_session, app):
+    old_hash = Bcrypt().generate_password_hash('password123', 5).decode('utf-8')
+    db_session.session.add(User(username='olduser', email='old@example.com', password_hash=old_hash))
+    db_session.session.commit()
+
+    response = client.post('/auth/login', data={'email': 'old@example.com', 'password': 'password123'},
+                           follow_redirects=True)
+    assert b"Welcome to your Dashboard" in response.data
+
+    user = User.query.filter_by(email='old@example.com').first()
+    assert passwords.hash_cost(user.password_hash) == app.config['BCRYPT_LOG_ROUNDS']
+    assert passwords.check_password(user.password_hash, 'password123')
+
+
+def test_failed_login_keeps_hash(client, db_session):
+    old_hash = Bcrypt().generate_password_hash('password123', 5).decode('utf-8')
+    db_session.session.add(User(username='olduser', email='old@example.com', password_hash=old_hash))
+    db_session.session.commit()
+
+    client.post('/auth/login', data={'email': 'old@example.com', 'password': 'nope'})
+    assert User.query.filter_by(email='old@example.com').first().password_hash == old_hash
@@ -0,0 +1,113 @@
+import time
+import pytest
+from project import socketio, presence
+from project.models import Board
+from project.presence import MemoryPresence, SQLitePresence
+
+
+@pytest.fixture
+def shared_board(db_session, registered_user, registered_user_2):
+    board = Board(name="Presence Board", owner=registered_user)
+    board.members.append(registered_user_2)
+    db_session.session.add(board)
+    db_session.session.commit()
+    return board.id
+
+
+# Each user acts in a fresh app context: the test's own context would keep
+# the first user to log in loaded in `g`
+
+def _socket(app, email, password):
+    with app.app_context():
+        http_client = app.test_client()
+        http_client.post('/auth/login', data={'email': email, 'password': password})
+        return socketio.test_client(app, flask_test_client=http_client), http_client
+
+
+def _emit(app, client, *args):
+    with app.app_context():
+        client.emit(*args)
+
+
+def _presence_updates(client):
+    return [m['args'][0] for m in client.get_received() if m['name'] == 'presence_update']
+
+
+def test_join_leave_and_disconnect(app, shared_board, registered_user, registered_user_2):
+    """Joins and departures are broadcast, and a dropped socket is cleaned up."""
+    owner, owner_http = _socket(app, registered_user.email, 'password123')
+    member, _ = _socket(app, registered_user_2.email, 'password456')
+    _emit(app, owner, 'join_board', {'board_id': str(shared_board)})
+    _emit(app, member, 'join_board', {'board_id': str(shared_board)})
+
+    update = _presence_updates(owner)[-1]
+    assert update['count'] == 2
+    assert [u['username'] for u in update['users']] == ['testuser', 'testuser2']
+
+    # The dashboard reads counts from the index
+    assert b'2 viewing now' in owner_http.get('/dashboard').data
+
+    # No leave_board: the connection just goes away
+    with app.app_context():
+        member.disconnect()
+    assert _presence_updates(owner)[-1]['count'] == 1
+    with app.app_context():
+        assert presence.viewer_counts([shared_board]) == {shared_board: 1}
+
+    _emit(app, owner, 'leave_board', {'board_id': str(shared_board)})
+    with app.app_context():
+        assert presence.viewer_counts([shared_board]) == {}
+
+
+def test_updates_are_debounced(app, shared_board, registered_user, monkeypatch):
+    """Churn within one window schedules a single presence_update."""
+    scheduled = []
+    monkeypatch.setattr(socketio, 'start_background_task', lambda *args: scheduled.append(args))
+    app.config['PRESENCE_DEBOUNCE_MS'] = 500
+    try:
+        with app.app_context():
+            for n in range(5):
+                presence.join(shared_board, f'sid-{n}', registered_user)
+            presence.leave(shared_board, 'sid-0')
+    finally:
+        app.config['PRESENCE_DEBOUNCE_MS'] = 0
+    assert len(scheduled) == 1
+
+    listener, _ = _socket(app, registered_user.email, 'password123')
+    listener.emit('join_board', {'board_id': str(shared_board)})
+    listener.get_received()
+    func, task_app, board_id, delay = scheduled[0]
+    func(task_app, board_id, 0)
+    assert _presence_updates(listener) == [{'board_id': shared_board, 'count': 1,
+                                            'users': [{'id': registered_user.id, 'username': 'testuser'}]}]
+
+
+@pytest.mark.parametrize('make_backend', [
+    lambda tmp_path: MemoryPresence(),
+    lambda tmp_path: SQLitePresence('sqlite:///' + str(tmp_path / 'presence.db')),
+])
+def test_backend_index(tmp_path, make_backend):
+    """Distinct users per board, sid cleanup and expiry of silent sids."""
+    backend = make_backend(tmp_path)
+    now = time.time()
+    backend.join(1, 'a', 10, 'ann', now)
+    backend.join(1, 'b', 10, 'ann', now)      # second tab of the same user
+    backend.join(1, 'c', 11, 'bob', now - 120)
+    backend.join(2, 'a', 10, 'ann', now)
+
+    assert backend.counts([1, 2, 3], now - 90) == {1: 1, 2: 1}
+    assert backend.viewers(1, now - 200) == [(10, 'ann'), (11, 'bob')]
+
+    assert backend.expire(now - 90) == {1}
+    assert sorted(backend.drop_sid('a')) == [1, 2]
+    assert backend.counts([1, 2], now - 90) == {1: 1}
+    backend.touch('b', now + 60)
+    assert backend.expire(now + 30) == set()
+
+
+def test_sqlite_backend_is_shared(tmp_path):
+    """Two workers pointing at one file see each other's viewers."""
+    url = 'sqlite:///' + str(tmp_path / 'presence.db')
+    worker1, worker2 = SQLitePresence(url), SQLitePresence(url)
+    worker1.join(5, 'sid-1', 1, 'ann', time.time())
+    assert worker2.counts([5], 0) == {5: 1}
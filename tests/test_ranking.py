@@ -0,0 +1,190 @@
+import pytest
+from sqlalchemy import inspect, text
+from project import db, socketio, migrations
+from project.models import Board, List, Card
+from project.ranking import rank_between, ranks_between, gap_too_small, rebalance_cards, RANK_STEP
+
+
+def test_rank_between():
+    """Keys land between their neighbours, or one step outside them."""
+    assert rank_between(None, None) == 0.0
+    assert rank_between(None, 0.0) == -RANK_STEP
+    assert rank_between(RANK_STEP, None) == 2 * RANK_STEP
+    assert rank_between(1.0, 2.0) == 1.5
+    assert gap_too_small(1.0, 1.0 + 1e-9, 2.0)
+    assert not gap_too_small(1.0, 1.5, 2.0)
+    assert ranks_between(1.0, 2.0, 3) == [1.25, 1.5, 1.75]
+    assert ranks_between(None, 0.0, 2) == [-2 * RANK_STEP, -RANK_STEP]
+
+
+@pytest.fixture
+def ranked_list(db_session, registered_user):
+    """A list holding three cards with sparse keys."""
+    board = Board(name="Ranked Board", owner=registered_user)
+    list1 = List(name="List 1", position=0, board=board)
+    cards = [Card(title=f"Card {i}", position=i * RANK_STEP, list=list1) for i in range(3)]
+    db_session.session.add_all([board, list1] + cards)
+    db_session.session.commit()
+    return {'board': board, 'list': list1, 'cards': cards}
+
+
+def test_card_move_writes_one_row(socket_client, logged_in_client, ranked_list):
+    """Moving the last card to the top leaves its siblings untouched."""
+    socket_client.flask_test_client = logged_in_client
+    first, second, last = ranked_list['cards']
+
+    socket_client.emit('card_moved', {
+        'card_id': f'card-{last.id}',
+        'new_list_id': f'list-{ranked_list["list"].id}',
+        'next_sibling_id': f'card-{first.id}'
+    })
+
+    db.session.expire_all()
+    assert first.position == 0.0
+    assert second.position == RANK_STEP
+    assert last.position < first.position
+    ordered = [c.id for c in Card.query.filter_by(list_id=ranked_list['list'].id).order_by(Card.position)]
+    assert ordered == [last.id, first.id, second.id]
+
+
+def test_delete_card_keeps_sibling_positions(logged_in_client, ranked_list):
+    """Deleting a card does not renumber the cards after it."""
+    first, second, last = ranked_list['cards']
+    logged_in_client.post(f'/card/delete/{first.id}', follow_redirects=True)
+
+    db.session.expire_all()
+    assert second.position == RANK_STEP
+    assert last.position == 2 * RANK_STEP
+
+
+def test_rebalance_cards(db_session, ranked_list):
+    """Rebalancing restores even spacing without changing the order."""
+    first, second, last = ranked_list['cards']
+    second.position = 1e-9
+    last.position = 2e-9
+    db.session.commit()
+
+    rebalance_cards(ranked_list['list'].id)
+    db.session.commit()
+    db.session.expire_all()
+
+    assert [first.position, second.position, last.position] == [0.0, RANK_STEP, 2 * RANK_STEP]
+
+
+def test_background_rebalance_logs_positions(app, db_session, ranked_list):
+    """Respaced cards are logged so open boards and cached markup catch up."""
+    from project.ranking import _run_rebalance
+    from project.changes import changes_since
+    board_id, list_id = ranked_list['board'].id, ranked_list['list'].id
+    ranked_list['cards'][2].position = 1e-9
+    db.session.commit()
+
+    _run_rebalance(app, ('cards', list_id))
+
+    version, changes = changes_since(board_id, 0)
+    assert version == 1
+    assert changes[0]['kind'] == 'cards_moved'
+    assert [m['position'] for m in changes[0]['payload']['moves']] == [0.0, RANK_STEP, 2 * RANK_STEP]
+
+
+@pytest.fixture
+def ranked_board(db_session, registered_user):
+    """A board with four lists with sparse keys."""
+    board = Board(name="Columns", owner=registered_user)
+    lists = [List(name=f"List {i}", position=i * RANK_STEP, board=board) for i in range(4)]
+    db_session.session.add_all([board] + lists)
+    db_session.session.commit()
+    return board.id, [item.id for item in lists]
+
+
+def _list_order(board_id):
+    return [row.id for row in db.session.query(List.id).filter(List.board_id == board_id).order_by(List.position)]
+
+
+def test_list_move_writes_one_row(app, logged_in_client, ranked_board, count_queries):
+    """Dragging a list updates only its own row and is broadcast to the room."""
+    from project.changes import changes_since
+    board_id, list_ids = ranked_board
+    client = socketio.test_client(app, flask_test_client=logged_in_client)
+    client.emit('join_board', {'board_id': str(board_id)})
+    client.get_received()
+
+    with count_queries() as statements:
+        client.emit('list_moved', {'list_id': list_ids[3], 'next_sibling_id': list_ids[1], 'version': 1})
+    updates = [s for s in statements if s.lstrip().upper().startswith('UPDATE LISTS')]
+    assert len(updates) == 1 and 'WHERE lists.id = ? AND lists.version = ?' in updates[0]
+
+    received = client.get_received()
+    assert [m['name'] for m in received] == ['list_moved']
+    assert received[0]['args'][0]['lists'] == [[list_ids[3], 0.5 * RANK_STEP, 2]]
+    assert _list_order(board_id) == [list_ids[0], list_ids[3], list_ids[1], list_ids[2]]
+    assert [db.session.get(List, list_id).position for list_id in list_ids[:3]] == [0.0, RANK_STEP, 2 * RANK_STEP]
+    assert changes_since(board_id, 0)[1][0]['kind'] == 'lists_moved'
+
+    # A drag based on the old version is answered with the real order
+    client.emit('list_moved', {'list_id': list_ids[3], 'next_sibling_id': None, 'version': 1})
+    received = client.get_received()
+    assert [m['name'] for m in received] == ['list_move_conflict']
+    assert [row[0] for row in received[0]['args'][0]['lists']] == _list_order(board_id)
+
+
+def test_background_list_rebalance_logs_positions(app, ranked_board):
+    from project.ranking import _run_rebalance
+    from project.changes import changes_since
+    board_id, list_ids = ranked_board
+    db.session.get(List, list_ids[3]).position = 1e-9
+    db.session.commit()
+
+    _run_rebalance(app, ('lists', board_id))
+
+    version, changes = changes_since(board_id, 0)
+    assert changes[0]['kind'] == 'lists_moved'
+    assert [item['id'] for item in changes[0]['payload']['lists']] == [list_ids[0], list_ids[3]] + list_ids[1:3]
+    assert _list_order(board_id) == [list_ids[0], list_ids[3]] + list_ids[1:3]
+
+
+def test_cli_rebalance_logs_positions(app, ranked_list):
+    """`nexus rebalance` bumps the board version and logs the new keys, like the background path."""
+    from project.changes import changes_since
+    board_id, cards = ranked_list['board'].id, ranked_list['cards']
+    cards[1].position, cards[2].position = 1e-9, 2e-9
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['nexus', 'rebalance', '--board', str(board_id)])
+    assert result.exit_code == 0
+    version, changes = changes_since(board_id, 0)
+    assert [change['kind'] for change in changes] == ['lists_moved', 'cards_moved']
+    moves = changes[1]['payload']['moves']
+    assert [(m['card_id'], m['position']) for m in moves] == [
+        (f'card-{card.id}', index * RANK_STEP) for index, card in enumerate(cards)]
+    assert moves[0]['version'] == db.session.get(Card, cards[0].id).version
+
+    # Without --board every board is logged the same way
+    assert app.test_cli_runner().invoke(args=['nexus', 'rebalance']).exit_code == 0
+    assert changes_since(board_id, 0)[0] == version + 2
+
+
+def test_sparse_positions_migration_before_row_versions(db_session, registered_user):
+    """Revision 0001 respaces a database that 0005 has not given version columns yet."""
+    board = Board(name="Old", owner=registered_user)
+    db.session.add(board)
+    db.session.commit()
+    for table in ('cards', 'lists'):
+        db.session.execute(text(f"ALTER TABLE {table} DROP COLUMN version"))
+    db.session.execute(text("INSERT INTO lists (id, name, position, board_id) VALUES "
+                            "(1, 'Done', 1, :board), (2, 'To Do', 0, :board)"), {'board': board.id})
+    db.session.execute(text("INSERT INTO cards (title, position, list_id) VALUES "
+                            "('Second', 1, 2), ('First', 0, 2), ('Shipped', 0, 1)"))
+    db.session.commit()
+
+    migrations._sparse_positions()
+    db.session.commit()
+    assert 'version' not in {column['name'] for column in inspect(db.engine).get_columns('lists')}
+    assert db.session.execute(text("SELECT id, position FROM lists ORDER BY id")).all() == [
+        (1, RANK_STEP), (2, 0.0)]
+    assert db.session.execute(text("SELECT title, position FROM cards ORDER BY position, title")).all() == [
+        ('First', 0.0), ('Shipped', 0.0), ('Second', RANK_STEP)]
+
+    migrations._row_versions()
+    db.session.commit()
+    assert db.session.scalar(text("SELECT count(*) FROM cards WHERE version = 0")) == 3
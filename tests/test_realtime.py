@@ -0,0 +1,74 @@
+import threading
+import pytest
+import socketio as python_socketio
+from project.realtime import RESYNC_EVENT, BackpressureManager, SQLiteQueueManager, queue_manager_class, socketio_options
+
+
+def test_socketio_options(tmp_path):
+    """Config picks the async mode, transports and queue backend."""
+    url = 'sqlite:///' + str(tmp_path / 'queue.db')
+    options = socketio_options({
+        'SOCKETIO_ASYNC_MODE': 'threading',
+        'SOCKETIO_TRANSPORTS': 'websocket',
+        'SOCKETIO_MESSAGE_QUEUE': url,
+        'SOCKETIO_CHANNEL': 'nexus',
+        'SOCKETIO_CLIENT_QUEUE_LIMIT': 50,
+    })
+    manager = options.pop('client_manager')
+    assert options == {'async_mode': 'threading', 'transports': ['websocket']}
+    assert isinstance(manager, SQLiteQueueManager)
+    assert manager.channel == 'nexus'
+    assert manager.client_queue_limit == 50
+
+    # Without a queue the in-memory manager still applies backpressure
+    assert list(socketio_options({})) == ['client_manager']
+    assert isinstance(socketio_options({})['client_manager'], BackpressureManager)
+
+
+@pytest.mark.parametrize('event', ['cards_moved_batch', 'list_moved', 'board_changed'])
+def test_board_deltas_are_held_back_for_full_queues(monkeypatch, event):
+    """Every versioned board broadcast, list moves included, turns into one resync notice."""
+    sent = []
+    monkeypatch.setattr(python_socketio.Manager, 'emit',
+                        lambda self, event, data, namespace, room=None, skip_sid=None, **kwargs:
+                        sent.append((event, room, skip_sid)))
+    manager = BackpressureManager()
+    manager.get_participants = lambda namespace, room: iter([('slow', 'eio-slow')])
+    manager._queue_depth = lambda eio_sid: manager.client_queue_limit
+
+    manager.emit(event, {'version': 2}, '/', room='board-1')
+    manager.emit(event, {'version': 3}, '/', room='board-1')
+    assert sent == [(event, 'board-1', [None, 'slow']), (RESYNC_EVENT, 'slow', None),
+                    (event, 'board-1', [None, 'slow'])]
+
+
+def test_queue_manager_backpressure_sits_below_pubsub():
+    """Messages from other workers are delivered through the backpressure emit."""
+    cls = queue_manager_class('redis://localhost:6379/0')
+    assert issubclass(cls, python_socketio.RedisManager)
+    mro = cls.__mro__
+    assert mro.index(python_socketio.PubSubManager) < mro.index(BackpressureManager) < mro.index(python_socketio.Manager)
+
+
+def test_sqlite_queue_round_trip(tmp_path):
+    """A message published by one manager is seen by another process's listener."""
+    url = 'sqlite:///' + str(tmp_path / 'queue.db')
+    publisher = SQLiteQueueManager(url, channel='test', write_only=True)
+    subscriber = SQLiteQueueManager(url, channel='test', write_only=True)
+
+    received = []
+
+    def listen():
+        received.append(subscriber.json.loads(next(subscriber._listen())))
+
+    subscriber_thread = threading.Thread(target=listen, daemon=True)
+    subscriber_thread.start()
+    # _listen() only reports messages published after it starts polling,
+    # so keep publishing until the subscriber has picked one up
+    for _ in range(100):
+        publisher._publish({'method': 'emit', 'event': 'ping', 'room': '1'})
+        subscriber_thread.join(0.05)
+        if received:
+            break
+
+    assert received == [{'method': 'emit', 'event': 'ping', 'room': '1'}]
@@ -0,0 +1,85 @@
+import shutil
+import pytest
+from sqlalchemy import text
+from project import create_app, db, bcrypt
+from project.models import User, Board
+from project.access import clear_cache
+from config import TestConfig
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """An app whose replica is a copy of the primary SQLite file, taken once (no replication)."""
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+
+    class ReplicaConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{primary}'
+        SQLALCHEMY_REPLICA_URI = f'sqlite:///{replica}'
+        REPLICA_STICKY_SECONDS = 60
+
+    app = create_app(ReplicaConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username='reader', email='reader@example.com',
+                    password_hash=bcrypt.generate_password_hash('password123').decode('utf-8'))
+        other = User(username='sharer', email='sharer@example.com', password_hash='x')
+        db.session.add_all([user, Board(name='Original Name', owner=user), Board(name='Shared', owner=other)])
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+    shutil.copy(primary, replica)
+
+    # The primary moves on; the replica lags behind
+    with app.app_context():
+        db.session.execute(text("UPDATE boards SET name = 'Primary Name' WHERE id = 1"))
+        db.session.commit()
+        db.session.remove()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    app.extensions['nexus_replica'].dispose()
+
+
+def _login(client):
+    client.post('/auth/login', data={'email': 'reader@example.com', 'password': 'password123'})
+
+
+def test_reads_go_to_replica(replica_app):
+    client = replica_app.test_client()
+    _login(client)
+    assert b'Original Name' in client.get('/dashboard').data
+    assert b'Original Name' in client.get('/board/1').data
+
+
+def test_undecorated_reads_stay_on_primary(replica_app):
+    client = replica_app.test_client()
+    _login(client)
+    assert b'Primary Name' in client.get('/board/edit/1').data
+
+
+def test_read_your_writes(replica_app):
+    client = replica_app.test_client()
+    _login(client)
+    client.post('/dashboard', data={'name': 'Brand New Board'})
+
+    # The user's own write makes their next reads come from the primary
+    response = client.get('/dashboard')
+    assert b'Brand New Board' in response.data
+    assert b'Primary Name' in response.data
+
+    # Somebody else still reads the replica
+    other = replica_app.test_client()
+    _login(other)
+    assert b'Original Name' in other.get('/dashboard').data
+
+
+def test_access_checks_use_primary(replica_app):
+    """A member added since the replica's copy is let in, and no denial is cached."""
+    with replica_app.app_context():
+        db.session.execute(text("INSERT INTO board_members (board_id, user_id) VALUES (2, 1)"))
+        db.session.commit()
+        db.session.remove()
+    clear_cache()
+    client = replica_app.test_client()
+    _login(client)
+    assert client.get('/board/2').status_code == 200
@@ -0,0 +1,116 @@
+import pytest
+from project import db, mutations
+from project.models import Board, List, Card
+from project.search import search_cards
+from project.board_io import import_board
+
+
+@pytest.fixture
+def boards(db_session, registered_user, registered_user_2):
+    """User 1 owns one board, user 2 owns one shared with user 1 and one private."""
+    own = Board(name="Own", owner=registered_user)
+    shared = Board(name="Shared", owner=registered_user_2)
+    shared.members.append(registered_user)
+    private = Board(name="Private", owner=registered_user_2)
+    lists = [List(name="Backlog", position=0, board=board) for board in (own, shared, private)]
+    db_session.session.add_all([own, shared, private] + lists)
+    db_session.session.commit()
+    return {'own': lists[0], 'shared': lists[1], 'private': lists[2]}
+
+
+def _titles(user, query, **kwargs):
+    return [hit.title for hit in search_cards(user.id, query, **kwargs).hits]
+
+
+def test_index_follows_mutations(boards, registered_user):
+    """Cards are searchable as soon as they are created, edited or deleted."""
+    card = mutations.create_card(boards['own'], "Release plan", "Dates for the launch")
+    mutations.create_card(boards['shared'], "Release notes")
+    mutations.create_card(boards['private'], "Release party")
+
+    # Prefix matching on every word, only on accessible boards
+    assert sorted(_titles(registered_user, "rel")) == ["Release notes", "Release plan"]
+    assert _titles(registered_user, "launch") == ["Release plan"]
+
+    mutations.update_card(card, "Roadmap", None)
+    assert _titles(registered_user, "launch") == []
+    assert _titles(registered_user, "road") == ["Roadmap"]
+
+    mutations.delete_card(card)
+    assert _titles(registered_user, "road") == []
+
+    mutations.delete_list(boards['shared'])
+    assert _titles(registered_user, "release") == []
+
+
+def test_board_delete_and_reindex(boards, registered_user, app):
+    """Deleting a board clears its cards; reindex picks up rows written directly."""
+    mutations.create_card(boards['own'], "Budget review")
+    mutations.delete_board(db.session.get(Board, boards['own'].board_id))
+    assert _titles(registered_user, "budget") == []
+
+    db.session.add(Card(title="Imported by hand", position=0, list=boards['shared']))
+    db.session.commit()
+    assert _titles(registered_user, "hand") == []
+    result = app.test_cli_runner().invoke(args=['nexus', 'reindex'])
+    assert result.exit_code == 0
+    assert 'Indexed 1 cards.' in result.output
+    assert _titles(registered_user, "hand") == ["Imported by hand"]
+
+
+def test_many_boards_fall_back_to_stored_board(boards, registered_user, monkeypatch):
+    """Users with more boards than MAX_BOARD_TERMS get the same results."""
+    mutations.create_card(boards['own'], "Sprint goals")
+    mutations.create_card(boards['private'], "Sprint retro")
+    monkeypatch.setattr('project.search.MAX_BOARD_TERMS', 0)
+    assert _titles(registered_user, "sprint") == ["Sprint goals"]
+
+
+def test_ranking_and_pagination(boards, registered_user):
+    """Title matches rank first, and cursors walk every hit exactly once."""
+    mutations.create_card(boards['own'], "Other", "mentions the migration in passing")
+    mutations.create_card(boards['own'], "Migration", "the migration itself")
+    for i in range(5):
+        mutations.create_card(boards['shared'], f"Migration step {i}")
+
+    first = _titles(registered_user, "migration")
+    assert first[-1] == "Other"
+
+    seen, cursor = [], None
+    while True:
+        page = search_cards(registered_user.id, "migration", cursor, limit=2)
+        seen += [hit.title for hit in page.hits]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == first
+
+
+def test_query_syntax_is_not_passed_through(boards, registered_user):
+    """Quotes and operators in user input are treated as plain words."""
+    mutations.create_card(boards['own'], "Fix OR-gate")
+    assert _titles(registered_user, '"fix') == ["Fix OR-gate"]
+    assert _titles(registered_user, 'fix OR gate* (') == ["Fix OR-gate"]
+    assert _titles(registered_user, '  ') == []
+
+
+def test_import_is_indexed(db_session, registered_user):
+    lines = ['{"type": "board", "name": "Imported"}',
+             '{"type": "list", "id": 1, "name": "To Do"}',
+             '{"type": "card", "list_id": 1, "title": "Quarterly report"}']
+    import_board(lines, registered_user.id)
+    assert _titles(registered_user, "quarter") == ["Quarterly report"]
+
+
+def test_search_endpoints(boards, logged_in_client):
+    mutations.create_card(boards['own'], "Hiring plan")
+
+    response = logged_in_client.get('/api/v1/search?q=hiring')
+    assert response.status_code == 200
+    assert [hit['title'] for hit in response.get_json()['results']] == ["Hiring plan"]
+    assert response.get_json()['results'][0]['board_name'] == "Own"
+    assert logged_in_client.get('/api/v1/search').status_code == 400
+    assert logged_in_client.get('/api/v1/search?q=x&after=nonsense').status_code == 400
+
+    page = logged_in_client.get('/search?q=hiring')
+    assert b'Hiring plan' in page.data
@@ -0,0 +1,55 @@
+import pytest
+from project.models import Board, List, Card
+from project.snapshot import load_board_snapshot, can_view
+
+# Board, members, lists, cards -- independent of the board's size
+SNAPSHOT_QUERIES = 4
+
+
+@pytest.fixture
+def big_board(db_session, registered_user, registered_user_2):
+    """A board with 50 lists of 5 cards each, shared with a second user."""
+    board = Board(name="Big Board", owner=registered_user)
+    board.members.append(registered_user_2)
+    db_session.session.add(board)
+    for i in range(50):
+        list_item = List(name=f"List {i}", position=i, board=board)
+        db_session.session.add(list_item)
+        for j in range(5):
+            db_session.session.add(Card(title=f"Card {i}-{j}", position=j, list=list_item))
+    db_session.session.commit()
+    return board
+
+
+def test_snapshot_contents(big_board, registered_user, registered_user_2):
+    """The snapshot carries ordered lists, ordered cards and membership."""
+    snapshot = load_board_snapshot(big_board.id)
+
+    assert snapshot.name == "Big Board"
+    assert snapshot.owner_username == registered_user.username
+    assert snapshot.member_ids == {registered_user_2.id}
+    assert len(snapshot.lists) == 50
+    assert [l.name for l in snapshot.lists[:2]] == ["List 0", "List 1"]
+    assert [c.title for c in snapshot.lists[3].cards] == [f"Card 3-{j}" for j in range(5)]
+    assert can_view(snapshot, registered_user.id)
+    assert can_view(snapshot, registered_user_2.id)
+    assert not can_view(snapshot, -1)
+
+
+def test_snapshot_query_count(big_board, count_queries):
+    """Loading a 50-list board takes a fixed number of statements."""
+    board_id = big_board.id
+    with count_queries() as statements:
+        load_board_snapshot(board_id)
+    assert len(statements) == SNAPSHOT_QUERIES
+
+
+def test_view_board_query_count(logged_in_client, big_board, count_queries):
+    """Rendering a 50-list board does not issue a query per list."""
+    board_id = big_board.id
+    with count_queries() as statements:
+        response = logged_in_client.get(f'/board/{board_id}')
+    assert response.status_code == 200
+    assert b"Card 49-4" in response.data
+    # The snapshot plus loading the logged-in user
+    assert len(statements) <= SNAPSHOT_QUERIES + 1
@@ -93,6 +93,66 @@ def test_socket_card_moved_broadcast(app, socket_test_data, registered_user):
     received = client2.get_received()
     
     assert len(received) > 0
-    assert received[0]['name'] == 'card_update_broadcast'
-    assert received[0]['args'][0]['card_id'] == move_data['card_id']
-    assert received[0]['args'][0]['new_list_id'] == move_data['new_list_id']
\ No newline at end of file
+    assert received[0]['name'] == 'cards_moved_batch'
+    # Broadcasts carry compact [card_id, list_id, position, version] rows;
+    # the card was created at version 1 and the move made it 2
+    moves = received[0]['args'][0]['moves']
+    assert moves == [[socket_test_data['card1_id'], socket_test_data['list2_id'], 0, 2]]
+
+def test_move_batch_coalesces(app, socket_test_data):
+    """Moves queued in one window are applied together and announced once."""
+    from project.moves import enqueue_move, flush_board, PendingMove, stats
+    board_id = socket_test_data['board_id']
+    card_id = socket_test_data['card1_id']
+    stats.reset()
+
+    app.config['MOVE_BATCH_WINDOW_MS'] = 50
+    try:
+        # The background flush cannot win the race against a direct flush below
+        enqueue_move(board_id, PendingMove(card_id, socket_test_data['list2_id'], None, 'sid'))
+        enqueue_move(board_id, PendingMove(card_id, socket_test_data['list1_id'], None, 'sid'))
+        flush_board(board_id)
+    finally:
+        app.config['MOVE_BATCH_WINDOW_MS'] = 0
+
+    card = Card.query.get(card_id)
+    assert card.list_id == socket_test_data['list1_id']
+    assert stats.as_dict()['batches'] == 1
+    assert stats.as_dict()['max_batch_size'] == 2
+
+def _logged_in_socket(app, user):
+    http_client = app.test_client()
+    http_client.post('/auth/login', data={'email': user.email, 'password': 'password123'})
+    return socketio.test_client(app, flask_test_client=http_client)
+
+
+def test_slow_client_gets_one_resync_notice(app, socket_test_data, registered_user, monkeypatch):
+    """Deltas for a client with a full queue collapse into one resync_required."""
+    from project.realtime import BackpressureManager
+    fast = _logged_in_socket(app, registered_user)
+    slow = _logged_in_socket(app, registered_user)
+    board_id = str(socket_test_data['board_id'])
+    fast.emit('join_board', {'board_id': board_id})
+    slow.emit('join_board', {'board_id': board_id})
+    fast.get_received()
+    slow.get_received()
+
+    slow_eio_sid = slow.eio_sid
+    monkeypatch.setattr(BackpressureManager, '_queue_depth',
+                        lambda self, eio_sid: 1000 if eio_sid == slow_eio_sid else 0)
+
+    # Integer ids are accepted as well as DOM ids
+    card_id = socket_test_data['card1_id']
+    for list_id in (socket_test_data['list2_id'], socket_test_data['list1_id'], socket_test_data['list2_id']):
+        fast.emit('card_moved', {'card_id': card_id, 'new_list_id': list_id, 'next_sibling_id': None})
+
+    assert [m['name'] for m in fast.get_received()] == ['cards_moved_batch'] * 3
+    assert [m['name'] for m in slow.get_received()] == ['resync_required']
+
+    # Catching up turns deltas back on
+    result = slow.emit('sync_board', {'board_id': board_id, 'since_version': 0}, callback=True)
+    assert result['version'] == 3
+    monkeypatch.setattr(BackpressureManager, '_queue_depth', lambda self, eio_sid: 0)
+    fast.emit('card_moved', {'card_id': card_id, 'new_list_id': socket_test_data['list1_id'],
+                             'next_sibling_id': None})
+    assert [m['name'] for m in slow.get_received()] == ['cards_moved_batch']